@@ -1,7 +1,22 @@
+import io
+
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-import time
+from datetime import date, datetime
+
+from employee_directory import create_employee_directory
+from expiry_engine import create_expiry_engine
+from leave_engine import ANNUAL_LEAVE_TITLE, create_leave_engine
+from notifications import create_notification_pipeline, notify_request_transition
+from request_events import format_history
+from reports import (
+    REPORT_PDF_MAX_ROWS, REPORTLAB_AVAILABLE, REPORTS,
+    create_report_engine, export_pdf, export_xlsx, labelled,
+)
+from request_store import STATUS_TO_DB, create_request_store
+from sla_analytics import OUTCOME_LABELS, create_sla_analytics
+from stats_counters import COUNTER_LABELS, create_stats_counters
+from workflow import WorkflowEngine
 
 # --- إعدادات الصفحة ---
 st.set_page_config(
@@ -20,13 +35,90 @@ USERS_DB = {
     "1003": {"name": "خالد عمر", "role": "مدير القسم", "password": "123", "dept": "IT"},
     "1004": {"name": "منى سعيد", "role": "مدير الموارد البشرية", "password": "123", "dept": "HR"},
     "1005": {"name": "فهد ناصر", "role": "مدير مالي", "password": "123", "dept": "Finance"},
+    "1006": {"name": "عبدالله سالم", "role": "المدير العام", "password": "123", "dept": "Management"},
     "9999": {"name": "Admin", "role": "مدير النظام", "password": "admin", "dept": "Admin"}
 }
 
-# --- تهيئة الذاكرة (Session State) ---
-if 'requests_db' not in st.session_state:
-    st.session_state.requests_db = []
+# --- مخزن الطلبات المشترك ---
+# مورد واحد لكل العملية تتشاركه جميع الجلسات ويبقى بعد إعادة التشغيل
+@st.cache_resource
+def get_request_store():
+    return create_request_store()
+
+store = get_request_store()
+
+# --- دليل الموظفين المؤقت ---
+# يُحمّل مرة واحدة لكل العملية ويُحدّث في الخلفية بدلاً من الاستعلام عند كل دخول
+@st.cache_resource
+def get_employee_directory():
+    return create_employee_directory(USERS_DB)
+
+directory = get_employee_directory()
+
+# --- محرك انتهاء الوثائق (نتيجة مخزنة لكل يوم) ---
+@st.cache_resource
+def get_expiry_engine():
+    return create_expiry_engine()
+
+expiry_engine = get_expiry_engine()
+
+# --- عدادات لوحة الملخص (تُحدّث مع كل تقديم/معالجة وتُطابق دورياً) ---
+@st.cache_resource
+def get_stats_counters():
+    return create_stats_counters(store, directory, expiry_engine)
+
+counters = get_stats_counters()
+
+# --- طابور التنبيهات (يُرسل في الخلفية دون انتظار المراجع) ---
+@st.cache_resource
+def get_notification_queue():
+    queue, _ = create_notification_pipeline(expiry_engine)
+    return queue
+
+notification_queue = get_notification_queue()
+
+# --- محرك سلسلة الموافقات (جداول الانتقال تُحسب وتُتحقق مرة واحدة) ---
+@st.cache_resource
+def get_workflow():
+    return WorkflowEngine()
+
+workflow = get_workflow()
+
+# --- تحليلات زمن الإنجاز (مجاميع تدريجية فوق سجل الأحداث) ---
+@st.cache_resource
+def get_sla_analytics():
+    return create_sla_analytics(store)
+
+sla = get_sla_analytics()
+
+# --- محرك الإجازات (فهارس فواصل للتداخل وتغطية الأقسام والرصيد) ---
+@st.cache_resource
+def get_leave_engine():
+    return create_leave_engine(store, directory)
+
+leave_engine = get_leave_engine()
 
+# --- التقارير (نتائج مخزنة لكل تقرير ومعاملاته ونسخة البيانات) ---
+@st.cache_resource
+def get_report_engine():
+    return create_report_engine(store, USERS_DB)
+
+report_engine = get_report_engine()
+
+# أنواع الطلبات المتاحة للموظف
+REQUEST_TYPE_OPTIONS = ["طلب إجازة", "سلفة", "تعريف راتب", "أخرى"]
+
+# أعمدة الترتيب في جداول الطلبات ← عناوينها
+SORT_LABELS = {
+    "created_at": "تاريخ التقديم",
+    "id": "رقم الطلب",
+    "type": "النوع",
+    "status": "الحالة",
+    "current_stage": "المرحلة",
+    "employee": "الموظف",
+}
+
+# --- تهيئة الذاكرة (Session State) ---
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
 
@@ -37,9 +129,9 @@ if 'user_info' not in st.session_state:
 
 def login(emp_id, password):
     """التحقق من بيانات الدخول"""
-    if emp_id in USERS_DB:
-        user = USERS_DB[emp_id]
-        if user['password'] == password:
+    user = directory.get(emp_id)
+    if user is not None:
+        if directory.check_password(emp_id, password):
             st.session_state.logged_in = True
             st.session_state.user_info = user
             st.session_state.user_id = emp_id
@@ -55,7 +147,6 @@ def logout():
 def submit_request(emp_name, emp_id, req_type, req_title, start_date, end_date, loan_amount, reason):
     """تقديم طلب جديد"""
     new_req = {
-        "id": len(st.session_state.requests_db) + 1,
         "emp_id": emp_id,
         "employee": emp_name,
         "type": req_type,
@@ -64,49 +155,190 @@ def submit_request(emp_name, emp_id, req_type, req_title, start_date, end_date,
         "end_date": str(end_date) if end_date else None,
         "loan_amount": loan_amount,
         "reason": reason,
-        "current_stage": 2,  # يبدأ عند المشرف (المرحلة 2)
-        "status": "Pending",
-        "history": [f"{datetime.now().strftime('%Y-%m-%d %H:%M')}: تم تقديم الطلب"]
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
     }
-    st.session_state.requests_db.append(new_req)
+    event = workflow.submit(new_req, emp_name, datetime.now())
+    store.add(new_req, [event])
+
+def flash(message, icon="✅"):
+    """رسالة تأكيد تُعرض بعد إعادة التشغيل بدلاً من إيقاف الخيط بـ sleep"""
+    st.session_state.flash = (message, icon)
+
+def show_flash():
+    """عرض رسالة التأكيد المعلّقة (إن وجدت) مرة واحدة"""
+    if 'flash' in st.session_state:
+        message, icon = st.session_state.pop('flash')
+        st.toast(message, icon=icon)
 
 def process_request(request_id, action, reviewer_role, reason=""):
     """معالجة الطلب (موافقة/رفض)"""
-    for req in st.session_state.requests_db:
-        if req['id'] == request_id:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-            
-            if action == "approve":
-                current_stage = req['current_stage']
-                
-                # سلسلة الموافقات
-                if reviewer_role == "مشرف القسم" and current_stage == 2:
-                    req['current_stage'] = 3
-                    req['history'].append(f"{timestamp}: وافق مشرف القسم")
-                elif reviewer_role == "مدير القسم" and current_stage == 3:
-                    req['current_stage'] = 4
-                    req['history'].append(f"{timestamp}: وافق مدير القسم")
-                elif reviewer_role == "مدير الموارد البشرية" and current_stage == 4:
-                    req['current_stage'] = 5
-                    req['history'].append(f"{timestamp}: وافق مدير الموارد البشرية")
-                elif reviewer_role == "مدير مالي" and current_stage == 5:
-                    req['current_stage'] = 6
-                    req['status'] = "Approved"
-                    req['history'].append(f"{timestamp}: وافق المدير المالي - اكتمل الطلب")
-                
-                st.success("✅ تم تسجيل الموافقة")
-                time.sleep(1)
-                st.rerun()
+    req = store.get(request_id)
+    if req is None:
+        return
 
-            elif action == "reject":
-                req['status'] = "Rejected"
-                req['current_stage'] = 0
-                req['history'].append(f"{timestamp}: تم الرفض بواسطة {reviewer_role}. السبب: {reason}")
-                st.error("❌ تم رفض الطلب")
-                time.sleep(1)
-                st.rerun()
+    stage_before = req['current_stage']
+    event = workflow.apply(req, action, reviewer_role, datetime.now(), reason)
+    # الحفظ مشروط بأن الطلب ما زال في مرحلته، فلا يُحتسب انتقال سبقنا إليه مراجع آخر مرتين
+    if event is None or not store.save(req, [event], {req['id']: stage_before}):
+        flash("لا يمكنك معالجة هذا الطلب في مرحلته الحالية", icon="⚠️")
+        st.rerun()
+
+    leave_engine.record(req)
+    notify_request_transition(notification_queue, req)
+    if action == "approve":
+        flash("تم تسجيل الموافقة")
+    else:
+        flash("تم رفض الطلب", icon="❌")
+    st.rerun()
+
+def process_requests_bulk(request_ids, action, reviewer_role, reason=""):
+    """
+    معالجة جماعية (موافقة/رفض) لعدد من الطلبات في معاملة واحدة
+    ترجع نتيجة كل طلب: approved / rejected / not_found / not_allowed
+    """
+    if action not in ("approve", "reject"):
+        raise ValueError(f"إجراء غير معروف: {action}")
+
+    timestamp = datetime.now()
+    requests = store.get_many(request_ids)
+
+    # الانتقال عبر جداول المحرك؛ الطلبات غير المسموحة لهذا الدور تبقى دون تعديل
+    results = dict.fromkeys(request_ids, "not_found")
+    results.update(dict.fromkeys((req['id'] for req in requests), "not_allowed"))
+    valid, events, expected_stages = [], [], {}
+    for req in requests:
+        stage_before = req['current_stage']
+        event = workflow.apply(req, action, reviewer_role, timestamp, reason)
+        if event is not None:
+            valid.append(req)
+            events.append(event)
+            expected_stages[req['id']] = stage_before
+
+    # حفظ ذري لجميع الطلبات الصالحة وأحداثها بنفس التوقيت؛ ما عدّله مراجع آخر
+    # منذ قراءته لا يُحفظ ويبقى not_allowed
+    saved = set(store.save_many(valid, events, expected_stages))
+    valid = [req for req in valid if req['id'] in saved]
+    for req in valid:
+        results[req['id']] = "approved" if action == "approve" else "rejected"
+
+    for req in valid:
+        leave_engine.record(req)
+        notify_request_transition(notification_queue, req)
+    return results
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_requests_page(filters, sort, descending, page, page_size, columns, data_version):
+    """
+    صفحة واحدة من الطلبات كإطار بيانات جاهز للعرض
+    مخزنة لكل (فلاتر، صفحة)، و data_version يبطلها عند أي تعديل على الطلبات
+    """
+    rows, total = store.query(dict(filters), sort, descending, (page - 1) * page_size, page_size)
+    return pd.DataFrame(rows, columns=list(columns)), total
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def export_report(name, params, fmt, data_version):
+    """ملف التقرير للتنزيل، مخزن حتى تتغير البيانات (data_version)"""
+    frame = labelled(report_engine.run(name, **dict(params)))
+    buffer = io.BytesIO()
+    if fmt == "pdf":
+        export_pdf(frame, buffer, title=REPORTS[name][0])
+    else:
+        export_xlsx({REPORTS[name][0]: frame}, buffer)
+    return buffer.getvalue()
+
+def render_reports():
+    """اختيار التقرير ومعاملاته وعرضه مع التصدير"""
+    name = st.selectbox("التقرير", list(REPORTS), format_func=lambda n: REPORTS[n][0], key="report_name")
+    params = {}
+    if name in ("department_summary", "leave_consumption", "loans"):
+        params["year"] = int(st.number_input(
+            "السنة", min_value=2000, max_value=2100, value=date.today().year, key="report_year"
+        ))
+    if name == "loans":
+        status = st.selectbox(
+            "الحالة", [None, *STATUS_TO_DB], key="report_status",
+            format_func=lambda s: "الكل" if s is None else STATUS_TO_DB[s],
+        )
+        if status:
+            params["status"] = status
+    if name in ("department_summary", "document_expiry"):
+        params["days"] = int(st.number_input(
+            "الوثائق المنتهية خلال (يوم)", min_value=1, value=expiry_engine.window_days, key="report_days"
+        ))
+    if name == "employee_requests":
+        params["emp_id"] = st.text_input("رقم الموظف", key="report_emp_id")
+        if not params["emp_id"]:
             return
 
+    frame = report_engine.run(name, **params)
+    if frame.empty:
+        st.info("لا توجد بيانات لهذا التقرير.")
+        return
+    st.caption(f"{len(frame)} صف")
+    st.dataframe(labelled(frame), hide_index=True, use_container_width=True)
+
+    params_key = tuple(sorted(params.items()))
+    version = report_engine.data_version()
+    d1, d2 = st.columns(2)
+    d1.download_button(
+        "⬇️ تصدير Excel",
+        data=export_report(name, params_key, "xlsx", version),
+        file_name=f"{name}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+    if REPORTLAB_AVAILABLE and len(frame) <= REPORT_PDF_MAX_ROWS:
+        d2.download_button(
+            "⬇️ تصدير PDF",
+            data=export_report(name, params_key, "pdf", version),
+            file_name=f"{name}.pdf",
+            mime="application/pdf",
+        )
+
+def render_requests_table(key, columns, emp_id=None):
+    """جدول طلبات بفلاتر وصفحات تُنفَّذ في المخزن بدل تحميل كل الصفوف"""
+    f1, f2, f3 = st.columns(3)
+    status = f1.selectbox(
+        "الحالة", [None, *STATUS_TO_DB], key=f"{key}_status",
+        format_func=lambda s: "الكل" if s is None else STATUS_TO_DB[s],
+    )
+    req_type = f2.selectbox(
+        "النوع", [None, *REQUEST_TYPE_OPTIONS], key=f"{key}_type",
+        format_func=lambda t: "الكل" if t is None else t,
+    )
+    date_range = f3.date_input("تاريخ التقديم", value=(), key=f"{key}_dates")
+
+    s1, s2, s3 = st.columns(3)
+    sort = s1.selectbox("ترتيب حسب", list(SORT_LABELS), key=f"{key}_sort", format_func=SORT_LABELS.get)
+    descending = s2.toggle("تنازلي", value=True, key=f"{key}_desc")
+    page_size = s3.selectbox("عدد الصفوف", [25, 50, 100], key=f"{key}_size")
+
+    filters = {
+        "emp_id": emp_id,
+        "status": status,
+        "type": req_type,
+        "date_from": date_range[0] if len(date_range) > 0 else None,
+        "date_to": date_range[1] if len(date_range) > 1 else None,
+    }
+    filters = tuple((k, v) for k, v in filters.items() if v)
+
+    page_key = f"{key}_page"
+    page = st.session_state.get(page_key, 1)
+    frame, total = load_requests_page(filters, sort, descending, page, page_size, tuple(columns), store.version)
+    pages = max(1, -(-total // page_size))
+    if page > pages:
+        # الفلتر الجديد أقل صفحات: الرجوع لآخر صفحة متاحة
+        page = st.session_state[page_key] = pages
+        frame, total = load_requests_page(filters, sort, descending, page, page_size, tuple(columns), store.version)
+
+    if total == 0:
+        st.info("لا توجد طلبات مطابقة.")
+        return
+
+    st.dataframe(frame, hide_index=True)
+    p1, p2 = st.columns([1, 3])
+    p1.number_input("الصفحة", min_value=1, max_value=pages, key=page_key)
+    p2.caption(f"الصفحة {page} من {pages} — {total} طلب")
+
 # --- الواجهة الرئيسية ---
 
 if not st.session_state.logged_in:
@@ -133,11 +365,13 @@ if not st.session_state.logged_in:
             مدير القسم: 1003 / 123
             مدير HR: 1004 / 123
             مدير مالي: 1005 / 123
+            المدير العام: 1006 / 123
             """)
 
 else:
     # واجهة النظام بعد الدخول
     user = st.session_state.user_info
+    show_flash()
     
     # الشريط الجانبي
     with st.sidebar:
@@ -155,7 +389,7 @@ else:
         st.header("📝 تقديم طلب جديد")
         
         # نوع الطلب وتحديث القوائم
-        req_type = st.selectbox("نوع الطلب", ["طلب إجازة", "سلفة", "تعريف راتب", "أخرى"])
+        req_type = st.selectbox("نوع الطلب", REQUEST_TYPE_OPTIONS)
         
         req_titles = []
         if req_type == "طلب إجازة":
@@ -179,40 +413,111 @@ else:
         elif req_type == "سلفة":
             amount = st.number_input("مبلغ السلفة", step=500, min_value=0)
             
+        # فحوص الإجازة قبل الإرسال: التداخل، الرصيد، وغياب القسم في نفس الفترة
+        leave_errors = []
+        if req_type == "طلب إجازة":
+            if end_d < start_d:
+                leave_errors.append("تاريخ النهاية قبل تاريخ البداية")
+            else:
+                leave_check = leave_engine.check(st.session_state.user_id, req_title, start_d, end_d)
+                for overlap_start, overlap_end in leave_check["overlaps"]:
+                    leave_errors.append(f"تتداخل مع إجازة معتمدة من {overlap_start} إلى {overlap_end}")
+                for year, missing in leave_check["shortfall"].items():
+                    leave_errors.append(f"تتجاوز رصيد الإجازة السنوية لعام {year} بـ {missing} يوم")
+                if req_title == ANNUAL_LEAVE_TITLE:
+                    st.caption(
+                        f"الرصيد المتبقي لعام {start_d.year}: "
+                        f"{leave_engine.remaining(st.session_state.user_id, start_d.year)} يوم"
+                    )
+                if leave_check["dept_peak_out"]:
+                    st.info(f"👥 {leave_check['dept_peak_out']} من زملاء قسمك في إجازة خلال هذه الفترة")
+            for error in leave_errors:
+                st.error(error)
+
         reason_text = st.text_area("ملاحظات / السبب")
         
-        if st.button("إرسال الطلب", type="primary"):
+        if st.button("إرسال الطلب", type="primary", disabled=bool(leave_errors)):
             submit_request(user['name'], st.session_state.user_id, req_type, req_title, start_d, end_d, amount, reason_text)
             st.success("تم إرسال الطلب بنجاح للمشرف!")
             
         # عرض طلبات الموظف السابقة
         st.divider()
         st.subheader("📂 طلباتي السابقة")
-        my_requests = [r for r in st.session_state.requests_db if r['emp_id'] == st.session_state.user_id]
-        if my_requests:
-            st.table(pd.DataFrame(my_requests)[['id', 'type', 'title', 'status', 'current_stage']])
-        else:
-            st.info("لا توجد طلبات سابقة.")
+        render_requests_table(
+            "my_requests",
+            ['id', 'type', 'title', 'status', 'current_stage', 'created_at'],
+            emp_id=st.session_state.user_id,
+        )
 
     # 2. واجهة المدراء (الموافقات)
     else:
         st.header("🗂 لوحة الموافقات")
         
         # تحديد المرحلة المستهدفة لهذا المدير
-        target_stage = 0
-        if user['role'] == "مشرف القسم": target_stage = 2
-        elif user['role'] == "مدير القسم": target_stage = 3
-        elif user['role'] == "مدير الموارد البشرية": target_stage = 4
-        elif user['role'] == "مدير مالي": target_stage = 5
+        target_stage = workflow.stage_for_role(user['role']) or 0
         
         # جلب الطلبات المعلقة لهذه المرحلة
-        pending = [r for r in st.session_state.requests_db if r['current_stage'] == target_stage and r['status'] == "Pending"]
+        pending = store.list_pending(target_stage)
         
         if not pending:
             st.success("🎉 لا توجد طلبات معلقة بانتظارك.")
+        else:
+            # المعالجة الجماعية
+            selected_ids = st.multiselect(
+                "معالجة جماعية",
+                [r['id'] for r in pending],
+                format_func=lambda rid: f"طلب #{rid}",
+                placeholder="اختر الطلبات لمعالجتها دفعة واحدة",
+            )
+            b1, b2, b3 = st.columns([1, 2, 1])
+            bulk_action = None
+            if b1.button("✅ موافقة على المحدد", disabled=not selected_ids):
+                bulk_action = "approve"
+            bulk_reason = b2.text_input("سبب الرفض الجماعي", key="bulk_reason")
+            if b3.button("❌ رفض المحدد", disabled=not selected_ids):
+                if bulk_reason:
+                    bulk_action = "reject"
+                else:
+                    st.warning("اكتب سبب الرفض أولاً")
+
+            if bulk_action:
+                results = process_requests_bulk(selected_ids, bulk_action, user['role'], bulk_reason)
+                done = sum(1 for r in results.values() if r in ("approved", "rejected"))
+                skipped = len(results) - done
+                message = f"تمت معالجة {done} طلب"
+                if skipped:
+                    message += f" (تم تخطي {skipped})"
+                flash(message, icon="✅" if bulk_action == "approve" else "❌")
+                st.rerun()
         
-        for req in pending:
-            with st.expander(f"طلب #{req['id']} | {req['type']} - {req['employee']}", expanded=True):
+            # قائمة مختصرة: صف واحد لكل طلب في جدول واحد بدل عنصر لكل طلب
+            queue = pd.DataFrame(
+                [
+                    {
+                        "id": req['id'],
+                        "employee": req['employee'],
+                        "type": req['type'],
+                        "title": req['title'],
+                        "loan_amount": req['loan_amount'] if req['type'] == "سلفة" else None,
+                        "created_at": req.get('created_at'),
+                    }
+                    for req in pending
+                ]
+            )
+            st.caption(f"{len(pending)} طلب بانتظارك")
+            st.dataframe(queue, hide_index=True)
+
+            # التفاصيل والسجل للطلب المحدد فقط
+            by_id = {req['id']: req for req in pending}
+            selected_id = st.selectbox(
+                "عرض الطلب",
+                list(by_id),
+                format_func=lambda rid: f"طلب #{rid} | {by_id[rid]['type']} - {by_id[rid]['employee']}",
+                key="selected_request",
+            )
+            req = by_id[selected_id]
+
+            with st.container(border=True):
                 c1, c2 = st.columns([2, 1])
                 with c1:
                     st.markdown(f"**عنوان الطلب:** {req['title']}")
@@ -223,11 +528,9 @@ else:
                         st.markdown(f"📅 **من:** {req['start_date']} **إلى:** {req['end_date']}")
                     
                     st.caption("سجل العمليات:")
-                    for h in req['history']:
-                        st.text(h)
+                    st.text("\n".join(format_history(store.events_for(req['id']), req)))
                         
                 with c2:
-                    st.write("---")
                     if st.button("✅ موافقة", key=f"ok_{req['id']}", use_container_width=True):
                         process_request(req['id'], "approve", user['role'])
                     
@@ -238,9 +541,78 @@ else:
                         else:
                             st.warning("اكتب سبب الرفض أولاً")
 
-    # 3. (إضافي) عرض جدول البيانات لمدير النظام فقط
+    # 3. تنبيهات انتهاء الوثائق لمدير الموارد البشرية
+    if user['role'] in ("مدير الموارد البشرية", "مدير النظام"):
+        st.divider()
+        st.subheader("📊 ملخص")
+        summary = counters.snapshot()
+        for tile, (name, label) in zip(st.columns(len(COUNTER_LABELS)), COUNTER_LABELS.items()):
+            tile.metric(label, summary[name])
+
+        st.subheader(f"🛂 وثائق تنتهي خلال {expiry_engine.window_days} يوماً")
+        expiring_docs = expiry_engine.expiring()
+        if expiring_docs:
+            st.dataframe(
+                pd.DataFrame(expiring_docs)[
+                    ["doc_type", "emp_id", "emp_name", "doc_number", "expiry_date", "days_remaining"]
+                ],
+                use_container_width=True,
+            )
+        else:
+            st.info("لا توجد وثائق قريبة الانتهاء.")
+
+        # لوحة زمن الإنجاز: الأحداث الجديدة فقط تُضاف للمجاميع المخزنة
+        st.subheader("⏱️ زمن الإنجاز في مراحل الموافقة")
+        sla.refresh()
+        t1, t2, t3 = st.tabs(["مدة البقاء في كل مرحلة", "المتراكم لدى المراجعين", "الإنجاز اليومي"])
+        with t1:
+            dwell = sla.dwell_times()
+            if dwell.empty:
+                st.info("لا توجد انتقالات مكتملة بعد.")
+            else:
+                st.caption("بالساعات")
+                st.dataframe(
+                    dwell.rename(columns={"approver": "المراجع", "count": "العدد", "mean": "المتوسط"}),
+                    use_container_width=True,
+                )
+        with t2:
+            backlog = sla.backlog()
+            if backlog.empty:
+                st.info("لا توجد طلبات معلقة.")
+            else:
+                st.dataframe(
+                    backlog.rename(columns={
+                        "approver": "المراجع",
+                        "pending": "معلق",
+                        "oldest_hours": "أقدم طلب (ساعة)",
+                        "median_hours": "الوسيط (ساعة)",
+                    }),
+                    use_container_width=True,
+                )
+        with t3:
+            st.bar_chart(sla.throughput().rename(columns=OUTCOME_LABELS))
+
+        st.subheader("📑 التقارير")
+        render_reports()
+
+    # 4. (إضافي) عرض جدول البيانات لمدير النظام فقط
     if user['role'] == "مدير النظام":
         st.divider()
         st.subheader("قاعدة البيانات الكاملة")
-        if st.session_state.requests_db:
-            st.dataframe(st.session_state.requests_db)
+        render_requests_table(
+            "all_requests",
+            ['id', 'emp_id', 'employee', 'type', 'title', 'status', 'current_stage',
+             'loan_amount', 'approved_by', 'created_at'],
+        )
+
+        st.subheader("دليل الموظفين المؤقت")
+        cache_stats = directory.stats()
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("الموظفون", cache_stats["size"])
+        m2.metric("إصابات", cache_stats["hits"])
+        m3.metric("إخفاقات", cache_stats["misses"])
+        m4.metric("نسبة الإصابة", f"{cache_stats['hit_rate']:.0%}")
+        if st.button("🔄 تحديث دليل الموظفين"):
+            directory.invalidate()
+            flash("تم تحديث دليل الموظفين")
+            st.rerun()
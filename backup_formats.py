@@ -0,0 +1,216 @@
+"""
+صيغ ملفات النسخ الاحتياطية
+NDJSON عادي، NDJSON مضغوط (gzip / zstd)، و Parquet العمودي
+"""
+
+import gzip
+import io
+import json
+from pathlib import Path
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# الصيغة ← امتداد الملف
+BACKUP_FORMATS = {
+    "ndjson": ".ndjson",
+    "gzip": ".ndjson.gz",
+    "zstd": ".ndjson.zst",
+    "parquet": ".parquet",
+}
+
+# امتداد ملف النسخ القديمة (JSON منسق)
+LEGACY_SUFFIX = ".json"
+
+# ملفات وصفية داخل مجلد النسخة ليست بيانات جداول
+METADATA_FILES = {"backup_info.json", "restore_checkpoint.json"}
+
+
+# أعمدة كل جدول وأنواعها في Parquet (مطابقة لـ database_setup.sql كما يعيدها PostgREST):
+# التواريخ والأوقات نصوص ISO تُعاد كما هي عند الاستعادة، و DECIMAL أرقام عشرية
+PARQUET_COLUMNS = {
+    "employees": {
+        "id": "string", "name": "string", "role": "string", "department": "string",
+        "email": "string", "phone": "string", "hire_date": "string", "salary": "float64",
+        "is_active": "bool", "created_at": "string", "updated_at": "string",
+    },
+    "requests": {
+        "id": "string", "emp_id": "string", "emp_name": "string", "type": "string",
+        "title": "string", "details": "string", "start_date": "string", "end_date": "string",
+        "loan_amount": "float64", "current_stage": "int64", "workflow": "string",
+        "history": "list<string>", "status": "string", "created_at": "string",
+        "updated_at": "string", "approved_by": "string", "approved_at": "string",
+        "rejection_reason": "string",
+    },
+    "passports": {
+        "id": "int64", "emp_id": "string", "passport_number": "string", "issue_date": "string",
+        "expiry_date": "string", "nationality": "string", "place_of_issue": "string",
+        "notes": "string", "created_at": "string", "updated_at": "string",
+    },
+    "residencies": {
+        "id": "int64", "emp_id": "string", "residency_number": "string", "issue_date": "string",
+        "expiry_date": "string", "sponsor": "string", "profession": "string",
+        "notes": "string", "created_at": "string", "updated_at": "string",
+    },
+    "activity_log": {
+        "id": "int64", "emp_id": "string", "action": "string", "details": "string",
+        "ip_address": "string", "created_at": "string",
+    },
+    "notifications": {
+        "id": "int64", "emp_id": "string", "title": "string", "message": "string",
+        "type": "string", "is_read": "bool", "created_at": "string", "updated_at": "string",
+    },
+    "request_events": {
+        "id": "int64", "request_id": "string", "stage_from": "int64", "stage_to": "int64",
+        "actor": "string", "action": "string", "ts": "string",
+    },
+}
+
+
+def format_suffix(fmt):
+    """امتداد الملف لصيغة معينة مع التحقق من توفر مكتبتها"""
+    if fmt not in BACKUP_FORMATS:
+        raise ValueError(f"صيغة غير معروفة: {fmt}")
+    if fmt == "zstd" and not ZSTD_AVAILABLE:
+        raise RuntimeError("صيغة zstd تتطلب: pip install zstandard")
+    if fmt == "parquet" and not PYARROW_AVAILABLE:
+        raise RuntimeError("صيغة parquet تتطلب: pip install pyarrow")
+    return BACKUP_FORMATS[fmt]
+
+
+def detect_format(path):
+    """تحديد صيغة الملف من امتداده (None للملفات غير المعروفة)"""
+    name = path.name
+    for fmt, suffix in sorted(BACKUP_FORMATS.items(), key=lambda item: -len(item[1])):
+        if name.endswith(suffix):
+            return fmt
+    if name.endswith(LEGACY_SUFFIX) and name not in METADATA_FILES:
+        return "json"
+    return None
+
+
+def table_name_of(path):
+    """اسم الجدول من اسم ملف النسخة (employees.ndjson.gz ← employees)"""
+    return path.name.split(".", 1)[0]
+
+
+class NDJSONWriter:
+    """كتابة الصفحات سطراً سطراً إلى NDJSON (مع ضغط اختياري)"""
+
+    def __init__(self, path, fmt):
+        if fmt == "gzip":
+            self._file = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+        elif fmt == "zstd":
+            raw = open(path, "wb")
+            stream = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+            self._file = io.TextIOWrapper(stream, encoding="utf-8")
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+
+    def write_page(self, page):
+        self._file.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in page)
+
+    def close(self):
+        self._file.close()
+
+
+def _parquet_type(name):
+    if name == "list<string>":
+        return pa.list_(pa.string())
+    return {"string": pa.string(), "int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_()}[name]
+
+
+class ParquetWriter:
+    """
+    كتابة كل صفحة كمجموعة صفوف (row group) في ملف Parquet بمخطط ثابت للملف كله
+    الأعمدة هي مفاتيح أول صفحة (select * يعيد كل أعمدة الجدول)، وأنواعها من PARQUET_COLUMNS
+    لا مما صادف وجوده في الصفحة الأولى، فلا يتعطل النسخ إن كان عمود فارغاً فيها ثم امتلأ لاحقاً
+    الأعمدة غير المعلنة يُستنتج نوعها من أول صفحة والفارغة منها تُعامل كنصوص
+    """
+
+    def __init__(self, path, table_name=None):
+        self._path = path
+        self._columns = PARQUET_COLUMNS.get(table_name, {})
+        self._writer = None
+        self._schema = None
+
+    def _build_schema(self, page):
+        fields = []
+        for field in pa.Table.from_pylist(page).schema:
+            if field.name in self._columns:
+                field = pa.field(field.name, _parquet_type(self._columns[field.name]))
+            elif pa.types.is_null(field.type):
+                field = pa.field(field.name, pa.string())
+            fields.append(field)
+        return pa.schema(fields)
+
+    def write_page(self, page):
+        if not page:
+            return
+        if self._writer is None:
+            self._schema = self._build_schema(page)
+            self._writer = pq.ParquetWriter(self._path, self._schema, compression="zstd")
+        # from_pylist يُسقط المفاتيح غير الموجودة في المخطط بصمت، فالعمود الجديد خطأ صريح
+        extra = {key for record in page for key in record} - set(self._schema.names)
+        if extra:
+            raise ValueError(f"أعمدة غير موجودة في مخطط Parquet: {sorted(extra)}")
+        self._writer.write_table(pa.Table.from_pylist(page, schema=self._schema))
+
+    def close(self):
+        if self._writer is None:
+            # جدول فارغ: ملف بدون أعمدة حتى تبقى النسخة مكتملة
+            pq.write_table(pa.table({}), self._path)
+        else:
+            self._writer.close()
+
+
+def open_table_writer(path, fmt):
+    """إنشاء كاتب لملف جدول بالصيغة المطلوبة"""
+    format_suffix(fmt)
+    if fmt == "parquet":
+        return ParquetWriter(path, table_name_of(Path(path)))
+    return NDJSONWriter(path, fmt)
+
+
+def read_backup_records(path):
+    """قراءة سجلات ملف نسخة بأي صيغة كمولّد (دون تحميل الملف كاملاً)"""
+    fmt = detect_format(path)
+
+    if fmt == "json":
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+        return
+
+    if fmt == "parquet":
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches():
+            yield from batch.to_pylist()
+        return
+
+    if fmt == "gzip":
+        f = gzip.open(path, "rt", encoding="utf-8")
+    elif fmt == "zstd":
+        raw = open(path, "rb")
+        f = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding="utf-8")
+    else:
+        f = open(path, "r", encoding="utf-8")
+
+    with f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def list_data_files(backup_path):
+    """ملفات البيانات في مجلد نسخة (بأي صيغة)"""
+    return sorted(path for path in backup_path.iterdir() if detect_format(path))
@@ -3,8 +3,16 @@
 يقوم بحفظ نسخ من قاعدة البيانات بشكل دوري
 """
 
+import argparse
+import hashlib
+import importlib.util
 import os
 import sys
+import threading
+import time
+from itertools import islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import json
 from pathlib import Path
@@ -12,45 +20,256 @@ from pathlib import Path
 # إضافة المجلد الرئيسي للمسار
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-try:
-    from supabase import create_client
-    from config import SUPABASE_URL, SUPABASE_KEY, USE_DATABASE
-    SUPABASE_AVAILABLE = True
-except ImportError:
-    SUPABASE_AVAILABLE = False
+from config import USE_DATABASE
+from db_clients import get_supabase
+
+SUPABASE_AVAILABLE = importlib.util.find_spec("supabase") is not None
+if not SUPABASE_AVAILABLE:
     print("⚠️ مكتبة Supabase غير مثبتة. استخدم: pip install supabase")
 
+from config import BACKUP_PAGE_SIZE, BACKUP_JOBS, BACKUP_FORMAT, RESTORE_CHUNK_SIZE
+from bulk_upsert import upsert_records
+from backup_formats import (
+    BACKUP_FORMATS, format_suffix, open_table_writer, read_backup_records,
+    list_data_files, table_name_of,
+)
+
 # إنشاء مجلد النسخ الاحتياطية
 BACKUP_DIR = Path("backups")
 BACKUP_DIR.mkdir(exist_ok=True)
 
+# قائمة الجداول
+BACKUP_TABLES = [
+    "employees",
+    "requests",
+    "passports",
+    "residencies",
+    "activity_log",
+    "notifications",
+    "request_events",
+]
+
+# جداول مفتاحها رقمي متسلسل (SERIAL) يمكن تقسيمه إلى نطاقات تُجلب بالتوازي
+INTEGER_KEY_TABLES = {"passports", "residencies", "activity_log", "notifications", "request_events"}
+
+# جداول إلحاق فقط ترفض triggers فيها UPDATE: تُستعاد بإدراج يتجاهل الموجود (ON CONFLICT DO NOTHING)
+INSERT_ONLY_TABLES = {"request_events"}
+
+# أعمدة لا تُكتب في ملفات النسخ أبداً (بصمات كلمات المرور). الاستعادة بـ upsert لا تلمس
+# الأعمدة الغائبة فتبقى البصمات الموجودة، وبعد استعادة على قاعدة فارغة يُعاد استيراد
+# كلمات المرور من employees.xlsx أو تعيينها من جديد
+EXCLUDED_COLUMNS = {"employees": {"password_hash"}}
+
+# حجم المقطع عند حساب بصمات الملفات (قراءة متسلسلة بذاكرة محدودة)
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+# ترتيب الاستعادة حسب المفاتيح الأجنبية: كل مرحلة تعتمد على ما قبلها،
+# وجداول المرحلة الواحدة مستقلة تُستعاد بالتوازي
+RESTORE_PHASES = [
+    ["employees"],
+    ["requests", "passports", "residencies", "activity_log", "notifications", "request_events"],
+]
+
+# عمود التغيير لكل جدول في النسخ التزايدية: updated_at تحدّثه الـ triggers
+# (ومنها التنبيهات لأن is_read يتغير بعد الإدراج)، وسجل النشاط الذي لا يُعدَّل
+# بعد الإدراج يعتمد على created_at، وسجل الأحداث على رقمه المتسلسل (إلحاق فقط)
+CHANGE_COLUMNS = {
+    "employees": "updated_at",
+    "requests": "updated_at",
+    "passports": "updated_at",
+    "residencies": "updated_at",
+    "activity_log": "created_at",
+    "notifications": "updated_at",
+    "request_events": "id",
+}
+
+
+def select_changed(supabase, table_name, columns="*", since=None):
+    """استعلام على الجدول مع قصره على السجلات المتغيرة بعد (عمود، قيمة) إن وُجد"""
+    query = supabase.table(table_name).select(columns)
+    if since is not None:
+        column, value = since
+        query = query.gt(column, value)
+    return query
+
+
+def fetch_pages(supabase, table_name, page_size=BACKUP_PAGE_SIZE, key="id", since=None):
+    """
+    جلب الجدول صفحةً صفحة بترتيب المفتاح الأساسي (keyset pagination)
+    يتوقف عند أول صفحة فارغة فلا يضيع أي سجل حتى لو قصّ الخادم حجم الصفحة
+    """
+    last_key = None
+    while True:
+        query = select_changed(supabase, table_name, since=since).order(key).limit(page_size)
+        if last_key is not None:
+            query = query.gt(key, last_key)
+
+        rows = query.execute().data or []
+        if not rows:
+            return
+
+        yield rows
+        last_key = rows[-1][key]
+
+
+def fetch_pages_parallel(supabase, table_name, executor, jobs, page_size=BACKUP_PAGE_SIZE,
+                         key="id", since=None):
+    """
+    جلب جدول مفتاحه رقمي بالتوازي: يُقسم مدى المفاتيح إلى نطاقات بحجم الصفحة
+    ويُجلب حتى jobs نطاقاً في الوقت نفسه، وتُعاد الصفحات بالترتيب فتبقى الذاكرة محدودة
+    """
+    first = select_changed(supabase, table_name, key, since).order(key).limit(1).execute().data
+    if not first:
+        return
+    last = select_changed(supabase, table_name, key, since).order(key, desc=True).limit(1).execute().data
+    low, high = first[0][key], last[0][key]
+
+    def fetch_range(start):
+        end = start + page_size
+        rows = []
+        cursor = start - 1
+        # حلقة داخل النطاق تحسباً لخادم يقص الصفحة دون الحجم المطلوب
+        while True:
+            page = (
+                select_changed(supabase, table_name, since=since)
+                .gt(key, cursor).lt(key, end).order(key).limit(page_size)
+                .execute().data
+            ) or []
+            rows.extend(page)
+            if not page or page[-1][key] >= end - 1:
+                return rows
+            cursor = page[-1][key]
 
-def backup_table(supabase, table_name, backup_file):
-    """نسخ احتياطي لجدول واحد"""
+    in_flight = deque()
+    for start in range(low, high + 1, page_size):
+        in_flight.append(executor.submit(fetch_range, start))
+        if len(in_flight) >= jobs:
+            page = in_flight.popleft().result()
+            if page:
+                yield page
+    while in_flight:
+        page = in_flight.popleft().result()
+        if page:
+            yield page
+
+
+def read_high_water(supabase, table_name, change_column, since=None):
+    """
+    أعلى قيمة لعمود التغيير في الجدول الآن، تُقرأ قبل بدء الجلب
+    السجلات التي تتغير أثناء الجلب تحمل قيمة أعلى فتدخل في النسخة التالية،
+    أما أخذ العلامة من الصفوف المجلوبة فقد يتخطى سجلات لم تُقرأ بعد
+    """
+    rows = (
+        select_changed(supabase, table_name, change_column, since)
+        .order(change_column, desc=True).limit(1)
+        .execute().data
+    )
+    return rows[0][change_column] if rows and rows[0].get(change_column) else None
+
+
+def backup_table(supabase, table_name, backup_file, page_size=BACKUP_PAGE_SIZE,
+                 page_executor=None, jobs=1, fmt=BACKUP_FORMAT, since=None):
+    """
+    نسخ احتياطي لجدول واحد (كل صفحة تُكتب مباشرة إلى ملف النسخة)
+    يرجع عدد السجلات، وعلامة الماء للنسخة التزايدية التالية (أعلى قيمة لعمود التغيير
+    قبل بدء الجلب)، ورسالة الخطأ إن فشل النسخ (وحينها تبقى العلامة السابقة كما هي)
+    """
+    change_column = CHANGE_COLUMNS.get(table_name)
+    previous_mark = since[1] if since else None
+    
     try:
         print(f"  📦 نسخ جدول: {table_name}...")
         
-        # جلب جميع البيانات
-        response = supabase.table(table_name).select("*").execute()
+        high_water = previous_mark
+        if change_column:
+            high_water = read_high_water(supabase, table_name, change_column, since) or previous_mark
         
-        if response.data:
-            # حفظ البيانات
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                json.dump(response.data, f, ensure_ascii=False, indent=2)
-            
-            print(f"  ✅ تم حفظ {len(response.data)} سجل من {table_name}")
-            return len(response.data)
+        # النطاقات المتوازية تغطي مدى المفاتيح كله فتهدر الطلبات على نطاقات فارغة
+        # حين تكون السجلات المتغيرة قليلة ومتفرقة، فالنسخة التزايدية تجلب بـ keyset
+        if since is None and page_executor is not None and jobs > 1 and table_name in INTEGER_KEY_TABLES:
+            pages = fetch_pages_parallel(supabase, table_name, page_executor, jobs, page_size, since=since)
+        else:
+            pages = fetch_pages(supabase, table_name, page_size, since=since)
+        
+        excluded = EXCLUDED_COLUMNS.get(table_name)
+        count = 0
+        writer = open_table_writer(backup_file, fmt)
+        try:
+            for page in pages:
+                if excluded:
+                    page = [{key: value for key, value in row.items() if key not in excluded} for row in page]
+                writer.write_page(page)
+                count += len(page)
+        finally:
+            writer.close()
+        
+        if count:
+            print(f"  ✅ تم حفظ {count} سجل من {table_name}")
         else:
-            print(f"  ℹ️ جدول {table_name} فارغ")
-            return 0
+            print(f"  ℹ️ لا توجد سجلات جديدة في {table_name}" if since else f"  ℹ️ جدول {table_name} فارغ")
+        return count, high_water, None
             
     except Exception as e:
         print(f"  ❌ خطأ في نسخ {table_name}: {str(e)}")
-        return 0
+        return 0, previous_mark, str(e)
+
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE):
+    """بصمة BLAKE2 للملف كاملاً ولكل مقطع منه، بقراءة متسلسلة واحدة"""
+    file_hash = hashlib.blake2b(digest_size=32)
+    chunk_hashes = []
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            file_hash.update(chunk)
+            chunk_hashes.append(hashlib.blake2b(chunk, digest_size=16).hexdigest())
+    return file_hash.hexdigest(), chunk_hashes
+
+
+def read_backup_info(backup_path):
+    """قراءة ملف معلومات النسخة (None إن لم يوجد)"""
+    info_file = Path(backup_path) / "backup_info.json"
+    if not info_file.exists():
+        return None
+    with open(info_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def latest_backup():
+    """أحدث نسخة مكتملة تحمل علامات الماء (أساس النسخة التزايدية التالية)"""
+    for backup in sorted(BACKUP_DIR.glob("backup_*"), reverse=True):
+        info = read_backup_info(backup)
+        if info and info.get("complete") and "high_water_marks" in info:
+            return backup, info
+    return None, None
 
 
-def create_backup():
-    """إنشاء نسخة احتياطية كاملة"""
+def resolve_backup_chain(backup_path):
+    """
+    سلسلة الاستعادة لنسخة: النسخة الكاملة الأساسية ثم النسخ التزايدية بالترتيب
+    حتى النسخة المطلوبة
+    """
+    chain = []
+    current = Path(backup_path)
+    while True:
+        chain.append(current)
+        info = read_backup_info(current) or {}
+        if info.get("type") != "incremental":
+            break
+        current = current.parent / info["base"]
+        if not current.exists():
+            raise FileNotFoundError(f"النسخة الأساسية مفقودة: {current.name}")
+    return list(reversed(chain))
+
+
+def create_backup(page_size=BACKUP_PAGE_SIZE, jobs=BACKUP_JOBS, fmt=BACKUP_FORMAT, incremental=False):
+    """
+    إنشاء نسخة احتياطية (الجداول وصفحات الجداول الكبيرة بالتوازي)
+    النسخة التزايدية تجلب فقط السجلات المتغيرة منذ علامات الماء في آخر نسخة
+    ترجع True فقط إن نُسخت كل الجداول؛ فشل أي جدول يجعلها False (ورمز خروج 1 من سطر الأوامر)
+    """
     
     if not SUPABASE_AVAILABLE:
         print("❌ لا يمكن إنشاء نسخة احتياطية - Supabase غير متوفر")
@@ -60,13 +279,24 @@ def create_backup():
         print("❌ قاعدة البيانات غير مفعّلة في config.py")
         return False
     
+    try:
+        suffix = format_suffix(fmt)
+    except (ValueError, RuntimeError) as e:
+        print(f"❌ {str(e)}")
+        return False
+    
+    base_path, base_info = latest_backup() if incremental else (None, None)
+    if incremental and base_path is None:
+        print("ℹ️ لا توجد نسخة سابقة - سيتم إنشاء نسخة كاملة")
+        incremental = False
+    
     print("=" * 60)
-    print("🚀 بدء النسخ الاحتياطي")
+    print("🚀 بدء النسخ الاحتياطي" + (f" التزايدي (الأساس: {base_path.name})" if incremental else ""))
     print("=" * 60)
     
     # إنشاء اتصال
     try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        supabase = get_supabase()
         print("✅ تم الاتصال بقاعدة البيانات")
     except Exception as e:
         print(f"❌ فشل الاتصال: {str(e)}")
@@ -79,23 +309,41 @@ def create_backup():
     
     print(f"📁 مجلد النسخة: {backup_folder}")
     
-    # قائمة الجداول
-    tables = [
-        "employees",
-        "requests",
-        "passports",
-        "residencies",
-        "activity_log",
-        "notifications",
-    ]
+    tables = BACKUP_TABLES
     
-    total_records = 0
+    previous_marks = base_info["high_water_marks"] if incremental else {}
     
-    # نسخ كل جدول
-    for table in tables:
-        backup_file = backup_folder / f"{table}.json"
-        records = backup_table(supabase, table, backup_file)
-        total_records += records
+    def run_table(table):
+        start = time.perf_counter()
+        backup_file = backup_folder / f"{table}{suffix}"
+        mark = previous_marks.get(table)
+        since = (CHANGE_COLUMNS[table], mark) if mark is not None else None
+        records, high_water, error = backup_table(
+            supabase, table, backup_file, page_size, page_executor, jobs, fmt, since
+        )
+        high_water_marks[table] = high_water
+        seconds = round(time.perf_counter() - start, 3)
+        
+        # سجل البيان (manifest): الحجم وبصمة الملف وبصمات مقاطعه
+        digest, chunk_hashes = hash_file(backup_file) if backup_file.exists() else (None, [])
+        return table, {
+            "file": backup_file.name,
+            "rows": records,
+            "bytes": backup_file.stat().st_size if backup_file.exists() else 0,
+            "seconds": seconds,
+            "blake2b": digest,
+            "chunk_hashes": chunk_hashes,
+            "error": error,
+        }
+    
+    high_water_marks = {}
+    
+    # نسخ الجداول بالتوازي؛ مجمّع منفصل لصفحات الجداول الكبيرة تفادياً للتعطل المتبادل
+    with ThreadPoolExecutor(max_workers=jobs) as table_executor, \
+            ThreadPoolExecutor(max_workers=jobs) as page_executor:
+        table_stats = dict(table_executor.map(run_table, tables))
+    
+    total_records = sum(stats["rows"] for stats in table_stats.values())
     
     # إنشاء ملف معلومات النسخة
     info = {
@@ -103,6 +351,16 @@ def create_backup():
         "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "total_records": total_records,
         "tables": tables,
+        "type": "incremental" if incremental else "full",
+        "base": base_path.name if incremental else None,
+        "high_water_marks": high_water_marks,
+        "format": fmt,
+        "total_bytes": sum(stats["bytes"] for stats in table_stats.values()),
+        "jobs": jobs,
+        "complete": all(stats["error"] is None for stats in table_stats.values()),
+        "hash_algorithm": "blake2b",
+        "hash_chunk_size": HASH_CHUNK_SIZE,
+        "table_stats": table_stats,
     }
     
     info_file = backup_folder / "backup_info.json"
@@ -110,16 +368,108 @@ def create_backup():
         json.dump(info, f, ensure_ascii=False, indent=2)
     
     print("\n" + "=" * 60)
-    print(f"✅ اكتمل النسخ الاحتياطي!")
+    if info["complete"]:
+        print(f"✅ اكتمل النسخ الاحتياطي!")
+    else:
+        failed = [table for table, stats in table_stats.items() if stats["error"] is not None]
+        print(f"❌ النسخة غير مكتملة - فشل نسخ: {', '.join(failed)} (راجع الأخطاء أعلاه)")
     print(f"📊 إجمالي السجلات: {total_records}")
     print(f"📁 الموقع: {backup_folder}")
     print("=" * 60)
     
-    return True
+    return info["complete"]
+
+
+class RestoreCheckpoint:
+    """
+    نقطة استئناف الاستعادة داخل مجلد النسخة: عدد السجلات المرفوعة من كل جدول
+    بعد أي انقطاع تُكمل الاستعادة من حيث توقفت بدلاً من البدء من جديد
+    """
+
+    def __init__(self, backup_path):
+        self._file = Path(backup_path) / "restore_checkpoint.json"
+        self._lock = threading.Lock()
+        self.state = {}
+        if self._file.exists():
+            with open(self._file, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    @property
+    def resumed(self):
+        return bool(self.state)
+
+    def offset(self, table_name):
+        return self.state.get(table_name, 0)
+
+    def _save(self):
+        temp_file = self._file.with_suffix(".tmp")
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(temp_file, self._file)
 
+    def advance(self, table_name, count):
+        with self._lock:
+            self.state[table_name] = self.state.get(table_name, 0) + count
+            self._save()
 
-def restore_backup(backup_folder):
-    """استعادة نسخة احتياطية"""
+    def complete(self, table_name):
+        with self._lock:
+            self.state[table_name] = "done"
+            self._save()
+
+    def clear(self):
+        self._file.unlink(missing_ok=True)
+
+
+def restore_table(supabase, data_file, checkpoint, chunk_size=RESTORE_CHUNK_SIZE):
+    """
+    استعادة ملف جدول واحد على دفعات كبيرة، بدءاً من نقطة الاستئناف
+    تتوقف عند أول دفعة فيها سجلات فاشلة دون تقديم نقطة الاستئناف بعدها،
+    فتُعاد الدفعة نفسها في المحاولة التالية
+    ترجع (عدد السجلات المستعادة، هل اكتمل الجدول)
+    """
+    table_name = table_name_of(data_file)
+    done = checkpoint.offset(table_name)
+    
+    if done == "done":
+        print(f"  ⏭️ {table_name}: مستعاد مسبقاً")
+        return 0, True
+    
+    print(f"\n  📥 استعادة جدول: {table_name}..." + (f" (استئناف من السجل {done})" if done else ""))
+    
+    count = 0
+    try:
+        records = islice(read_backup_records(data_file), done, None)
+        while True:
+            batch = list(islice(records, chunk_size))
+            if not batch:
+                break
+            succeeded, failed = upsert_records(
+                supabase, table_name, batch, "id", chunk_size, verbose=False,
+                ignore_duplicates=table_name in INSERT_ONLY_TABLES,
+            )
+            if failed:
+                print(f"  ⚠️ {table_name}: فشل {len(failed)} سجل - توقفت الاستعادة عند السجل {done + count}")
+                return count, False
+            count += len(batch)
+            checkpoint.advance(table_name, len(batch))
+        
+        checkpoint.complete(table_name)
+        
+        if not count:
+            print(f"  ℹ️ {table_name} فارغ")
+        else:
+            print(f"  ✅ {table_name}: تمت استعادة {count} سجل")
+        return count, True
+        
+    except Exception as e:
+        # خطأ اتصال: الدفعات المكتملة محفوظة في نقطة الاستئناف والباقي يُستأنف لاحقاً
+        print(f"  ❌ خطأ في استعادة {table_name} عند السجل {done + count}: {str(e)}")
+        return count, False
+
+
+def restore_backup(backup_folder, jobs=BACKUP_JOBS, chunk_size=RESTORE_CHUNK_SIZE):
+    """استعادة نسخة احتياطية (بترتيب المفاتيح الأجنبية، على دفعات، والجداول المستقلة بالتوازي)"""
     
     if not SUPABASE_AVAILABLE:
         print("❌ لا يمكن استعادة النسخة - Supabase غير متوفر")
@@ -137,58 +487,157 @@ def restore_backup(backup_folder):
     
     # إنشاء اتصال
     try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        supabase = get_supabase()
         print("✅ تم الاتصال بقاعدة البيانات")
     except Exception as e:
         print(f"❌ فشل الاتصال: {str(e)}")
         return False
     
+    # سلسلة الاستعادة: النسخة الكاملة ثم النسخ التزايدية بالترتيب
+    try:
+        chain = resolve_backup_chain(backup_path)
+    except FileNotFoundError as e:
+        print(f"❌ {str(e)}")
+        return False
+    
+    total_restored = 0
+    for folder in chain:
+        restored, ok = restore_folder(supabase, folder, jobs, chunk_size)
+        total_restored += restored
+        if not ok:
+            # النسخ التزايدية التالية تفترض اكتمال ما قبلها
+            print("\n" + "=" * 60)
+            print(f"❌ لم تكتمل الاستعادة عند {folder.name} - أعد التشغيل للاستئناف")
+            print(f"📊 السجلات المستعادة في هذا التشغيل: {total_restored}")
+            print("=" * 60)
+            return False
+    
+    print("\n" + "=" * 60)
+    print(f"✅ اكتملت الاستعادة!")
+    print(f"📊 إجمالي السجلات المستعادة: {total_restored}")
+    print("=" * 60)
+    
+    return True
+
+
+def restore_folder(supabase, backup_path, jobs=BACKUP_JOBS, chunk_size=RESTORE_CHUNK_SIZE):
+    """
+    استعادة ملفات مجلد نسخة واحد (كامل أو تزايدي)
+    ترجع (عدد السجلات المستعادة، هل اكتملت كل الجداول)؛ المرحلة الفاشلة توقف ما بعدها
+    ونقطة الاستئناف لا تُحذف إلا بعد نجاح الجميع
+    """
+    
     # قراءة معلومات النسخة
-    info_file = backup_path / "backup_info.json"
-    if info_file.exists():
-        with open(info_file, 'r', encoding='utf-8') as f:
-            info = json.load(f)
-        print(f"📅 تاريخ النسخة: {info['date']}")
+    info = read_backup_info(backup_path)
+    print(f"\n📁 {backup_path.name}")
+    if info:
+        print(f"📅 تاريخ النسخة: {info['date']} ({info.get('type', 'full')})")
         print(f"📊 عدد السجلات: {info['total_records']}")
     
-    # استعادة كل جدول
+    checkpoint = RestoreCheckpoint(backup_path)
+    if checkpoint.resumed:
+        print("🔁 استئناف استعادة سابقة غير مكتملة")
+    
+    files = {table_name_of(path): path for path in list_data_files(backup_path)}
+    known = {table for phase in RESTORE_PHASES for table in phase}
+    # الجداول غير المعروفة تُستعاد في المرحلة الأخيرة
+    phases = RESTORE_PHASES[:-1] + [RESTORE_PHASES[-1] + sorted(set(files) - known)]
+    
     total_restored = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for phase in phases:
+            futures = [
+                executor.submit(restore_table, supabase, files[table], checkpoint, chunk_size)
+                for table in phase if table in files
+            ]
+            results = [future.result() for future in futures]
+            total_restored += sum(restored for restored, _ in results)
+            if not all(ok for _, ok in results):
+                return total_restored, False
+    
+    if not reset_sequences(supabase, [table for table in files if table in INTEGER_KEY_TABLES]):
+        return total_restored, False
+    
+    checkpoint.clear()
+    return total_restored, True
+
+
+def reset_sequences(supabase, tables):
+    """
+    ضبط تسلسل المفتاح الرقمي لكل جدول مستعاد على أعلى رقم فيه (RPC reset_serial_sequence)
+    الاستعادة تُدرج الأرقام الأصلية صراحة فيبقى التسلسل متأخراً ويصطدم به أول إدراج جديد
+    """
+    for table in tables:
+        try:
+            supabase.rpc("reset_serial_sequence", {"table_name": table}).execute()
+        except Exception as e:
+            print(f"  ❌ فشل ضبط تسلسل {table}: {str(e)}")
+            return False
+    return True
+
+
+def verify_backup(backup_folder):
+    """
+    التحقق من سلامة نسخة مقابل بيانها: وجود الملفات وأحجامها وبصماتها
+    قراءة متسلسلة واحدة لكل ملف بذاكرة محدودة، دون فك الضغط أو تحليل السجلات
+    """
+    backup_path = Path(backup_folder)
+    
+    print("=" * 60)
+    print(f"🔍 التحقق من النسخة: {backup_path.name}")
+    print("=" * 60)
+    
+    info = read_backup_info(backup_path)
+    if not info or "hash_algorithm" not in info:
+        print("❌ لا يوجد بيان (manifest) لهذه النسخة - لا يمكن التحقق منها")
+        return False
     
-    for json_file in backup_path.glob("*.json"):
-        if json_file.name == "backup_info.json":
+    ok = True
+    if not info.get("complete", False):
+        print("❌ النسخة سُجّلت غير مكتملة عند إنشائها")
+        ok = False
+    
+    chunk_size = info["hash_chunk_size"]
+    expected_files = set()
+    
+    for table, entry in info["table_stats"].items():
+        data_file = backup_path / entry["file"]
+        expected_files.add(entry["file"])
+        
+        if not data_file.exists():
+            print(f"  ❌ {table}: الملف مفقود ({entry['file']})")
+            ok = False
             continue
         
-        table_name = json_file.stem
-        print(f"\n  📥 استعادة جدول: {table_name}...")
+        size = data_file.stat().st_size
+        if size != entry["bytes"]:
+            print(f"  ❌ {table}: الحجم {size} لا يطابق {entry['bytes']}")
+            ok = False
+            continue
         
-        try:
-            # قراءة البيانات
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            if not data:
-                print(f"  ℹ️ {table_name} فارغ")
-                continue
-            
-            # إدراج البيانات
-            for record in data:
-                try:
-                    supabase.table(table_name).upsert(record).execute()
-                except Exception as e:
-                    print(f"  ⚠️ خطأ في سجل: {str(e)}")
-            
-            print(f"  ✅ تمت استعادة {len(data)} سجل")
-            total_restored += len(data)
-            
-        except Exception as e:
-            print(f"  ❌ خطأ في استعادة {table_name}: {str(e)}")
+        digest, chunk_hashes = hash_file(data_file, chunk_size)
+        if digest != entry["blake2b"]:
+            bad_chunks = [
+                i for i, (actual, expected) in enumerate(zip(chunk_hashes, entry["chunk_hashes"]))
+                if actual != expected
+            ]
+            first_bad = bad_chunks[0] * chunk_size if bad_chunks else 0
+            print(f"  ❌ {table}: البصمة لا تطابق (أول تلف عند البايت {first_bad})")
+            ok = False
+            continue
+        
+        print(f"  ✅ {table}: {entry['rows']} سجل، {size} بايت")
+    
+    # ملفات بيانات غير مذكورة في البيان
+    for data_file in list_data_files(backup_path):
+        if data_file.name not in expected_files:
+            print(f"  ⚠️ ملف غير موجود في البيان: {data_file.name}")
     
-    print("\n" + "=" * 60)
-    print(f"✅ اكتملت الاستعادة!")
-    print(f"📊 إجمالي السجلات المستعادة: {total_restored}")
+    print("=" * 60)
+    print("✅ النسخة سليمة" if ok else "❌ النسخة تالفة أو غير مكتملة")
     print("=" * 60)
     
-    return True
+    return ok
 
 
 def list_backups():
@@ -212,6 +661,13 @@ def list_backups():
             print(f"{i}. {backup.name}")
             print(f"   📅 التاريخ: {info['date']}")
             print(f"   📊 السجلات: {info['total_records']}")
+            print(f"   🗜️ الصيغة: {info.get('format', 'json')}")
+            if info.get('type') == 'incremental':
+                print(f"   🔗 تزايدية - الأساس: {info['base']}")
+            if 'total_bytes' in info:
+                print(f"   💾 الحجم: {info['total_bytes'] / 1024 / 1024:.2f} MB")
+            if 'hash_algorithm' in info:
+                print(f"   🔐 البيان: {'مكتمل' if info.get('complete') else '⚠️ غير مكتمل'}")
             print()
         else:
             print(f"{i}. {backup.name}")
@@ -233,13 +689,27 @@ def clean_old_backups(days=30):
     cutoff_date = datetime.now() - timedelta(days=days)
     deleted = 0
     
-    for backup in BACKUP_DIR.glob("backup_*"):
+    def backup_date_of(backup):
         # استخراج التاريخ من اسم المجلد
+        date_str = backup.name.replace("backup_", "").split("_")[0]
+        return datetime.strptime(date_str, "%Y%m%d")
+    
+    # النسخ الأساسية التي تحتاجها نسخ تزايدية باقية لا تُحذف
+    required = set()
+    for backup in BACKUP_DIR.glob("backup_*"):
+        try:
+            if backup_date_of(backup) >= cutoff_date:
+                required.update(path.name for path in resolve_backup_chain(backup))
+        except Exception:
+            pass
+    
+    for backup in BACKUP_DIR.glob("backup_*"):
         try:
-            date_str = backup.name.replace("backup_", "").split("_")[0]
-            backup_date = datetime.strptime(date_str, "%Y%m%d")
+            backup_date = backup_date_of(backup)
             
-            if backup_date < cutoff_date:
+            if backup_date < cutoff_date and backup.name in required:
+                print(f"  🔗 إبقاء {backup.name}: أساس لنسخة تزايدية")
+            elif backup_date < cutoff_date:
                 import shutil
                 shutil.rmtree(backup)
                 print(f"  🗑️ تم حذف: {backup.name}")
@@ -256,33 +726,70 @@ def clean_old_backups(days=30):
     print("=" * 60)
 
 
+def positive_int(value):
+    """نوع argparse لعدد صحيح موجب (0 عامل أو صفحة فارغة يعلّق النسخ أو يفشله)"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"يجب أن تكون القيمة 1 أو أكثر: {value}")
+    return number
+
+
 def main():
     """القائمة الرئيسية"""
     
-    if len(sys.argv) > 1:
-        command = sys.argv[1]
+    parser = argparse.ArgumentParser(description="النسخ الاحتياطي لقاعدة البيانات")
+    commands = parser.add_subparsers(dest="command")
+    
+    create_parser = commands.add_parser("create")
+    create_parser.add_argument("--page-size", type=positive_int, default=BACKUP_PAGE_SIZE,
+                               help="عدد السجلات في كل صفحة")
+    create_parser.add_argument("--jobs", type=positive_int, default=BACKUP_JOBS,
+                               help="عدد عمليات الجلب المتوازية")
+    create_parser.add_argument("--incremental", action="store_true",
+                               help="نسخ السجلات المتغيرة منذ آخر نسخة فقط")
+    create_parser.add_argument("--format", choices=list(BACKUP_FORMATS), default=BACKUP_FORMAT,
+                               help="صيغة ملفات النسخة")
+    
+    restore_parser = commands.add_parser("restore")
+    restore_parser.add_argument("folder", nargs="?")
+    restore_parser.add_argument("--jobs", type=positive_int, default=BACKUP_JOBS,
+                                help="عدد الجداول المستعادة بالتوازي")
+    restore_parser.add_argument("--chunk-size", type=positive_int, default=RESTORE_CHUNK_SIZE,
+                                help="عدد السجلات في كل طلب upsert")
+    
+    verify_parser = commands.add_parser("verify")
+    verify_parser.add_argument("folder")
+    
+    commands.add_parser("list")
+    
+    clean_parser = commands.add_parser("clean")
+    clean_parser.add_argument("days", nargs="?", type=int, default=30)
+    
+    args = parser.parse_args()
+    
+    if args.command == "create":
+        if not create_backup(page_size=args.page_size, jobs=args.jobs, fmt=args.format,
+                             incremental=args.incremental):
+            sys.exit(1)
         
-        if command == "create":
-            create_backup()
-            
-        elif command == "restore":
-            if len(sys.argv) > 2:
-                restore_backup(sys.argv[2])
-            else:
-                backups = list_backups()
-                if backups:
-                    print("استخدم: python backup.py restore backups/backup_YYYYMMDD_HHMMSS")
-                    
-        elif command == "list":
-            list_backups()
-            
-        elif command == "clean":
-            days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
-            clean_old_backups(days)
-            
+    elif args.command == "restore":
+        if args.folder:
+            restore_backup(args.folder, jobs=args.jobs, chunk_size=args.chunk_size)
         else:
-            print(f"❌ أمر غير معروف: {command}")
-            print_usage()
+            backups = list_backups()
+            if backups:
+                print("استخدم: python backup.py restore backups/backup_YYYYMMDD_HHMMSS")
+                
+    elif args.command == "verify":
+        if not verify_backup(args.folder):
+            sys.exit(1)
+        
+    elif args.command == "list":
+        list_backups()
+        
+    elif args.command == "clean":
+        clean_old_backups(args.days)
+        
     else:
         print_usage()
 
@@ -293,12 +800,19 @@ def print_usage():
 استخدام سكريبت النسخ الاحتياطي:
 
   python backup.py create              # إنشاء نسخة احتياطية جديدة
+    [--page-size N]                    # عدد السجلات في كل صفحة
+    [--jobs N]                         # عدد الجداول/الصفحات المجلوبة بالتوازي
+    [--format ndjson|gzip|zstd|parquet] # صيغة الملفات (الافتراضي من config.py)
+    [--incremental]                    # السجلات المتغيرة منذ آخر نسخة فقط
   python backup.py list                # عرض النسخ المتوفرة
-  python backup.py restore [مجلد]     # استعادة نسخة محددة
+  python backup.py verify [مجلد]      # التحقق من سلامة نسخة مقابل بيانها
+  python backup.py restore [مجلد]     # استعادة نسخة محددة (مع سلسلة أساسها إن كانت تزايدية)
+    [--jobs N] [--chunk-size N]        # تُستأنف تلقائياً بعد أي انقطاع
   python backup.py clean [أيام]       # حذف النسخ القديمة (الافتراضي: 30 يوم)
 
 أمثلة:
   python backup.py create
+  python backup.py create --incremental
   python backup.py list
   python backup.py restore backups/backup_20251130_120530
   python backup.py clean 60
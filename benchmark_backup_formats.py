@@ -0,0 +1,114 @@
+"""
+مقارنة صيغ النسخ الاحتياطية على بيانات تركيبية
+يقيس لكل صيغة: الحجم على القرص، زمن الكتابة، وزمن القراءة عند الاستعادة
+"""
+
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from backup_formats import BACKUP_FORMATS, format_suffix, open_table_writer, read_backup_records
+
+ACTIONS = ["تسجيل دخول", "تقديم طلب", "موافقة", "رفض", "تعديل بيانات", "تسجيل خروج"]
+
+
+def synthetic_pages(rows, page_size, seed=42):
+    """صفحات تركيبية تشبه جدول activity_log"""
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    for offset in range(0, rows, page_size):
+        yield [
+            {
+                "id": i,
+                "emp_id": f"{rng.randint(1, 5000):05d}",
+                "action": rng.choice(ACTIONS),
+                "details": f"طلب رقم REQ-{rng.randint(1, 10**6)} - {rng.choice(ACTIONS)}",
+                "ip_address": f"10.0.{rng.randint(0, 255)}.{rng.randint(0, 255)}",
+                "created_at": (start + timedelta(minutes=i)).isoformat(),
+            }
+            for i in range(offset + 1, min(offset + page_size, rows) + 1)
+        ]
+
+
+def benchmark(rows, page_size):
+    """تشغيل المقارنة وإرجاع نتيجة كل صيغة"""
+    pages = list(synthetic_pages(rows, page_size))
+    work_dir = Path(tempfile.mkdtemp(prefix="backup_bench_"))
+    results = []
+
+    try:
+        for fmt in BACKUP_FORMATS:
+            try:
+                suffix = format_suffix(fmt)
+            except RuntimeError as e:
+                print(f"  ⏭️ تخطي {fmt}: {str(e)}")
+                continue
+
+            path = work_dir / f"activity_log{suffix}"
+
+            start = time.perf_counter()
+            writer = open_table_writer(path, fmt)
+            for page in pages:
+                writer.write_page(page)
+            writer.close()
+            write_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            restored = sum(1 for _ in read_backup_records(path))
+            read_seconds = time.perf_counter() - start
+
+            assert restored == rows, f"{fmt}: {restored} != {rows}"
+            results.append({
+                "format": fmt,
+                "bytes": path.stat().st_size,
+                "write_seconds": write_seconds,
+                "read_seconds": read_seconds,
+            })
+
+        # المرجع: JSON المنسق القديم (indent=2)
+        legacy = work_dir / "activity_log.json"
+        start = time.perf_counter()
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump([r for page in pages for r in page], f, ensure_ascii=False, indent=2)
+        write_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        restored = sum(1 for _ in read_backup_records(legacy))
+        results.append({
+            "format": "json (قديم)",
+            "bytes": legacy.stat().st_size,
+            "write_seconds": write_seconds,
+            "read_seconds": time.perf_counter() - start,
+        })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="مقارنة صيغ النسخ الاحتياطية")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"📊 مقارنة صيغ النسخ الاحتياطية ({args.rows} سجل)")
+    print("=" * 60)
+
+    results = benchmark(args.rows, args.page_size)
+
+    print(f"{'الصيغة':15} {'الحجم MB':>10} {'كتابة (ث)':>10} {'قراءة (ث)':>10}")
+    for r in results:
+        print(
+            f"{r['format']:15} {r['bytes'] / 1024 / 1024:10.2f} "
+            f"{r['write_seconds']:10.2f} {r['read_seconds']:10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+قياس أداء التقارير على بيانات تركيبية (100 ألف موظف افتراضياً)
+يقيس لكل تقرير: زمن الحساب الأول، زمن القراءة من الذاكرة المؤقتة،
+وزمن تصدير xlsx بوضع write_only مع حجم الملف وأقصى ذاكرة أثناء التصدير
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import DEPARTMENTS
+from reports import REPORTS, FrameSource, ReportEngine, export_xlsx, labelled
+
+LEAVE_TITLES = ["إجازة سنوية", "إجازة اضطرارية", "إجازة مرضية"]
+LOAN_TITLES = ["سلفة زواج", "سلفة سيارة", "سلفة شخصية"]
+STATUSES = np.array(["Pending", "Approved", "Rejected"])
+
+
+def synthetic_data(employees, requests_per_employee=3, seed=42):
+    """إطارات تركيبية بنفس أعمدة مصادر التقارير"""
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp(date.today())
+    ids = np.char.mod("%06d", np.arange(1, employees + 1))
+
+    employees_df = pd.DataFrame({
+        "id": ids,
+        "name": np.char.add("موظف ", ids),
+        "department": rng.choice(DEPARTMENTS, employees),
+        "salary": rng.integers(4000, 30000, employees).astype(float),
+        "hire_date": today - pd.to_timedelta(rng.integers(30, 5000, employees), unit="D"),
+    })
+
+    n = employees * requests_per_employee
+    emp_index = rng.integers(0, employees, n)
+    kind = rng.choice(["طلب إجازة", "سلفة", "تعريف راتب"], n, p=[0.6, 0.25, 0.15])
+    created = today - pd.to_timedelta(rng.integers(0, 730, n), unit="D")
+    start = created + pd.to_timedelta(rng.integers(1, 30, n), unit="D")
+    is_leave = kind == "طلب إجازة"
+    is_loan = kind == "سلفة"
+    titles = np.where(
+        is_leave, rng.choice(LEAVE_TITLES, n), np.where(is_loan, rng.choice(LOAN_TITLES, n), "تعريف للبنك")
+    )
+    requests_df = pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "emp_id": ids[emp_index],
+        "employee": employees_df["name"].to_numpy()[emp_index],
+        "type": kind,
+        "title": titles,
+        "start_date": start.where(is_leave),
+        "end_date": (start + pd.to_timedelta(rng.integers(0, 14, n), unit="D")).where(is_leave),
+        "loan_amount": np.where(is_loan, rng.integers(1, 40, n) * 500, 0).astype(float),
+        "status": STATUSES[rng.choice(3, n, p=[0.2, 0.7, 0.1])],
+        "current_stage": rng.integers(2, 7, n),
+        "approved_by": None,
+        "created_at": created,
+    })
+
+    def documents(number_prefix):
+        return pd.DataFrame({
+            "emp_id": ids,
+            "doc_number": np.char.add(number_prefix, ids),
+            "expiry_date": today + pd.to_timedelta(rng.integers(-60, 1500, employees), unit="D"),
+        })
+
+    return {
+        "employees": employees_df,
+        "requests": requests_df,
+        "passports": documents("P"),
+        "residencies": documents("2"),
+    }
+
+
+def benchmark(employees, requests_per_employee):
+    """تشغيل القياس وإرجاع نتيجة كل تقرير"""
+    start = time.perf_counter()
+    data = synthetic_data(employees, requests_per_employee)
+    print(f"  ⏱️ توليد البيانات: {time.perf_counter() - start:.2f} ث ({len(data['requests'])} طلب)")
+
+    engine = ReportEngine([FrameSource(data)])
+    params = {
+        "department_summary": {},
+        "leave_consumption": {},
+        "loans": {},
+        "employee_requests": {"emp_id": data["employees"]["id"].iloc[0]},
+        "document_expiry": {},
+    }
+    work_dir = Path(tempfile.mkdtemp(prefix="reports_bench_"))
+    results = []
+
+    try:
+        for name in REPORTS:
+            start = time.perf_counter()
+            frame = engine.run(name, **params[name])
+            cold_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            engine.run(name, **params[name])
+            warm_seconds = time.perf_counter() - start
+
+            path = work_dir / f"{name}.xlsx"
+            sheets = {REPORTS[name][0]: labelled(frame)}
+            start = time.perf_counter()
+            export_xlsx(sheets, path)
+            export_seconds = time.perf_counter() - start
+
+            # الذاكرة في تشغيل منفصل لأن tracemalloc يبطئ التصدير نفسه
+            tracemalloc.start()
+            export_xlsx(sheets, path)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results.append({
+                "report": name,
+                "rows": len(frame),
+                "cold_seconds": cold_seconds,
+                "warm_seconds": warm_seconds,
+                "export_seconds": export_seconds,
+                "export_bytes": path.stat().st_size,
+                "export_peak_bytes": peak,
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس أداء التقارير")
+    parser.add_argument("--employees", type=int, default=100_000)
+    parser.add_argument("--requests-per-employee", type=int, default=3)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"📊 قياس أداء التقارير ({args.employees} موظف)")
+    print("=" * 60)
+
+    results = benchmark(args.employees, args.requests_per_employee)
+
+    print(
+        f"{'التقرير':20} {'الصفوف':>8} {'حساب (ث)':>9} {'مخزن (مث)':>10} "
+        f"{'تصدير (ث)':>10} {'الملف MB':>9} {'ذاكرة MB':>9}"
+    )
+    for r in results:
+        print(
+            f"{r['report']:20} {r['rows']:8} {r['cold_seconds']:9.2f} {r['warm_seconds'] * 1000:10.3f} "
+            f"{r['export_seconds']:10.2f} {r['export_bytes'] / 1024 / 1024:9.2f} "
+            f"{r['export_peak_bytes'] / 1024 / 1024:9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
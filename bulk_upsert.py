@@ -0,0 +1,64 @@
+"""
+رفع السجلات إلى Supabase على دفعات
+مشترك بين سكريبت الاستيراد وسكريبت استعادة النسخ الاحتياطية
+"""
+
+import time
+
+from config import IMPORT_CHUNK_SIZE
+
+# فئات رموز SQLSTATE التي تعني أن سجلاً بعينه مرفوض (بيانات غير صالحة أو قيد مخالَف)
+ROW_ERROR_CLASSES = ("22", "23")
+
+
+def is_row_error(error):
+    """
+    هل الخطأ سببه سجلات الدفعة نفسها (فيفيد تقسيمها لعزل السجل المسبب)؟
+    أخطاء الاتصال و HTTP والصلاحيات تخص الدفعة كلها ولا يحلها التقسيم
+    """
+    code = getattr(error, "code", None)
+    return isinstance(code, str) and code[:2] in ROW_ERROR_CLASSES
+
+
+def upsert_records(client, table, records, label_key="id", chunk_size=IMPORT_CHUNK_SIZE, verbose=True,
+                   ignore_duplicates=False):
+    """
+    رفع السجلات على دفعات (chunk_size سجل في كل طلب)
+    الدفعة الفاشلة بخطأ سجل تُقسم إلى نصفين تكرارياً حتى يُعزل السجل المسبب للخطأ،
+    أما خطأ الاتصال أو HTTP فيُرفع للمستدعي دون تقسيم الدفعة إلى طلبات إضافية
+    (ما رُفع قبله يبقى، وupsert يجعل إعادة التشغيل آمنة)
+    ignore_duplicates=True يجعلها إدراجاً فقط (ON CONFLICT DO NOTHING) للجداول التي لا تقبل التعديل
+    ترجع عدد السجلات الناجحة وقائمة السجلات الفاشلة
+    """
+    succeeded = 0
+    failed = []
+
+    def send(batch):
+        nonlocal succeeded
+        try:
+            client.table(table).upsert(batch, ignore_duplicates=ignore_duplicates).execute()
+            succeeded += len(batch)
+        except Exception as e:
+            if not is_row_error(e):
+                print(f"  ❌ فشل إرسال دفعة من {len(batch)} سجل - {str(e)}")
+                raise
+            if len(batch) == 1:
+                print(f"  ❌ خطأ في: {batch[0].get(label_key, 'غير معروف')} - {str(e)}")
+                failed.append(batch[0])
+                return
+            middle = len(batch) // 2
+            send(batch[:middle])
+            send(batch[middle:])
+
+    start = time.perf_counter()
+    for i in range(0, len(records), chunk_size):
+        send(records[i:i + chunk_size])
+    elapsed = time.perf_counter() - start
+
+    if verbose:
+        rate = succeeded / elapsed if elapsed > 0 else 0
+        print(f"  ⚡ {succeeded} سجل في {elapsed:.2f} ثانية ({rate:.0f} سجل/ثانية)")
+        if failed:
+            print(f"  ⚠️ فشل {len(failed)} سجل")
+
+    return succeeded, failed
@@ -13,11 +13,17 @@ CREATE TABLE IF NOT EXISTS employees (
     phone TEXT,
     hire_date DATE,
     salary DECIMAL(10, 2),
+    password_hash TEXT,
     is_active BOOLEAN DEFAULT true,
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
+-- ترقية جدول الموظفين: بصمة كلمة مرور الدخول (scrypt مملّحة، انظر passwords.py)
+-- تُملأ من عمود password في employees.xlsx عند الاستيراد، ولا تُخزن كلمة المرور نفسها
+ALTER TABLE employees ADD COLUMN IF NOT EXISTS password_hash TEXT;
+ALTER TABLE employees DROP COLUMN IF EXISTS password;
+
 -- جدول الطلبات
 CREATE TABLE IF NOT EXISTS requests (
     id TEXT PRIMARY KEY,
@@ -26,8 +32,12 @@ CREATE TABLE IF NOT EXISTS requests (
     type TEXT NOT NULL,
     title TEXT NOT NULL,
     details TEXT,
-    start_date DATE NOT NULL,
-    end_date DATE NOT NULL,
+    start_date DATE,
+    end_date DATE,
+    loan_amount DECIMAL(10, 2) DEFAULT 0,
+    current_stage INTEGER DEFAULT 2,
+    workflow TEXT,
+    history JSONB DEFAULT '[]'::jsonb,
     status TEXT DEFAULT 'معلق' CHECK (status IN ('معلق', 'موافق عليه', 'مرفوض')),
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW(),
@@ -36,6 +46,15 @@ CREATE TABLE IF NOT EXISTS requests (
     rejection_reason TEXT
 );
 
+-- ترقية جدول الطلبات في القواعد المنشأة مسبقاً (مسار الموافقات متعدد المراحل)
+ALTER TABLE requests ALTER COLUMN start_date DROP NOT NULL;
+ALTER TABLE requests ALTER COLUMN end_date DROP NOT NULL;
+ALTER TABLE requests ADD COLUMN IF NOT EXISTS loan_amount DECIMAL(10, 2) DEFAULT 0;
+ALTER TABLE requests ADD COLUMN IF NOT EXISTS current_stage INTEGER DEFAULT 2;
+ALTER TABLE requests ADD COLUMN IF NOT EXISTS history JSONB DEFAULT '[]'::jsonb;
+-- مسار الموافقات المختار عند التقديم (NULL للطلبات القديمة: يُحسب من النوع والمبلغ)
+ALTER TABLE requests ADD COLUMN IF NOT EXISTS workflow TEXT;
+
 -- جدول الجوازات
 CREATE TABLE IF NOT EXISTS passports (
     id SERIAL PRIMARY KEY,
@@ -82,19 +101,41 @@ CREATE TABLE IF NOT EXISTS notifications (
     message TEXT NOT NULL,
     type TEXT DEFAULT 'info' CHECK (type IN ('info', 'warning', 'error', 'success')),
     is_read BOOLEAN DEFAULT false,
-    created_at TIMESTAMP DEFAULT NOW()
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- ترقية جدول التنبيهات: is_read يتغير بعد الإدراج فتتتبع النسخ التزايدية updated_at
+-- (الصفوف الموجودة تأخذ وقت الترقية فتدخل كلها في أول نسخة تزايدية بعدها مرة واحدة)
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW();
+
+-- سجل أحداث الطلبات: كل انتقال حدث مستقل (إلحاق فقط، بلا تعديل أو حذف)
+-- بدون مفتاح أجنبي حتى يبقى السجل كاملاً للتحليل بعد حذف الطلب
+CREATE TABLE IF NOT EXISTS request_events (
+    id BIGSERIAL PRIMARY KEY,
+    request_id TEXT NOT NULL,
+    stage_from INTEGER,
+    stage_to INTEGER NOT NULL,
+    actor TEXT NOT NULL,
+    action TEXT NOT NULL CHECK (action IN ('submit', 'approve', 'reject')),
+    ts TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
 -- إنشاء فهارس لتحسين الأداء
 CREATE INDEX IF NOT EXISTS idx_requests_emp_id ON requests(emp_id);
 CREATE INDEX IF NOT EXISTS idx_requests_status ON requests(status);
 CREATE INDEX IF NOT EXISTS idx_requests_created_at ON requests(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_requests_stage_status ON requests(current_stage, status);
+-- بصمة التغيير في request_store.py تقرأ MAX(updated_at) من هذا الفهرس
+CREATE INDEX IF NOT EXISTS idx_requests_updated_at ON requests(updated_at);
 CREATE INDEX IF NOT EXISTS idx_passports_emp_id ON passports(emp_id);
 CREATE INDEX IF NOT EXISTS idx_passports_expiry ON passports(expiry_date);
 CREATE INDEX IF NOT EXISTS idx_residencies_emp_id ON residencies(emp_id);
 CREATE INDEX IF NOT EXISTS idx_residencies_expiry ON residencies(expiry_date);
 CREATE INDEX IF NOT EXISTS idx_activity_emp_id ON activity_log(emp_id);
 CREATE INDEX IF NOT EXISTS idx_notifications_emp_id ON notifications(emp_id);
+CREATE INDEX IF NOT EXISTS idx_notifications_updated_at ON notifications(updated_at);
+CREATE INDEX IF NOT EXISTS idx_request_events_request ON request_events(request_id, id);
 
 -- إدراج بيانات تجريبية للموظفين
 INSERT INTO employees (id, name, role, department, email, hire_date, salary) VALUES
@@ -138,8 +179,26 @@ DROP TRIGGER IF EXISTS update_residencies_updated_at ON residencies;
 CREATE TRIGGER update_residencies_updated_at BEFORE UPDATE ON residencies
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+DROP TRIGGER IF EXISTS update_notifications_updated_at ON notifications;
+CREATE TRIGGER update_notifications_updated_at BEFORE UPDATE ON notifications
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- منع تعديل أو حذف أحداث الطلبات
+CREATE OR REPLACE FUNCTION forbid_request_event_changes()
+RETURNS TRIGGER AS $$
+BEGIN
+    RAISE EXCEPTION 'request_events سجل إلحاق فقط';
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS request_events_append_only ON request_events;
+CREATE TRIGGER request_events_append_only BEFORE UPDATE OR DELETE ON request_events
+    FOR EACH ROW EXECUTE FUNCTION forbid_request_event_changes();
+
 -- دالة للتحقق من انتهاء صلاحية الوثائق
-CREATE OR REPLACE FUNCTION check_document_expiry()
+-- days_ahead = NOTIFICATION_DAYS_BEFORE_EXPIRY في config.py (استعلام نطاق عبر idx_*_expiry)
+DROP FUNCTION IF EXISTS check_document_expiry();
+CREATE OR REPLACE FUNCTION check_document_expiry(days_ahead INTEGER DEFAULT 90)
 RETURNS TABLE(
     doc_type TEXT,
     emp_id TEXT,
@@ -159,8 +218,7 @@ BEGIN
         (p.expiry_date - CURRENT_DATE)::INTEGER
     FROM passports p
     JOIN employees e ON p.emp_id = e.id
-    WHERE p.expiry_date <= CURRENT_DATE + INTERVAL '90 days'
-    AND p.expiry_date >= CURRENT_DATE
+    WHERE p.expiry_date BETWEEN CURRENT_DATE AND CURRENT_DATE + days_ahead
     
     UNION ALL
     
@@ -173,20 +231,117 @@ BEGIN
         (r.expiry_date - CURRENT_DATE)::INTEGER
     FROM residencies r
     JOIN employees e ON r.emp_id = e.id
-    WHERE r.expiry_date <= CURRENT_DATE + INTERVAL '90 days'
-    AND r.expiry_date >= CURRENT_DATE
+    WHERE r.expiry_date BETWEEN CURRENT_DATE AND CURRENT_DATE + days_ahead
     
     ORDER BY expiry_date;
 END;
 $$ LANGUAGE plpgsql;
 
--- عرض إحصائيات سريعة
+-- عدادات الإحصائيات المادية: تُحدَّث تدريجياً بالمشغلات بدل COUNT(*) عند كل قراءة
+CREATE TABLE IF NOT EXISTS stats_counters (
+    name TEXT PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0,
+    reconciled_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION bump_stats_counter(counter TEXT, delta BIGINT)
+RETURNS VOID AS $$
+BEGIN
+    IF delta <> 0 THEN
+        INSERT INTO stats_counters (name, value) VALUES (counter, delta)
+        ON CONFLICT (name) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_active_employees()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM bump_stats_counter('active_employees',
+        (CASE WHEN TG_OP <> 'DELETE' AND NEW.is_active THEN 1 ELSE 0 END)
+      - (CASE WHEN TG_OP <> 'INSERT' AND OLD.is_active THEN 1 ELSE 0 END));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_pending_requests()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM bump_stats_counter('pending_requests',
+        (CASE WHEN TG_OP <> 'DELETE' AND NEW.status = 'معلق' THEN 1 ELSE 0 END)
+      - (CASE WHEN TG_OP <> 'INSERT' AND OLD.status = 'معلق' THEN 1 ELSE 0 END));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- TG_ARGV[0] = اسم العداد؛ النافذة 90 يوماً = NOTIFICATION_DAYS_BEFORE_EXPIRY في config.py
+CREATE OR REPLACE FUNCTION track_expiring_documents()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM bump_stats_counter(TG_ARGV[0],
+        (CASE WHEN TG_OP <> 'DELETE'
+              AND NEW.expiry_date BETWEEN CURRENT_DATE AND CURRENT_DATE + 90 THEN 1 ELSE 0 END)
+      - (CASE WHEN TG_OP <> 'INSERT'
+              AND OLD.expiry_date BETWEEN CURRENT_DATE AND CURRENT_DATE + 90 THEN 1 ELSE 0 END));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS count_active_employees ON employees;
+CREATE TRIGGER count_active_employees AFTER INSERT OR UPDATE OF is_active OR DELETE ON employees
+    FOR EACH ROW EXECUTE FUNCTION track_active_employees();
+
+DROP TRIGGER IF EXISTS count_pending_requests ON requests;
+CREATE TRIGGER count_pending_requests AFTER INSERT OR UPDATE OF status OR DELETE ON requests
+    FOR EACH ROW EXECUTE FUNCTION track_pending_requests();
+
+DROP TRIGGER IF EXISTS count_expiring_passports ON passports;
+CREATE TRIGGER count_expiring_passports AFTER INSERT OR UPDATE OF expiry_date OR DELETE ON passports
+    FOR EACH ROW EXECUTE FUNCTION track_expiring_documents('expiring_passports');
+
+DROP TRIGGER IF EXISTS count_expiring_residencies ON residencies;
+CREATE TRIGGER count_expiring_residencies AFTER INSERT OR UPDATE OF expiry_date OR DELETE ON residencies
+    FOR EACH ROW EXECUTE FUNCTION track_expiring_documents('expiring_residencies');
+
+-- بعد الاستعادة: السجلات تُدرج بأرقامها الأصلية فلا يتقدم تسلسل SERIAL، فيُضبط على أعلى رقم
+-- حتى لا يصطدم أول إدراج جديد بسجل مستعاد (تستدعيها backup_script.py عبر RPC)
+CREATE OR REPLACE FUNCTION reset_serial_sequence(table_name TEXT)
+RETURNS BIGINT AS $$
+DECLARE
+    max_id BIGINT;
+BEGIN
+    EXECUTE format('SELECT COALESCE(MAX(id), 0) FROM %I', table_name) INTO max_id;
+    PERFORM setval(pg_get_serial_sequence(table_name, 'id'), GREATEST(max_id, 1), max_id > 0);
+    RETURN max_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- المطابقة الدورية: إعادة العد الكامل (نافذة الانتهاء تتحرك يومياً مع CURRENT_DATE)
+-- جدولة يومية مثلاً عبر pg_cron: SELECT cron.schedule('0 0 * * *', 'SELECT refresh_stats_counters()');
+CREATE OR REPLACE FUNCTION refresh_stats_counters(days_ahead INTEGER DEFAULT 90)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO stats_counters (name, value, reconciled_at) VALUES
+        ('active_employees', (SELECT COUNT(*) FROM employees WHERE is_active = true), NOW()),
+        ('pending_requests', (SELECT COUNT(*) FROM requests WHERE status = 'معلق'), NOW()),
+        ('expiring_passports', (SELECT COUNT(*) FROM passports
+            WHERE expiry_date BETWEEN CURRENT_DATE AND CURRENT_DATE + days_ahead), NOW()),
+        ('expiring_residencies', (SELECT COUNT(*) FROM residencies
+            WHERE expiry_date BETWEEN CURRENT_DATE AND CURRENT_DATE + days_ahead), NOW())
+    ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value, reconciled_at = EXCLUDED.reconciled_at;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refresh_stats_counters();
+
+-- عرض إحصائيات سريعة (قراءة أربعة صفوف من العدادات)
 CREATE OR REPLACE VIEW stats_summary AS
 SELECT 
-    (SELECT COUNT(*) FROM employees WHERE is_active = true) as active_employees,
-    (SELECT COUNT(*) FROM requests WHERE status = 'معلق') as pending_requests,
-    (SELECT COUNT(*) FROM passports WHERE expiry_date <= CURRENT_DATE + INTERVAL '90 days') as expiring_passports,
-    (SELECT COUNT(*) FROM residencies WHERE expiry_date <= CURRENT_DATE + INTERVAL '90 days') as expiring_residencies;
+    COALESCE(MAX(value) FILTER (WHERE name = 'active_employees'), 0) as active_employees,
+    COALESCE(MAX(value) FILTER (WHERE name = 'pending_requests'), 0) as pending_requests,
+    COALESCE(MAX(value) FILTER (WHERE name = 'expiring_passports'), 0) as expiring_passports,
+    COALESCE(MAX(value) FILTER (WHERE name = 'expiring_residencies'), 0) as expiring_residencies
+FROM stats_counters;
 
 -- تعليقات على الجداول
 COMMENT ON TABLE employees IS 'جدول بيانات الموظفين';
@@ -195,3 +350,4 @@ COMMENT ON TABLE passports IS 'جدول بيانات جوازات السفر';
 COMMENT ON TABLE residencies IS 'جدول بيانات الإقامات';
 COMMENT ON TABLE activity_log IS 'سجل نشاط المستخدمين';
 COMMENT ON TABLE notifications IS 'جدول التنبيهات';
+COMMENT ON TABLE stats_counters IS 'عدادات الإحصائيات المادية';
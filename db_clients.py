@@ -0,0 +1,130 @@
+"""
+اتصالات قاعدة البيانات المشتركة
+عميل Supabase واحد لكل العملية (جلسة HTTP دائمة keep-alive)،
+ومجمّع اتصالات psycopg2 ومحرك SQLAlchemy اختياريان لـ PostgreSQL
+جميع السكربتات والتطبيق تستخدم هذه الدوال بدلاً من create_client / psycopg2.connect
+"""
+
+import atexit
+import threading
+from contextlib import contextmanager
+
+from config import (
+    SUPABASE_URL, SUPABASE_KEY, DATABASE_URL,
+    DB_POOL_MIN_CONNECTIONS, DB_POOL_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS,
+)
+
+_lock = threading.Lock()
+_supabase = None
+_http_client = None
+_pg_pools = {}
+_pg_slots = {}
+_engines = {}
+
+
+def _client_options():
+    """
+    خيارات عميل Supabase مع جلسة httpx مشتركة بحدود اتصالات مناسبة للتوازي
+    httpx_client مدعوم منذ supabase 2.16.0 (المثبت في requirements_complete.txt)؛
+    الإصدارات الأقدم ترفضه فيعمل العميل بجلساته الافتراضية دون هذا التجميع
+    """
+    global _http_client
+    import httpx
+    from supabase import ClientOptions
+
+    limits = httpx.Limits(
+        max_connections=DB_POOL_MAX_CONNECTIONS * 2,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    )
+    http_client = httpx.Client(limits=limits, timeout=120)
+    try:
+        options = ClientOptions(httpx_client=http_client)
+    except TypeError:
+        http_client.close()
+        return ClientOptions()
+    _http_client = http_client
+    return options
+
+
+def get_supabase():
+    """عميل Supabase المشترك (يُنشأ عند أول استخدام ويُعاد استخدامه)"""
+    global _supabase
+    if _supabase is None:
+        with _lock:
+            if _supabase is None:
+                from supabase import create_client
+                _supabase = create_client(SUPABASE_URL, SUPABASE_KEY, options=_client_options())
+    return _supabase
+
+
+def get_pg_pool(dsn=DATABASE_URL):
+    """مجمّع اتصالات psycopg2 آمن للخيوط لرابط معين"""
+    pool = _pg_pools.get(dsn)
+    if pool is None:
+        with _lock:
+            pool = _pg_pools.get(dsn)
+            if pool is None:
+                from psycopg2.pool import ThreadedConnectionPool
+                pool = ThreadedConnectionPool(DB_POOL_MIN_CONNECTIONS, DB_POOL_MAX_CONNECTIONS, dsn)
+                # ThreadedConnectionPool يرفع PoolError عند نفاد الاتصالات بدل الانتظار،
+                # فعدد الاستعارات المتزامنة محدود بإشارة بنفس حجم المجمّع
+                _pg_slots[dsn] = threading.BoundedSemaphore(DB_POOL_MAX_CONNECTIONS)
+                _pg_pools[dsn] = pool
+    return pool
+
+
+@contextmanager
+def pg_connection(dsn=DATABASE_URL):
+    """
+    استعارة اتصال من المجمّع داخل معاملة واحدة:
+    تُعتمد عند النجاح وتُلغى عند الخطأ، ثم يعود الاتصال للمجمّع
+    عند انشغال كل الاتصالات ينتظر المستدعي حتى يعود أحدها
+    """
+    pool = get_pg_pool(dsn)
+    slots = _pg_slots[dsn]
+    slots.acquire()
+    try:
+        conn = pool.getconn()
+        try:
+            with conn:
+                yield conn
+        finally:
+            pool.putconn(conn)
+    finally:
+        slots.release()
+
+
+def get_engine(dsn=DATABASE_URL):
+    """محرك SQLAlchemy بمجمّع اتصالات (لاستعلامات pandas.read_sql مثلاً)"""
+    engine = _engines.get(dsn)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(dsn)
+            if engine is None:
+                from sqlalchemy import create_engine
+                engine = create_engine(
+                    dsn,
+                    pool_size=DB_POOL_MIN_CONNECTIONS,
+                    max_overflow=DB_POOL_MAX_CONNECTIONS - DB_POOL_MIN_CONNECTIONS,
+                    pool_pre_ping=True,
+                )
+                _engines[dsn] = engine
+    return engine
+
+
+@atexit.register
+def close_all():
+    """إغلاق جميع الاتصالات المفتوحة عند انتهاء العملية"""
+    global _supabase, _http_client
+    with _lock:
+        for pool in _pg_pools.values():
+            pool.closeall()
+        _pg_pools.clear()
+        _pg_slots.clear()
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+        _supabase = None
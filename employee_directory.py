@@ -0,0 +1,250 @@
+"""
+دليل الموظفين المخزن مؤقتاً
+نسخة واحدة لكل العملية من بيانات الموظفين مفهرسة برقم الموظف،
+تُحدّث في الخلفية كل فترة وتُبطل صراحةً عند تعديل الموظفين (الاستيراد أو مدير النظام)
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from config import (
+    USE_DATABASE,
+    EMPLOYEE_CACHE_TTL, EMPLOYEE_CACHE_REFRESH_INTERVAL, EMPLOYEE_CACHE_STAMP,
+)
+from passwords import hash_password, verify_password
+
+
+class StaticEmployeeSource:
+    """
+    مصدر ثابت من قاموس في الذاكرة (USERS_DB للتجربة)
+    كلمات المرور لا تُنسخ إلى سجلات الدليل، وتُجزّأ مرة لكل موظف عند أول دخول
+    """
+
+    def __init__(self, users):
+        self._users = users
+        self._hashes = {}
+
+    @staticmethod
+    def _public(user):
+        return {key: value for key, value in user.items() if key != "password"}
+
+    def load_all(self):
+        return {emp_id: self._public(user) for emp_id, user in self._users.items()}
+
+    def load_one(self, emp_id):
+        user = self._users.get(emp_id)
+        return self._public(user) if user is not None else None
+
+    def password_hash(self, emp_id):
+        password = (self._users.get(emp_id) or {}).get("password")
+        if not password:
+            return None
+        cached = self._hashes.get(emp_id)
+        if cached is None or cached[0] != password:
+            cached = self._hashes[emp_id] = (password, hash_password(password))
+        return cached[1]
+
+
+class SupabaseEmployeeSource:
+    """
+    مصدر جدول employees في Supabase (الموظفون النشطون فقط)
+    بصمة كلمة المرور لا تدخل في COLUMNS فلا تُخزن في الدليل، وتُقرأ منفردة عند الدخول
+    """
+
+    COLUMNS = "id, name, role, department, email, phone, is_active"
+
+    def __init__(self, client):
+        self._client = client
+
+    @staticmethod
+    def _from_row(row):
+        # نفس شكل سجلات USERS_DB الذي تتوقعه الواجهة
+        return {
+            "name": row["name"],
+            "role": row["role"],
+            "dept": row.get("department"),
+            "email": row.get("email"),
+            "phone": row.get("phone"),
+        }
+
+    def load_all(self):
+        employees = {}
+        last_id = None
+        while True:
+            query = self._client.table("employees").select(self.COLUMNS).eq("is_active", True)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            page = query.order("id").limit(1000).execute().data
+            if not page:
+                break
+            for row in page:
+                employees[row["id"]] = self._from_row(row)
+            last_id = page[-1]["id"]
+        return employees
+
+    def load_one(self, emp_id):
+        rows = (
+            self._client.table("employees").select(self.COLUMNS)
+            .eq("id", emp_id).eq("is_active", True).limit(1).execute().data
+        )
+        return self._from_row(rows[0]) if rows else None
+
+    def password_hash(self, emp_id):
+        rows = (
+            self._client.table("employees").select("password_hash")
+            .eq("id", emp_id).eq("is_active", True).limit(1).execute().data
+        )
+        return rows[0].get("password_hash") if rows else None
+
+
+def touch_invalidation_stamp(stamp_path=EMPLOYEE_CACHE_STAMP):
+    """
+    إبطال الدليل في كل العمليات: تحديث وقت تعديل ملف العلامة
+    (سكربت الاستيراد يعمل في عملية منفصلة عن التطبيق)
+    """
+    path = Path(stamp_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+
+
+def _stamp_mtime(stamp_path):
+    try:
+        return os.stat(stamp_path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+class EmployeeDirectory:
+    """
+    ذاكرة مؤقتة للموظفين برقم الموظف
+    - لقطة كاملة تُحمّل باستعلام واحد وتُستبدل ذرياً عند التحديث
+    - خيط خلفي يعيد التحميل كل refresh_interval ثانية
+    - إن تجاوز عمر اللقطة ttl (مثلاً توقف الخيط) يُعاد التحميل عند أول قراءة
+    - الموظف غير الموجود في اللقطة يُجلب منفرداً، ويُحفظ غيابه حتى التحديث التالي
+    """
+
+    def __init__(self, source, ttl=EMPLOYEE_CACHE_TTL,
+                 refresh_interval=EMPLOYEE_CACHE_REFRESH_INTERVAL, stamp_path=EMPLOYEE_CACHE_STAMP):
+        self._source = source
+        self._ttl = ttl
+        self._refresh_interval = refresh_interval
+        self._stamp_path = stamp_path
+        self._lock = threading.RLock()
+        self._employees = {}
+        self._missing = set()
+        self._loaded_at = 0.0
+        self._stamp_seen = _stamp_mtime(stamp_path)
+        self._hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.refresh()
+
+    # --- التحميل ---
+
+    def refresh(self):
+        """إعادة تحميل اللقطة كاملة من المصدر"""
+        stamp = _stamp_mtime(self._stamp_path)
+        employees = self._source.load_all()
+        with self._lock:
+            self._employees = employees
+            self._missing = set()
+            self._loaded_at = time.monotonic()
+            self._stamp_seen = stamp
+            self._refreshes += 1
+
+    def invalidate(self, emp_ids=None):
+        """
+        إبطال موظفين محددين (يُجلبون من المصدر عند القراءة التالية)
+        أو اللقطة كاملة إن لم تُحدد أرقام
+        """
+        if emp_ids is None:
+            self.refresh()
+            return
+        with self._lock:
+            for emp_id in emp_ids:
+                self._employees.pop(emp_id, None)
+                self._missing.discard(emp_id)
+
+    def _is_stale(self):
+        return (
+            time.monotonic() - self._loaded_at > self._ttl
+            or _stamp_mtime(self._stamp_path) != self._stamp_seen
+        )
+
+    # --- القراءة ---
+
+    def get(self, emp_id):
+        """بيانات موظف برقمه (None إن لم يوجد)"""
+        if self._is_stale():
+            self.refresh()
+
+        with self._lock:
+            user = self._employees.get(emp_id)
+            if user is not None or emp_id in self._missing:
+                self._hits += 1
+                return user
+            self._misses += 1
+
+        user = self._source.load_one(emp_id)
+        with self._lock:
+            if user is None:
+                self._missing.add(emp_id)
+            else:
+                self._employees[emp_id] = user
+        return user
+
+    def check_password(self, emp_id, password):
+        """التحقق من كلمة مرور موظف مقابل بصمتها في المصدر (لا تُخزن في الدليل)"""
+        return verify_password(password, self._source.password_hash(emp_id))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._employees)
+
+    def stats(self):
+        """عدادات الإصابة والإخفاق لتحديد حجم الذاكرة المؤقتة"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._employees),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "refreshes": self._refreshes,
+                "age_seconds": round(time.monotonic() - self._loaded_at, 1),
+            }
+
+    # --- التحديث في الخلفية ---
+
+    def start(self):
+        """تشغيل خيط التحديث الدوري"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, name="employee-directory", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self._refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # تبقى اللقطة السابقة صالحة حتى المحاولة التالية
+                print(f"⚠️ فشل تحديث دليل الموظفين: {str(e)}")
+
+
+def create_employee_directory(static_users=None):
+    """إنشاء الدليل من Supabase إن كانت القاعدة مفعّلة، وإلا من القاموس الثابت"""
+    if USE_DATABASE:
+        from db_clients import get_supabase
+        source = SupabaseEmployeeSource(get_supabase())
+    else:
+        source = StaticEmployeeSource(static_users or {})
+    return EmployeeDirectory(source).start()
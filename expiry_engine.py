@@ -0,0 +1,200 @@
+"""
+محرك انتهاء صلاحية الوثائق (الجوازات والإقامات)
+يحسب الوثائق المنتهية خلال نافذة NOTIFICATION_DAYS_BEFORE_EXPIRY باستعلامات نطاق:
+- في الذاكرة: فهرس مرتب بتاريخ الانتهاء مع bisect
+- في قاعدة البيانات: check_document_expiry(days_ahead) عبر فهارس idx_*_expiry
+النتيجة تُخزن لكل يوم فتقرأها لوحة الموارد البشرية في زمن ثابت
+"""
+
+import threading
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+
+from config import NOTIFICATION_DAYS_BEFORE_EXPIRY, USE_DATABASE
+
+# نوع الوثيقة ← (الجدول، عمود الرقم، ورقة Excel)
+DOCUMENT_TYPES = {
+    "جواز سفر": ("passports", "passport_number", "جوازات"),
+    "إقامة": ("residencies", "residency_number", "إقامات"),
+}
+
+DOCUMENTS_FILE = "data/muqeem.xlsx"
+EMPLOYEES_FILE = "data/employees.xlsx"
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class ExpiryIndex:
+    """
+    فهرس مرتب للوثائق حسب تاريخ الانتهاء
+    الاستعلام عن نطاق تواريخ O(log n + k) بدل المرور على كل الوثائق
+    """
+
+    def __init__(self, documents=()):
+        self._entries = sorted(
+            ((doc["expiry_date"], doc["doc_type"], doc["doc_number"]), doc) for doc in documents
+        )
+        self._keys = [key for key, _ in self._entries]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, document):
+        key = (document["expiry_date"], document["doc_type"], document["doc_number"])
+        position = bisect_left(self._keys, key)
+        self._keys.insert(position, key)
+        self._entries.insert(position, (key, document))
+
+    def remove(self, document):
+        key = (document["expiry_date"], document["doc_type"], document["doc_number"])
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+            del self._entries[position]
+
+    def _bounds(self, start, end):
+        # المفتاح يبدأ بالتاريخ، و (تاريخ،) أصغر من أي مفتاح بنفس التاريخ
+        low = bisect_left(self._keys, (start,))
+        high = bisect_left(self._keys, (end + timedelta(days=1),))
+        return low, high
+
+    def between(self, start, end):
+        """الوثائق التي ينتهي تاريخها بين start و end (شاملاً) مرتبة بالتاريخ"""
+        low, high = self._bounds(start, end)
+        return [doc for _, doc in self._entries[low:high]]
+
+    def count_between(self, start, end):
+        """عدد الوثائق في النطاق دون بنائها O(log n)"""
+        low, high = self._bounds(start, end)
+        return high - low
+
+
+class ExcelDocumentSource:
+    """الوثائق من ملف muqeem.xlsx (وضع التطوير بدون قاعدة بيانات)"""
+
+    def __init__(self, documents_file=DOCUMENTS_FILE, employees_file=EMPLOYEES_FILE):
+        self._documents_file = documents_file
+        self._employees_file = employees_file
+        self._index = None
+
+    def _load(self):
+        import pandas as pd
+
+        try:
+            employees = pd.read_excel(self._employees_file, dtype={"id": str})
+            names = dict(zip(employees["id"], employees["name"]))
+        except FileNotFoundError:
+            names = {}
+
+        documents = []
+        for doc_type, (_, number_column, sheet) in DOCUMENT_TYPES.items():
+            try:
+                df = pd.read_excel(self._documents_file, sheet_name=sheet, dtype={"emp_id": str})
+            except FileNotFoundError:
+                return ExpiryIndex()
+            for emp_id, doc_number, expiry in zip(df["emp_id"], df[number_column], df["expiry_date"]):
+                if pd.isna(expiry):
+                    continue
+                documents.append({
+                    "doc_type": doc_type,
+                    "emp_id": emp_id,
+                    "emp_name": names.get(emp_id, ""),
+                    "doc_number": str(doc_number),
+                    "expiry_date": _as_date(expiry),
+                })
+        return ExpiryIndex(documents)
+
+    def expiring(self, start, end):
+        if self._index is None:
+            self._index = self._load()
+        return self._index.between(start, end)
+
+    def invalidate(self):
+        self._index = None
+
+
+class SupabaseDocumentSource:
+    """الوثائق من قاعدة البيانات: استعلام نطاق واحد عبر check_document_expiry"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def expiring(self, start, end):
+        rows = self._client.rpc(
+            "check_document_expiry", {"days_ahead": (end - start).days}
+        ).execute().data or []
+        return [
+            {
+                "doc_type": row["doc_type"],
+                "emp_id": row["emp_id"],
+                "emp_name": row["emp_name"],
+                "doc_number": row["doc_number"],
+                "expiry_date": _as_date(row["expiry_date"]),
+            }
+            for row in rows
+        ]
+
+    def invalidate(self):
+        pass
+
+
+class ExpiryEngine:
+    """
+    الوثائق المنتهية خلال النافذة، محسوبة مرة واحدة لكل يوم
+    (تاريخ الانتهاء لا يتغير خلال اليوم إلا بتعديل الوثائق ← invalidate)
+    """
+
+    def __init__(self, source, window_days=NOTIFICATION_DAYS_BEFORE_EXPIRY):
+        self._source = source
+        self._window_days = window_days
+        self._lock = threading.Lock()
+        self._day = None
+        self._result = []
+        self._counts = {}
+
+    @property
+    def window_days(self):
+        return self._window_days
+
+    def expiring(self, today=None):
+        """قائمة الوثائق مع الأيام المتبقية، مرتبة بالأقرب انتهاءً"""
+        today = today or date.today()
+        with self._lock:
+            if self._day != today:
+                end = today + timedelta(days=self._window_days)
+                result = [
+                    dict(doc, days_remaining=(doc["expiry_date"] - today).days)
+                    for doc in self._source.expiring(today, end)
+                ]
+                counts = {doc_type: 0 for doc_type in DOCUMENT_TYPES}
+                for doc in result:
+                    counts[doc["doc_type"]] += 1
+                self._result, self._counts, self._day = result, counts, today
+            return self._result
+
+    def counts(self, today=None):
+        """عدد الوثائق المنتهية حسب النوع"""
+        self.expiring(today)
+        return self._counts
+
+    def invalidate(self):
+        """إعادة الحساب عند القراءة التالية (بعد استيراد أو تعديل الوثائق)"""
+        with self._lock:
+            self._day = None
+            self._source.invalidate()
+
+
+def create_expiry_engine(window_days=NOTIFICATION_DAYS_BEFORE_EXPIRY):
+    """إنشاء المحرك من قاعدة البيانات إن كانت مفعّلة، وإلا من ملف Excel"""
+    if USE_DATABASE:
+        from db_clients import get_supabase
+        source = SupabaseDocumentSource(get_supabase())
+    else:
+        source = ExcelDocumentSource()
+    return ExpiryEngine(source, window_days)
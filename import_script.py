@@ -3,41 +3,101 @@
 """
 
 import pandas as pd
-from supabase import create_client
+from openpyxl import load_workbook
+import argparse
 import sys
 import os
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime
 
 # إضافة المجلد الرئيسي للمسار
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import SUPABASE_URL, SUPABASE_KEY
+from config import IMPORT_CHUNK_SIZE, IMPORT_MAX_WORKERS
+from bulk_upsert import upsert_records
+from db_clients import get_supabase
+from employee_directory import touch_invalidation_stamp
+from passwords import hash_password
 
-# الاتصال بـ Supabase
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# مصدر كل جدول: (الملف، الورقة)
+IMPORT_SOURCES = {
+    'employees': ('data/employees.xlsx', 0),
+    'requests': ('data/requests.xlsx', 0),
+    'passports': ('data/muqeem.xlsx', 'جوازات'),
+    'residencies': ('data/muqeem.xlsx', 'إقامات'),
+}
 
-def import_employees(file_path='data/employees.xlsx'):
+# أعمدة التواريخ في كل جدول (تُوحَّد إلى YYYY-MM-DD)
+DATE_COLUMNS = {
+    'employees': ['hire_date'],
+    'requests': ['start_date', 'end_date', 'created_at'],
+    'passports': ['issue_date', 'expiry_date'],
+    'residencies': ['issue_date', 'expiry_date'],
+}
+
+# الحقل المستخدم لتعريف السجل في رسائل الخطأ
+LABEL_KEYS = {
+    'employees': 'name',
+    'requests': 'id',
+    'passports': 'passport_number',
+    'residencies': 'residency_number',
+}
+
+
+def clean_frame(df, table):
+    """
+    تنظيف إطار جدول كامل بنفس قواعد clean_batch في وضع التدفق:
+    توحيد أعمدة DATE_COLUMNS إلى YYYY-MM-DD ثم القيم الفارغة إلى ''
+    """
+    for col in DATE_COLUMNS[table]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d')
+    return df.fillna('')
+
+
+def split_by_password(employees):
+    """
+    استبدال عمود password ببصمته (password_hash) وتقسيم الصفوف إلى مجموعتين:
+    بكلمة مرور وبدونها. تُرفع كل مجموعة منفصلة لأن upsert يملأ المفاتيح الغائبة
+    في الدفعة بـ NULL فيمحو بصمات الموظفين الذين لم تُذكر كلمات مرورهم
+    """
+    with_password, without_password = [], []
+    for employee in employees:
+        password = employee.pop('password', '')
+        if password not in ('', None):
+            employee['password_hash'] = hash_password(str(password))
+            with_password.append(employee)
+        else:
+            without_password.append(employee)
+    return [group for group in (with_password, without_password) if group]
+
+
+def import_employees(file_path='data/employees.xlsx', chunk_size=IMPORT_CHUNK_SIZE, client=None, df=None):
     """استيراد بيانات الموظفين"""
     print("📥 استيراد بيانات الموظفين...")
     
     try:
-        df = pd.read_excel(file_path)
+        if df is None:
+            df = pd.read_excel(file_path)
         
-        # تنظيف البيانات
-        df = df.fillna('')
+        # تنظيف البيانات وتوحيد التواريخ
+        df = clean_frame(df, 'employees')
         
         # تحويل إلى قائمة من القواميس
         employees = df.to_dict('records')
         
-        # إدراج البيانات
-        for emp in employees:
-            try:
-                result = supabase.table('employees').upsert(emp).execute()
-                print(f"  ✅ تم استيراد: {emp.get('name', 'غير معروف')}")
-            except Exception as e:
-                print(f"  ❌ خطأ في: {emp.get('name', 'غير معروف')} - {str(e)}")
+        # إدراج البيانات على دفعات
+        client = client or get_supabase()
+        imported = 0
+        for group in split_by_password(employees):
+            imported += upsert_records(client, 'employees', group, LABEL_KEYS['employees'], chunk_size)[0]
+        
+        # إبطال دليل الموظفين المؤقت في التطبيق
+        if imported:
+            touch_invalidation_stamp()
         
-        print(f"✅ تم استيراد {len(employees)} موظف بنجاح!")
+        print(f"✅ تم استيراد {imported} موظف بنجاح!")
         
     except FileNotFoundError:
         print(f"❌ الملف غير موجود: {file_path}")
@@ -45,34 +105,24 @@ def import_employees(file_path='data/employees.xlsx'):
         print(f"❌ خطأ في استيراد الموظفين: {str(e)}")
 
 
-def import_requests(file_path='data/requests.xlsx'):
+def import_requests(file_path='data/requests.xlsx', chunk_size=IMPORT_CHUNK_SIZE, client=None, df=None):
     """استيراد بيانات الطلبات"""
     print("\n📥 استيراد بيانات الطلبات...")
     
     try:
-        df = pd.read_excel(file_path)
-        
-        # تنظيف البيانات
-        df = df.fillna('')
+        if df is None:
+            df = pd.read_excel(file_path)
         
-        # تحويل التواريخ
-        date_columns = ['start_date', 'end_date', 'created_at']
-        for col in date_columns:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d')
+        # تنظيف البيانات وتوحيد التواريخ
+        df = clean_frame(df, 'requests')
         
         # تحويل إلى قائمة من القواميس
         requests = df.to_dict('records')
         
-        # إدراج البيانات
-        for req in requests:
-            try:
-                result = supabase.table('requests').upsert(req).execute()
-                print(f"  ✅ تم استيراد: {req.get('id', 'غير معروف')}")
-            except Exception as e:
-                print(f"  ❌ خطأ في: {req.get('id', 'غير معروف')} - {str(e)}")
+        # إدراج البيانات على دفعات
+        imported, failed = upsert_records(client or get_supabase(), 'requests', requests, LABEL_KEYS['requests'], chunk_size)
         
-        print(f"✅ تم استيراد {len(requests)} طلب بنجاح!")
+        print(f"✅ تم استيراد {imported} طلب بنجاح!")
         
     except FileNotFoundError:
         print(f"❌ الملف غير موجود: {file_path}")
@@ -80,34 +130,24 @@ def import_requests(file_path='data/requests.xlsx'):
         print(f"❌ خطأ في استيراد الطلبات: {str(e)}")
 
 
-def import_passports(file_path='data/muqeem.xlsx', sheet_name='جوازات'):
+def import_passports(file_path='data/muqeem.xlsx', sheet_name='جوازات', chunk_size=IMPORT_CHUNK_SIZE, client=None, df=None):
     """استيراد بيانات الجوازات"""
     print("\n📥 استيراد بيانات الجوازات...")
     
     try:
-        df = pd.read_excel(file_path, sheet_name=sheet_name)
+        if df is None:
+            df = pd.read_excel(file_path, sheet_name=sheet_name)
         
-        # تنظيف البيانات
-        df = df.fillna('')
-        
-        # تحويل التواريخ
-        date_columns = ['issue_date', 'expiry_date']
-        for col in date_columns:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d')
+        # تنظيف البيانات وتوحيد التواريخ
+        df = clean_frame(df, 'passports')
         
         # تحويل إلى قائمة من القواميس
         passports = df.to_dict('records')
         
-        # إدراج البيانات
-        for passport in passports:
-            try:
-                result = supabase.table('passports').upsert(passport).execute()
-                print(f"  ✅ تم استيراد جواز: {passport.get('passport_number', 'غير معروف')}")
-            except Exception as e:
-                print(f"  ❌ خطأ في: {passport.get('passport_number', 'غير معروف')} - {str(e)}")
+        # إدراج البيانات على دفعات
+        imported, failed = upsert_records(client or get_supabase(), 'passports', passports, LABEL_KEYS['passports'], chunk_size)
         
-        print(f"✅ تم استيراد {len(passports)} جواز سفر بنجاح!")
+        print(f"✅ تم استيراد {imported} جواز سفر بنجاح!")
         
     except FileNotFoundError:
         print(f"❌ الملف غير موجود: {file_path}")
@@ -115,34 +155,24 @@ def import_passports(file_path='data/muqeem.xlsx', sheet_name='جوازات'):
         print(f"❌ خطأ في استيراد الجوازات: {str(e)}")
 
 
-def import_residencies(file_path='data/muqeem.xlsx', sheet_name='إقامات'):
+def import_residencies(file_path='data/muqeem.xlsx', sheet_name='إقامات', chunk_size=IMPORT_CHUNK_SIZE, client=None, df=None):
     """استيراد بيانات الإقامات"""
     print("\n📥 استيراد بيانات الإقامات...")
     
     try:
-        df = pd.read_excel(file_path, sheet_name=sheet_name)
-        
-        # تنظيف البيانات
-        df = df.fillna('')
+        if df is None:
+            df = pd.read_excel(file_path, sheet_name=sheet_name)
         
-        # تحويل التواريخ
-        date_columns = ['issue_date', 'expiry_date']
-        for col in date_columns:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d')
+        # تنظيف البيانات وتوحيد التواريخ
+        df = clean_frame(df, 'residencies')
         
         # تحويل إلى قائمة من القواميس
         residencies = df.to_dict('records')
         
-        # إدراج البيانات
-        for residency in residencies:
-            try:
-                result = supabase.table('residencies').upsert(residency).execute()
-                print(f"  ✅ تم استيراد إقامة: {residency.get('residency_number', 'غير معروف')}")
-            except Exception as e:
-                print(f"  ❌ خطأ في: {residency.get('residency_number', 'غير معروف')} - {str(e)}")
+        # إدراج البيانات على دفعات
+        imported, failed = upsert_records(client or get_supabase(), 'residencies', residencies, LABEL_KEYS['residencies'], chunk_size)
         
-        print(f"✅ تم استيراد {len(residencies)} إقامة بنجاح!")
+        print(f"✅ تم استيراد {imported} إقامة بنجاح!")
         
     except FileNotFoundError:
         print(f"❌ الملف غير موجود: {file_path}")
@@ -150,7 +180,151 @@ def import_residencies(file_path='data/muqeem.xlsx', sheet_name='إقامات'):
         print(f"❌ خطأ في استيراد الإقامات: {str(e)}")
 
 
-def main():
+def iter_sheet_batches(file_path, sheet_name=0, batch_size=IMPORT_CHUNK_SIZE):
+    """
+    قراءة ورقة Excel كدفعات من القواميس دون تحميل الملف كاملاً
+    (openpyxl بوضع read_only) فتبقى الذاكرة ثابتة مهما كبر الملف
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        if isinstance(sheet_name, int):
+            sheet = workbook.worksheets[sheet_name]
+        else:
+            sheet = workbook[sheet_name]
+
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append({key: value for key, value in zip(header, row) if key is not None})
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        workbook.close()
+
+
+def clean_batch(records, date_columns):
+    """تنظيف دفعة واحدة: القيم الفارغة وتوحيد صيغة التواريخ"""
+    for record in records:
+        for key, value in record.items():
+            if value is None:
+                record[key] = ''
+            elif key in date_columns:
+                if isinstance(value, (datetime, date)):
+                    record[key] = value.strftime('%Y-%m-%d')
+                elif value != '':
+                    record[key] = pd.to_datetime(value).strftime('%Y-%m-%d')
+    return records
+
+
+def stream_import(table, chunk_size=IMPORT_CHUNK_SIZE, client=None, sources=IMPORT_SOURCES):
+    """استيراد جدول بوضع التدفق: قراءة دفعة ← تنظيف ← رفع، دون تحميل الملف كاملاً"""
+    file_path, sheet_name = sources[table]
+    print(f"\n📥 استيراد {table} (وضع التدفق)...")
+
+    imported = 0
+    failed_count = 0
+    start = time.perf_counter()
+
+    try:
+        for batch in iter_sheet_batches(file_path, sheet_name, chunk_size):
+            batch = clean_batch(batch, DATE_COLUMNS[table])
+            for group in split_by_password(batch) if table == 'employees' else [batch]:
+                succeeded, failed = upsert_records(
+                    client or get_supabase(), table, group, LABEL_KEYS[table], chunk_size, verbose=False
+                )
+                imported += succeeded
+                failed_count += len(failed)
+    except FileNotFoundError:
+        print(f"❌ الملف غير موجود: {file_path}")
+        return
+    except Exception as e:
+        print(f"❌ خطأ في استيراد {table}: {str(e)}")
+
+    if table == 'employees' and imported:
+        touch_invalidation_stamp()
+
+    elapsed = time.perf_counter() - start
+    rate = imported / elapsed if elapsed > 0 else 0
+    print(f"✅ {table}: تم استيراد {imported} سجل في {elapsed:.2f} ثانية ({rate:.0f} سجل/ثانية)")
+    if failed_count:
+        print(f"  ⚠️ فشل {failed_count} سجل")
+
+
+IMPORTERS = {
+    'employees': import_employees,
+    'requests': import_requests,
+    'passports': import_passports,
+    'residencies': import_residencies,
+}
+
+
+def read_sources(executor, sources=IMPORT_SOURCES):
+    """قراءة كل ملف Excel مرة واحدة مع جميع أوراقه المطلوبة (الملفات بالتوازي)"""
+    by_file = {}
+    for table, (path, sheet) in sources.items():
+        by_file.setdefault(path, {})[table] = sheet
+
+    def read_file(path, tables):
+        try:
+            sheets = pd.read_excel(path, sheet_name=list(set(tables.values())))
+        except FileNotFoundError:
+            print(f"❌ الملف غير موجود: {path}")
+            return {}
+        except Exception as e:
+            print(f"❌ خطأ في قراءة {path}: {str(e)}")
+            return {}
+        return {table: sheets[sheet] for table, sheet in tables.items()}
+
+    frames = {}
+    for result in executor.map(lambda item: read_file(*item), by_file.items()):
+        frames.update(result)
+    return frames
+
+
+def run_import_pipeline(chunk_size=IMPORT_CHUNK_SIZE, jobs=IMPORT_MAX_WORKERS, stream=False):
+    """
+    استيراد جميع الجداول: قراءة الملفات مرة واحدة، ثم الموظفين أولاً
+    (بسبب المفاتيح الأجنبية) ثم بقية الجداول المستقلة بالتوازي
+    في وضع التدفق تُقرأ كل ورقة دفعةً دفعة بدلاً من تحميلها في DataFrame
+    """
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        if stream:
+            stream_import('employees', chunk_size)
+            futures = [
+                executor.submit(stream_import, table, chunk_size)
+                for table in ('requests', 'passports', 'residencies')
+            ]
+            wait(futures)
+            print(f"\n⏱️ زمن الاستيراد الكلي: {time.perf_counter() - start:.2f} ثانية")
+            return
+
+        frames = read_sources(executor)
+
+        if 'employees' in frames:
+            import_employees(chunk_size=chunk_size, df=frames['employees'])
+
+        futures = [
+            executor.submit(IMPORTERS[table], chunk_size=chunk_size, df=frames[table])
+            for table in ('requests', 'passports', 'residencies')
+            if table in frames
+        ]
+        wait(futures)
+
+    print(f"\n⏱️ زمن الاستيراد الكلي: {time.perf_counter() - start:.2f} ثانية")
+
+
+def main(chunk_size=IMPORT_CHUNK_SIZE, jobs=IMPORT_MAX_WORKERS, stream=False):
     """الدالة الرئيسية"""
     print("=" * 60)
     print("🚀 بدء استيراد البيانات إلى Supabase")
@@ -158,17 +332,14 @@ def main():
     
     # التحقق من الاتصال
     try:
-        result = supabase.table('employees').select("count").execute()
+        result = get_supabase().table('employees').select("count").execute()
         print("✅ الاتصال بـ Supabase ناجح!")
     except Exception as e:
         print(f"❌ فشل الاتصال بـ Supabase: {str(e)}")
         return
     
     # استيراد جميع البيانات
-    import_employees()
-    import_requests()
-    import_passports()
-    import_residencies()
+    run_import_pipeline(chunk_size=chunk_size, jobs=jobs, stream=stream)
     
     print("\n" + "=" * 60)
     print("✅ اكتمل استيراد جميع البيانات!")
@@ -176,4 +347,12 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="استيراد البيانات من Excel إلى Supabase")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE,
+                        help="عدد السجلات في كل طلب upsert")
+    parser.add_argument("--jobs", type=int, default=IMPORT_MAX_WORKERS,
+                        help="عدد الجداول المستوردة بالتوازي")
+    parser.add_argument("--stream", action="store_true",
+                        help="قراءة الملفات الكبيرة دفعةً دفعة بذاكرة ثابتة")
+    args = parser.parse_args()
+    main(chunk_size=args.chunk_size, jobs=args.jobs, stream=args.stream)
@@ -0,0 +1,229 @@
+"""
+محرك الإجازات: التداخل وتغطية الأقسام والرصيد
+فهارس فواصل زمنية مرتبة في الذاكرة تُبنى مرة واحدة من الإجازات المعتمدة وتُحدّث مع كل اعتماد،
+فأسئلة التقديم O(log n) بدل مقارنة كل الإجازات ببعضها:
+- لكل موظف: فواصل غير متداخلة مرتبة ← هل يتداخل الطلب مع إجازة معتمدة
+- لكل قسم: بدايات ونهايات مرتبة ← عدد الغائبين في يوم معين
+- لكل (موظف، عنوان إجازة): فواصل مدمجة ← الأيام المستخدمة في السنة دون عد اليوم مرتين
+"""
+
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import date, timedelta
+
+from config import ANNUAL_LEAVE_DAYS, ANNUAL_LEAVE_TITLE
+
+LEAVE_TYPE = "طلب إجازة"
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _days_by_year(start, end):
+    """عدد الأيام (شاملاً الطرفين) في كل سنة يغطيها الفاصل"""
+    days = {}
+    while start <= end:
+        year_end = min(end, date(start.year, 12, 31))
+        days[start.year] = (year_end - start).days + 1
+        start = year_end + timedelta(days=1)
+    return days
+
+
+class IntervalIndex:
+    """
+    فواصل مغلقة [start, end] لموظف واحد، غير متداخلة ومرتبة ببدايتها
+    (عدم التداخل يجعل النهايات مرتبة أيضاً فيكفي bisect واحد للبحث)
+    """
+
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def _range(self, start, end):
+        # أول فاصل ينتهي عند start أو بعده، وأول فاصل يبدأ بعد end
+        return bisect_left(self._ends, start), bisect_right(self._starts, end)
+
+    def overlapping(self, start, end):
+        """الفواصل المتداخلة مع [start, end] O(log n + k)"""
+        low, high = self._range(start, end)
+        return list(zip(self._starts[low:high], self._ends[low:high]))
+
+    def add(self, start, end):
+        """
+        إضافة فاصل مع دمج ما يتداخل معه
+        ترجع (الفواصل المحذوفة بالدمج، الفاصل الناتج)
+        """
+        low, high = self._range(start, end)
+        removed = list(zip(self._starts[low:high], self._ends[low:high]))
+        if removed:
+            start = min(start, removed[0][0])
+            end = max(end, removed[-1][1])
+        self._starts[low:high] = [start]
+        self._ends[low:high] = [end]
+        return removed, (start, end)
+
+    def days_in(self, start, end):
+        """عدد الأيام المغطاة داخل [start, end] (الفواصل مدمجة فلا يُعد يوم مرتين)"""
+        return sum(
+            (min(e, end) - max(s, start)).days + 1 for s, e in self.overlapping(start, end)
+        )
+
+
+class CoverageIndex:
+    """
+    بدايات ونهايات إجازات قسم واحد في قائمتين مرتبتين
+    عدد الغائبين في يوم = (بدايات ≤ اليوم) - (نهايات < اليوم)
+    """
+
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+
+    def add(self, start, end):
+        insort(self._starts, start)
+        insort(self._ends, end)
+
+    def remove(self, start, end):
+        del self._starts[bisect_left(self._starts, start)]
+        del self._ends[bisect_left(self._ends, end)]
+
+    def out_on(self, day):
+        return bisect_right(self._starts, day) - bisect_left(self._ends, day)
+
+    def peak(self, start, end):
+        """
+        أكبر عدد غائبين في أي يوم من [start, end] بمسح الحدود المرتبة داخل الفترة فقط
+        O(log n + k) حيث k عدد البدايات والنهايات الواقعة فيها، بدل عد كل يوم على حدة
+        """
+        out = peak = self.out_on(start)
+        # بداية في يوم s تزيد العدد من s، ونهاية في يوم e تنقصه من e + 1
+        i, i_end = bisect_right(self._starts, start), bisect_right(self._starts, end)
+        j, j_end = bisect_left(self._ends, start), bisect_left(self._ends, end)
+        while i < i_end:
+            day = self._starts[i]
+            while j < j_end and self._ends[j] + timedelta(days=1) <= day:
+                out -= 1
+                j += 1
+            while i < i_end and self._starts[i] == day:
+                out += 1
+                i += 1
+            peak = max(peak, out)
+        return peak
+
+
+class LeaveEngine:
+    """فهارس الإجازات المعتمدة لكل العملية"""
+
+    def __init__(self, dept_of, annual_days=ANNUAL_LEAVE_DAYS):
+        # رقم الموظف ← القسم (None إن لم يكن معروفاً)
+        self._dept_of = dept_of
+        self._annual_days = annual_days
+        self._lock = threading.Lock()
+        self._by_emp = defaultdict(IntervalIndex)
+        self._by_dept = defaultdict(CoverageIndex)
+        # (موظف، عنوان) ← فواصل مدمجة لحساب الرصيد بالأيام الفعلية لا بمجموع أطوال الطلبات
+        self._by_title = defaultdict(IntervalIndex)
+        self._recorded = set()
+
+    @staticmethod
+    def is_approved_leave(req):
+        return (
+            req['type'] == LEAVE_TYPE and req['status'] == "Approved"
+            and bool(req.get('start_date')) and bool(req.get('end_date'))
+        )
+
+    def record(self, req):
+        """إضافة إجازة معتمدة للفهارس (تُتجاهل غير الإجازات والمكررة)"""
+        if not self.is_approved_leave(req):
+            return False
+        start, end = _as_date(req['start_date']), _as_date(req['end_date'])
+        if end < start:
+            return False
+        dept = self._dept_of(req['emp_id'])
+        with self._lock:
+            if req['id'] in self._recorded:
+                return False
+            self._recorded.add(req['id'])
+
+            removed, merged = self._by_emp[req['emp_id']].add(start, end)
+            if dept is not None:
+                coverage = self._by_dept[dept]
+                # تغطية القسم تتبع فواصل الموظف المدمجة فلا يُعد الموظف مرتين في نفس اليوم
+                for interval in removed:
+                    coverage.remove(*interval)
+                coverage.add(*merged)
+
+            self._by_title[(req['emp_id'], req['title'])].add(start, end)
+        return True
+
+    def overlapping(self, emp_id, start, end):
+        """الإجازات المعتمدة للموظف التي تتداخل مع الفترة"""
+        with self._lock:
+            index = self._by_emp.get(emp_id)
+            return index.overlapping(_as_date(start), _as_date(end)) if index else []
+
+    def out_on(self, dept, day):
+        """عدد موظفي القسم في إجازة معتمدة في يوم معين O(log n)"""
+        with self._lock:
+            coverage = self._by_dept.get(dept)
+            return coverage.out_on(_as_date(day)) if coverage else 0
+
+    def peak_out(self, dept, start, end):
+        """أكبر عدد غائبين من القسم في أي يوم خلال الفترة"""
+        start, end = _as_date(start), _as_date(end)
+        with self._lock:
+            coverage = self._by_dept.get(dept)
+            if coverage is None or end < start:
+                return 0
+            return coverage.peak(start, end)
+
+    def days_used(self, emp_id, year, title=ANNUAL_LEAVE_TITLE):
+        """
+        أيام الإجازة المعتمدة للموظف في السنة (title=None لكل الأنواع)
+        من الفواصل المدمجة، فالإجازتان المتداخلتان لا تُحسبان مرتين O(log n + k)
+        """
+        with self._lock:
+            index = self._by_emp.get(emp_id) if title is None else self._by_title.get((emp_id, title))
+            return index.days_in(date(year, 1, 1), date(year, 12, 31)) if index else 0
+
+    def remaining(self, emp_id, year):
+        """الرصيد السنوي المتبقي"""
+        return self._annual_days - self.days_used(emp_id, year)
+
+    def check(self, emp_id, title, start, end):
+        """
+        فحوص التقديم لطلب إجازة
+        ترجع: overlaps (الإجازات المتداخلة)، dept، dept_peak_out،
+        و shortfall (الأيام الزائدة عن الرصيد السنوي لكل سنة، للإجازة السنوية فقط)
+        """
+        start, end = _as_date(start), _as_date(end)
+        dept = self._dept_of(emp_id)
+        shortfall = {}
+        if title == ANNUAL_LEAVE_TITLE:
+            for year, days in _days_by_year(start, end).items():
+                missing = days - self.remaining(emp_id, year)
+                if missing > 0:
+                    shortfall[year] = missing
+        return {
+            "overlaps": self.overlapping(emp_id, start, end),
+            "dept": dept,
+            "dept_peak_out": self.peak_out(dept, start, end) if dept is not None else 0,
+            "shortfall": shortfall,
+        }
+
+
+def create_leave_engine(store, directory):
+    """بناء الفهارس من الإجازات المعتمدة في المخزن، والقسم من دليل الموظفين"""
+    def dept_of(emp_id):
+        employee = directory.get(emp_id)
+        return employee.get("dept") if employee else None
+
+    engine = LeaveEngine(dept_of)
+    for req in store.list_all():
+        engine.record(req)
+    return engine
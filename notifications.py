@@ -0,0 +1,367 @@
+"""
+خط التنبيهات غير المتزامن
+أحداث الموافقات وفحص انتهاء الوثائق تُضاف إلى طابور محلي دائم (SQLite)،
+وعامل في الخلفية يرسلها دفعات إلى جدول notifications
+فلا ينتظر المراجع أي عملية إدخال/إخراج للتنبيهات عند الضغط على زر الموافقة
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from config import (
+    USE_DATABASE,
+    NOTIFICATION_QUEUE_PATH, NOTIFICATION_QUEUE_MAX, NOTIFICATION_BATCH_SIZE,
+    NOTIFICATION_FLUSH_INTERVAL, NOTIFICATION_DEDUP_DAYS, NOTIFICATION_MAX_ATTEMPTS,
+    NOTIFICATION_MAX_BACKOFF,
+)
+from bulk_upsert import is_row_error
+
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dedup_key TEXT UNIQUE NOT NULL,
+    emp_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    message TEXT NOT NULL,
+    type TEXT NOT NULL DEFAULT 'info',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    delivered_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox(delivered_at, id);
+"""
+
+LOCAL_NOTIFICATIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    emp_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    message TEXT NOT NULL,
+    type TEXT DEFAULT 'info',
+    is_read INTEGER DEFAULT 0,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_emp_id ON notifications(emp_id);
+"""
+
+
+class NotificationQueue:
+    """
+    طابور دائم في ملف SQLite (يبقى بعد إعادة التشغيل)
+    - dedup_key فريد: التنبيه المكرر يُتجاهل حتى بعد تسليمه (خلال NOTIFICATION_DEDUP_DAYS)
+    - الضغط العكسي: عند امتلاء الطابور يُرفض التنبيه فوراً (block=False)
+      أو ينتظر المنتج حتى يفرغ العامل مساحة (block=True للفحوصات الدفعية)
+    """
+
+    def __init__(self, db_path=NOTIFICATION_QUEUE_PATH, max_pending=NOTIFICATION_QUEUE_MAX):
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._max_pending = max_pending
+        self._lock = threading.RLock()
+        self._space = threading.Condition(self._lock)
+        self._ready = threading.Event()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(QUEUE_SCHEMA)
+        self._pending = self._count_pending()
+        self.dropped = 0
+
+    def _count_pending(self):
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM outbox WHERE delivered_at IS NULL AND attempts < ?",
+            (NOTIFICATION_MAX_ATTEMPTS,),
+        ).fetchone()[0]
+
+    @property
+    def pending(self):
+        with self._lock:
+            return self._pending
+
+    def enqueue(self, emp_id, title, message, kind="info", dedup_key=None, block=False, timeout=None):
+        """
+        إضافة تنبيه للطابور
+        ترجع True إن أُضيف، و False إن كان مكرراً أو الطابور ممتلئاً
+        """
+        dedup_key = dedup_key or f"{emp_id}:{title}:{message}"
+        with self._space:
+            if self._pending >= self._max_pending:
+                if not block or not self._space.wait_for(
+                    lambda: self._pending < self._max_pending, timeout
+                ):
+                    self.dropped += 1
+                    return False
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO outbox (dedup_key, emp_id, title, message, type) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (dedup_key, emp_id, title, message, kind),
+                )
+            if cursor.rowcount == 0:
+                return False
+            self._pending += 1
+        self._ready.set()
+        return True
+
+    def next_batch(self, limit=NOTIFICATION_BATCH_SIZE):
+        """أقدم التنبيهات غير المسلّمة"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, emp_id, title, message, type FROM outbox "
+                "WHERE delivered_at IS NULL AND attempts < ? ORDER BY id LIMIT ?",
+                (NOTIFICATION_MAX_ATTEMPTS, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def mark_delivered(self, ids):
+        if not ids:
+            return
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._space:
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE outbox SET delivered_at = ? WHERE id = ?", [(now, i) for i in ids]
+                )
+            self._pending -= len(ids)
+            self._space.notify_all()
+
+    def mark_failed(self, ids):
+        """
+        زيادة عدد المحاولات لتنبيهات رفضتها الوجهة لخطأ في بياناتها؛
+        التنبيه الذي يتجاوز الحد يخرج من الطابور (تعطل الاتصال لا يُحتسب محاولة)
+        """
+        if not ids:
+            return
+        with self._space:
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE outbox SET attempts = attempts + 1 WHERE id = ?", [(i,) for i in ids]
+                )
+            self._pending = self._count_pending()
+            self._space.notify_all()
+
+    def purge(self, days=NOTIFICATION_DEDUP_DAYS):
+        """حذف التنبيهات المسلّمة الأقدم من نافذة منع التكرار"""
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM outbox WHERE delivered_at IS NOT NULL AND delivered_at < ?", (cutoff,)
+            )
+
+    def wait_ready(self, timeout):
+        """انتظار تنبيه جديد أو انتهاء المهلة"""
+        self._ready.wait(timeout)
+        self._ready.clear()
+
+
+class SupabaseNotificationSink:
+    """إدخال الدفعات في جدول notifications على Supabase"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def insert_many(self, rows):
+        self._client.table("notifications").insert(rows).execute()
+
+
+class LocalNotificationSink:
+    """جدول notifications في ملف SQLite محلي (وضع التطوير بدون قاعدة بيانات)"""
+
+    def __init__(self, db_path=NOTIFICATION_QUEUE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(LOCAL_NOTIFICATIONS_SCHEMA)
+
+    def insert_many(self, rows):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO notifications (emp_id, title, message, type) "
+                "VALUES (:emp_id, :title, :message, :type)",
+                rows,
+            )
+
+
+def is_rejected_row(error):
+    """
+    هل رفضت الوجهة التنبيه لخطأ في بياناته (SQLSTATE 22/23، أو قيد SQLite المحلي)؟
+    غير ذلك (انقطاع، مهلة، خطأ HTTP) تعطل مؤقت لا علاقة له بالسجل
+    """
+    return is_row_error(error) or isinstance(error, (sqlite3.IntegrityError, sqlite3.DataError))
+
+
+class NotificationWorker:
+    """
+    عامل خلفي يفرغ الطابور دفعات إلى الوجهة
+    - عند رفض دفعة لخطأ بيانات يُعاد إرسال سجلاتها فرادى حتى لا يعطّل سجل تالف بقية الدفعة
+    - عند تعطل الاتصال تبقى الدفعة كما هي دون احتساب محاولة، وينتظر العامل مهلة
+      تتضاعف مع كل تعطل متتالٍ (حتى NOTIFICATION_MAX_BACKOFF) قبل المحاولة التالية
+    """
+
+    def __init__(self, queue, sink, batch_size=NOTIFICATION_BATCH_SIZE,
+                 interval=NOTIFICATION_FLUSH_INTERVAL, max_backoff=NOTIFICATION_MAX_BACKOFF):
+        self._queue = queue
+        self._sink = sink
+        self._batch_size = batch_size
+        self._interval = interval
+        self._max_backoff = max_backoff
+        self._stop = threading.Event()
+        self._thread = None
+        self.delivered = 0
+        self.failed = 0
+        # عدد مرات تعطل الوجهة المتتالية (0 = تعمل)
+        self.outages = 0
+
+    def backoff(self):
+        """مهلة الانتظار قبل المحاولة التالية"""
+        if not self.outages:
+            return self._interval
+        return min(self._interval * 2 ** self.outages, self._max_backoff)
+
+    def flush(self):
+        """إرسال كل ما في الطابور الآن؛ ترجع عدد المسلَّم"""
+        delivered = 0
+        while True:
+            batch = self._queue.next_batch(self._batch_size)
+            if not batch:
+                break
+            rows = [{k: row[k] for k in ("emp_id", "title", "message", "type")} for row in batch]
+            try:
+                self._sink.insert_many(rows)
+                self._queue.mark_delivered([row["id"] for row in batch])
+                delivered += len(batch)
+                self.outages = 0
+                continue
+            except Exception as e:
+                if not is_rejected_row(e):
+                    self.outages += 1
+                    break
+
+            ok, failed, outage = [], [], False
+            for row, payload in zip(batch, rows):
+                try:
+                    self._sink.insert_many([payload])
+                    ok.append(row["id"])
+                except Exception as e:
+                    if not is_rejected_row(e):
+                        # تعطلت الوجهة أثناء التقسيم: البقية تنتظر دون احتساب محاولة
+                        outage = True
+                        break
+                    failed.append(row["id"])
+            self._queue.mark_delivered(ok)
+            self._queue.mark_failed(failed)
+            delivered += len(ok)
+            self.failed += len(failed)
+            if outage:
+                self.outages += 1
+                break
+            self.outages = 0
+            if failed:
+                # السجل المرفوض يبقى أول الطابور: يُعاد في الدورة التالية لا فوراً
+                break
+        self.delivered += delivered
+        return delivered
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="notification-worker", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        last_purge = 0.0
+        while not self._stop.is_set():
+            try:
+                self.flush()
+                if time.monotonic() - last_purge > 3600:
+                    self._queue.purge()
+                    last_purge = time.monotonic()
+            except Exception as e:
+                print(f"⚠️ فشل إرسال التنبيهات: {str(e)}")
+            if self.outages:
+                # لا يوقظه تنبيه جديد أثناء التعطل، فلا تتكرر المحاولة مع كل إضافة
+                self._stop.wait(self.backoff())
+            else:
+                self._queue.wait_ready(self._interval)
+
+
+# ====================================
+# منتجو التنبيهات
+# ====================================
+
+def notify_request_transition(queue, req):
+    """تنبيه صاحب الطلب بتغير حالته (غير معطِّل: يُتجاهل إن كان الطابور ممتلئاً)"""
+    if req["status"] == "Approved":
+        title, kind = "تمت الموافقة على طلبك", "success"
+        message = f"اكتملت الموافقة على طلب {req['type']}: {req['title']}"
+    elif req["status"] == "Rejected":
+        title, kind = "تم رفض طلبك", "error"
+        message = f"تم رفض طلب {req['type']}: {req['title']}. السبب: {req.get('rejection_reason') or '-'}"
+    else:
+        title, kind = "تقدم طلبك", "info"
+        message = f"انتقل طلب {req['type']}: {req['title']} إلى المرحلة {req['current_stage']}"
+    return queue.enqueue(
+        req["emp_id"], title, message, kind,
+        dedup_key=f"request:{req['id']}:{req['current_stage']}:{req['status']}",
+    )
+
+
+def enqueue_expiry_alerts(queue, expiry_engine, today=None, timeout=30):
+    """
+    تنبيه لكل وثيقة قريبة الانتهاء (مرة واحدة لكل وثيقة وتاريخ انتهاء)
+    ينتظر عند امتلاء الطابور بدلاً من إسقاط التنبيهات
+    """
+    queued = 0
+    for doc in expiry_engine.expiring(today):
+        kind = "error" if doc["days_remaining"] <= 30 else "warning"
+        queued += queue.enqueue(
+            doc["emp_id"],
+            f"تنبيه انتهاء {doc['doc_type']}",
+            f"{doc['doc_type']} رقم {doc['doc_number']} ينتهي في {doc['expiry_date']} "
+            f"(بعد {doc['days_remaining']} يوماً)",
+            kind,
+            dedup_key=f"expiry:{doc['doc_type']}:{doc['doc_number']}:{doc['expiry_date']}",
+            block=True,
+            timeout=timeout,
+        )
+    return queued
+
+
+def start_expiry_scanner(queue, expiry_engine, interval=3600):
+    """خيط يفحص الوثائق مرة يومياً (يتحقق كل interval ثانية من تغير اليوم)"""
+    def scan_loop():
+        last_day = None
+        while True:
+            today = date.today()
+            if today != last_day:
+                try:
+                    enqueue_expiry_alerts(queue, expiry_engine, today)
+                    last_day = today
+                except Exception as e:
+                    print(f"⚠️ فشل فحص انتهاء الوثائق: {str(e)}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=scan_loop, name="expiry-scanner", daemon=True)
+    thread.start()
+    return thread
+
+
+def create_notification_pipeline(expiry_engine=None):
+    """الطابور والعامل (والفاحص اليومي إن مُرِّر محرك الانتهاء)"""
+    queue = NotificationQueue()
+    if USE_DATABASE:
+        from db_clients import get_supabase
+        sink = SupabaseNotificationSink(get_supabase())
+    else:
+        sink = LocalNotificationSink()
+    worker = NotificationWorker(queue, sink).start()
+    if expiry_engine is not None:
+        start_expiry_scanner(queue, expiry_engine)
+    return queue, worker
@@ -0,0 +1,45 @@
+"""
+تجزئة كلمات المرور
+تُخزن كلمة المرور كبصمة scrypt مملّحة بصيغة scrypt$n$r$p$salt$hash (base64)
+فلا تظهر كلمة المرور نفسها في قاعدة البيانات أو الذاكرة المؤقتة أو النسخ الاحتياطية
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def hash_password(password, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    """بصمة جديدة بملح عشوائي"""
+    salt = os.urandom(SALT_BYTES)
+    digest = hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=HASH_BYTES)
+    return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password(password, stored):
+    """مطابقة كلمة المرور مع بصمتها المخزنة (False لأي بصمة فارغة أو تالفة)"""
+    if not password or not stored:
+        return False
+    try:
+        scheme, n, r, p, salt, expected = stored.split("$")
+        if scheme != "scrypt":
+            return False
+        expected = base64.b64decode(expected)
+        digest = hashlib.scrypt(
+            password.encode("utf-8"), salt=base64.b64decode(salt),
+            n=int(n), r=int(r), p=int(p), dklen=len(expected),
+        )
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(digest, expected)
@@ -0,0 +1,496 @@
+"""
+التقارير: الأقسام، استهلاك الإجازات، السلف، الموظف الفردي، وانتهاء الوثائق
+- البيانات تُحمّل كإطارات pandas مرة واحدة لكل نسخة من مصدرها
+- التقارير تُحسب بعمليات على الأعمدة (groupby / merge / clip) دون حلقات على الصفوف
+- النتيجة تُخزن بمفتاح (التقرير، المعاملات، نسخة البيانات)
+- التصدير إلى xlsx بوضع write_only في openpyxl (الصفوف تُكتب تدريجياً)،
+  و PDF اختياري يتطلب reportlab
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import Workbook
+
+from config import (
+    ANNUAL_LEAVE_DAYS, ANNUAL_LEAVE_TITLE, NOTIFICATION_DAYS_BEFORE_EXPIRY, USE_DATABASE,
+    REPORT_CACHE_SIZE, REPORT_DATA_TTL, REPORT_PDF_MAX_ROWS, REPORT_PDF_FONT,
+)
+from expiry_engine import DOCUMENT_TYPES, DOCUMENTS_FILE, EMPLOYEES_FILE
+from leave_engine import LEAVE_TYPE, IntervalIndex
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+LOAN_TYPE = "سلفة"
+UNKNOWN_DEPARTMENT = "غير محدد"
+
+EMPLOYEE_COLUMNS = ["id", "name", "department", "salary", "hire_date"]
+REQUEST_COLUMNS = [
+    "id", "emp_id", "employee", "type", "title", "start_date", "end_date",
+    "loan_amount", "status", "current_stage", "approved_by", "created_at",
+]
+DOCUMENT_COLUMNS = ["emp_id", "doc_number", "expiry_date"]
+
+# اسم العمود ← عنوانه في العرض والتصدير
+COLUMN_LABELS = {
+    "department": "القسم",
+    "headcount": "عدد الموظفين",
+    "total_salary": "إجمالي الرواتب",
+    "avg_salary": "متوسط الراتب",
+    "pending_requests": "طلبات معلقة",
+    "leave_days": "أيام الإجازات",
+    "approved_loans": "السلف المعتمدة",
+    "expiring_documents": "وثائق قريبة الانتهاء",
+    "emp_id": "رقم الموظف",
+    "name": "الاسم",
+    "employee": "الموظف",
+    "total_days": "إجمالي الأيام",
+    "annual_remaining": "رصيد السنوية المتبقي",
+    "loans": "عدد السلف",
+    "requested_amount": "المبلغ المطلوب",
+    "approved_amount": "المعتمد",
+    "pending_amount": "المعلق",
+    "id": "رقم الطلب",
+    "type": "النوع",
+    "title": "العنوان",
+    "start_date": "من",
+    "end_date": "إلى",
+    "loan_amount": "المبلغ",
+    "status": "الحالة",
+    "current_stage": "المرحلة",
+    "approved_by": "اعتمده",
+    "created_at": "تاريخ التقديم",
+    "doc_type": "نوع الوثيقة",
+    "doc_number": "رقم الوثيقة",
+    "expiry_date": "تاريخ الانتهاء",
+    "days_remaining": "الأيام المتبقية",
+}
+
+
+# ====================================
+# مصادر البيانات
+# ====================================
+
+def _employees_frame(df):
+    df = df.reindex(columns=EMPLOYEE_COLUMNS)
+    df["id"] = df["id"].astype(str)
+    df["department"] = df["department"].fillna(UNKNOWN_DEPARTMENT)
+    df["salary"] = pd.to_numeric(df["salary"], errors="coerce").fillna(0.0)
+    df["hire_date"] = pd.to_datetime(df["hire_date"], errors="coerce")
+    return df.drop_duplicates("id", keep="last").reset_index(drop=True)
+
+
+def _documents_frame(df, number_column):
+    df = df.rename(columns={number_column: "doc_number"}).reindex(columns=DOCUMENT_COLUMNS)
+    df["emp_id"] = df["emp_id"].astype(str)
+    df["doc_number"] = df["doc_number"].astype(str)
+    df["expiry_date"] = pd.to_datetime(df["expiry_date"], errors="coerce")
+    return df.dropna(subset=["expiry_date"]).reset_index(drop=True)
+
+
+def requests_frame(rows):
+    """إطار الطلبات بأنواع أعمدة موحدة (التواريخ datetime64 والمبالغ أرقام)"""
+    df = pd.DataFrame(rows, columns=REQUEST_COLUMNS)
+    for column in ("start_date", "end_date", "created_at"):
+        df[column] = pd.to_datetime(df[column], errors="coerce")
+    df["emp_id"] = df["emp_id"].astype(str)
+    df["loan_amount"] = pd.to_numeric(df["loan_amount"], errors="coerce").fillna(0.0)
+    return df
+
+
+class StoreRequestSource:
+    """الطلبات من مخزن الطلبات؛ النسخة = store.version فيُعاد البناء بعد أي كتابة فقط"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def version(self):
+        return self._store.version
+
+    def load(self):
+        return {"requests": requests_frame(self._store.list_all())}
+
+
+class ExcelReportSource:
+    """الموظفون والوثائق من ملفات Excel؛ النسخة = أوقات تعديل الملفات"""
+
+    def __init__(self, employees_file=EMPLOYEES_FILE, documents_file=DOCUMENTS_FILE, extra_employees=None):
+        self._employees_file = Path(employees_file)
+        self._documents_file = Path(documents_file)
+        # موظفون إضافيون بصيغة USERS_DB (وضع التجربة بدون قاعدة بيانات)
+        self._extra_employees = extra_employees or {}
+
+    def version(self):
+        return tuple(
+            path.stat().st_mtime_ns if path.exists() else 0
+            for path in (self._employees_file, self._documents_file)
+        )
+
+    def load(self):
+        frames = []
+        if self._employees_file.exists():
+            frames.append(pd.read_excel(self._employees_file, dtype={"id": str}))
+        if self._extra_employees:
+            frames.append(pd.DataFrame(
+                [dict(user, id=emp_id) for emp_id, user in self._extra_employees.items()]
+            ).rename(columns={"dept": "department"}))
+        employees = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=EMPLOYEE_COLUMNS)
+
+        data = {"employees": _employees_frame(employees)}
+        for table, number_column, sheet in DOCUMENT_TYPES.values():
+            if self._documents_file.exists():
+                df = pd.read_excel(self._documents_file, sheet_name=sheet, dtype={"emp_id": str})
+            else:
+                df = pd.DataFrame(columns=["emp_id", number_column, "expiry_date"])
+            data[table] = _documents_frame(df, number_column)
+        return data
+
+
+class SupabaseReportSource:
+    """الموظفون والوثائق من Supabase؛ النسخة تتغير كل REPORT_DATA_TTL ثانية أو عند invalidate"""
+
+    def __init__(self, client, ttl=REPORT_DATA_TTL):
+        self._client = client
+        self._ttl = ttl
+        self._generation = 0
+
+    def version(self):
+        return self._generation, int(time.monotonic() // self._ttl)
+
+    def invalidate(self):
+        self._generation += 1
+
+    def _load_table(self, table, columns):
+        # ترقيم بالمفتاح (keyset) كما في دليل الموظفين
+        rows, last_id = [], None
+        while True:
+            query = self._client.table(table).select(columns)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            page = query.order("id").limit(1000).execute().data
+            if not page:
+                break
+            rows.extend(page)
+            last_id = page[-1]["id"]
+        return pd.DataFrame(rows)
+
+    def load(self):
+        employees = self._load_table("employees", "id, name, department, salary, hire_date, is_active")
+        if "is_active" in employees:
+            employees = employees[employees["is_active"].fillna(True).astype(bool)]
+        data = {"employees": _employees_frame(employees)}
+        for table, number_column, _ in DOCUMENT_TYPES.values():
+            df = self._load_table(table, f"id, emp_id, {number_column}, expiry_date")
+            data[table] = _documents_frame(df.reindex(columns=["emp_id", number_column, "expiry_date"]), number_column)
+        return data
+
+
+class FrameSource:
+    """إطارات جاهزة في الذاكرة (المقارنات والبيانات التركيبية)"""
+
+    def __init__(self, frames, version=0):
+        self._frames = frames
+        self._version = version
+
+    def version(self):
+        return self._version
+
+    def load(self):
+        return self._frames
+
+
+# ====================================
+# التقارير
+# ====================================
+
+def _with_department(df, employees, key="emp_id"):
+    departments = employees.set_index("id")["department"]
+    return df.assign(department=df[key].map(departments).fillna(UNKNOWN_DEPARTMENT))
+
+
+def _approved_leaves(requests, year):
+    """الإجازات المعتمدة التي تقع أيام منها داخل السنة"""
+    leaves = requests[
+        (requests["type"] == LEAVE_TYPE) & (requests["status"] == "Approved")
+    ].dropna(subset=["start_date", "end_date"])
+    return leaves[
+        (leaves["end_date"] >= pd.Timestamp(year, 1, 1)) & (leaves["start_date"] <= pd.Timestamp(year, 12, 31))
+    ]
+
+
+def _leave_days(leaves, year, keys):
+    """
+    أيام الإجازات داخل السنة لكل مجموعة keys، من فواصلها المدمجة بـ IntervalIndex
+    كما في LeaveEngine.days_used، فالإجازتان المتداخلتان لا تُحسبان مرتين
+    """
+    year_start, year_end = pd.Timestamp(year, 1, 1), pd.Timestamp(year, 12, 31)
+    rows = []
+    for key, group in leaves.groupby(keys):
+        index = IntervalIndex()
+        for start, end in zip(group["start_date"], group["end_date"]):
+            index.add(start, end)
+        rows.append((*key, index.days_in(year_start, year_end)))
+    return pd.DataFrame(rows, columns=[*keys, "days"])
+
+
+def _documents(data):
+    frames = [
+        data[table].assign(doc_type=doc_type)
+        for doc_type, (table, _, _) in DOCUMENT_TYPES.items()
+    ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _expiring(data, today, days):
+    documents = _documents(data)
+    today = pd.Timestamp(today)
+    expiring = documents[documents["expiry_date"].between(today, today + pd.Timedelta(days=days))]
+    return expiring.assign(days_remaining=(expiring["expiry_date"] - today).dt.days)
+
+
+def department_summary(data, year=None, days=NOTIFICATION_DAYS_BEFORE_EXPIRY, today=None):
+    """لكل قسم: الموظفون والرواتب، الطلبات المعلقة، أيام الإجازات والسلف المعتمدة، والوثائق القريبة الانتهاء"""
+    today = today or date.today()
+    year = year or today.year
+    employees = data["employees"]
+    requests = _with_department(data["requests"], employees)
+
+    summary = employees.groupby("department").agg(
+        headcount=("id", "size"),
+        total_salary=("salary", "sum"),
+        avg_salary=("salary", "mean"),
+    )
+    pending = requests[requests["status"] == "Pending"].groupby("department").size()
+    leave_days = _leave_days(
+        _approved_leaves(requests, year), year, ["department", "emp_id"]
+    ).groupby("department")["days"].sum()
+    loans = requests[
+        (requests["type"] == LOAN_TYPE) & (requests["status"] == "Approved")
+        & (requests["created_at"].dt.year == year)
+    ].groupby("department")["loan_amount"].sum()
+    expiring = _with_department(_expiring(data, today, days), employees).groupby("department").size()
+
+    summary = summary.join(pd.DataFrame({
+        "pending_requests": pending,
+        "leave_days": leave_days,
+        "approved_loans": loans,
+        "expiring_documents": expiring,
+    }), how="outer").fillna(0)
+    counts = ["headcount", "pending_requests", "leave_days", "expiring_documents"]
+    summary[counts] = summary[counts].astype("int64")
+    summary["avg_salary"] = summary["avg_salary"].round(2)
+    return summary.rename_axis("department").reset_index()
+
+
+def leave_consumption(data, year=None):
+    """أيام الإجازات المعتمدة لكل موظف في السنة حسب العنوان، ورصيد السنوية المتبقي"""
+    year = year or date.today().year
+    leaves = _approved_leaves(data["requests"], year)
+    by_title = _leave_days(leaves, year, ["emp_id", "title"]).pivot_table(
+        index="emp_id", columns="title", values="days", aggfunc="sum", fill_value=0
+    )
+    by_title.columns.name = None
+    if ANNUAL_LEAVE_TITLE not in by_title:
+        by_title[ANNUAL_LEAVE_TITLE] = 0
+    # الإجمالي من فواصل الموظف المدمجة عبر كل الأنواع (لا مجموع الأعمدة)
+    by_title["total_days"] = _leave_days(leaves, year, ["emp_id"]).set_index("emp_id")["days"]
+    by_title["annual_remaining"] = ANNUAL_LEAVE_DAYS - by_title[ANNUAL_LEAVE_TITLE]
+
+    employees = data["employees"].set_index("id")[["name", "department"]]
+    report = by_title.join(employees, how="left")
+    report["name"] = report["name"].fillna(leaves.groupby("emp_id")["employee"].first())
+    report["department"] = report["department"].fillna(UNKNOWN_DEPARTMENT)
+    report = report.rename_axis("emp_id").reset_index()
+    front = ["emp_id", "name", "department"]
+    return report[front + [c for c in report.columns if c not in front]].sort_values(
+        ["department", "emp_id"], ignore_index=True
+    )
+
+
+def loans(data, year=None, status=None):
+    """السلف لكل موظف: العدد، المبلغ المطلوب، المعتمد، والمعلق"""
+    requests = data["requests"]
+    mask = requests["type"] == LOAN_TYPE
+    if year:
+        mask &= requests["created_at"].dt.year == year
+    if status:
+        mask &= requests["status"] == status
+    loans_df = _with_department(requests[mask], data["employees"])
+    amount = loans_df["loan_amount"]
+    report = loans_df.assign(
+        approved_amount=amount.where(loans_df["status"] == "Approved", 0.0),
+        pending_amount=amount.where(loans_df["status"] == "Pending", 0.0),
+    ).groupby(["department", "emp_id"]).agg(
+        employee=("employee", "first"),
+        loans=("id", "size"),
+        requested_amount=("loan_amount", "sum"),
+        approved_amount=("approved_amount", "sum"),
+        pending_amount=("pending_amount", "sum"),
+    )
+    return report.reset_index().sort_values(["department", "requested_amount"], ascending=[True, False], ignore_index=True)
+
+
+def employee_requests(data, emp_id=None):
+    """تقرير الموظف الفردي: كل طلباته مع أيام كل إجازة"""
+    requests = data["requests"]
+    report = requests[requests["emp_id"] == str(emp_id)]
+    leave = (report["type"] == LEAVE_TYPE) & report["start_date"].notna() & report["end_date"].notna()
+    days = ((report["end_date"] - report["start_date"]).dt.days + 1).where(leave)
+    return report.assign(leave_days=days).sort_values("created_at", ignore_index=True)
+
+
+def document_expiry(data, days=NOTIFICATION_DAYS_BEFORE_EXPIRY, today=None):
+    """الجوازات والإقامات المنتهية خلال days يوماً مع الموظف والقسم"""
+    expiring = _expiring(data, today or date.today(), days)
+    employees = data["employees"].set_index("id")
+    report = expiring.assign(
+        name=expiring["emp_id"].map(employees["name"]),
+        department=expiring["emp_id"].map(employees["department"]).fillna(UNKNOWN_DEPARTMENT),
+    )
+    return report[
+        ["doc_type", "emp_id", "name", "department", "doc_number", "expiry_date", "days_remaining"]
+    ].sort_values(["expiry_date", "emp_id"], ignore_index=True)
+
+
+# اسم التقرير ← (العنوان، الدالة)
+REPORTS = {
+    "department_summary": ("ملخص الأقسام", department_summary),
+    "leave_consumption": ("استهلاك الإجازات", leave_consumption),
+    "loans": ("السلف والمستحقات", loans),
+    "employee_requests": ("تقرير موظف", employee_requests),
+    "document_expiry": ("الوثائق القريبة الانتهاء", document_expiry),
+}
+
+
+class ReportEngine:
+    """
+    تشغيل التقارير فوق مصادر بيانات ذات نسخ
+    - إطارات كل مصدر تُحمّل مرة واحدة لكل نسخة منه
+    - النتائج تُخزن بمفتاح (التقرير، المعاملات، نسخة البيانات) وتُفرغ عند تغير النسخة
+    """
+
+    def __init__(self, sources, cache_size=REPORT_CACHE_SIZE):
+        self._sources = sources
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._frames = [(None, {}) for _ in sources]
+        self._results = OrderedDict()
+        self._data_version = None
+        self.hits = 0
+        self.misses = 0
+
+    def data_version(self):
+        return tuple(source.version() for source in self._sources)
+
+    def _data(self, version):
+        data = {}
+        for i, (source, source_version) in enumerate(zip(self._sources, version)):
+            loaded_version, frames = self._frames[i]
+            if loaded_version != source_version:
+                frames = source.load()
+                self._frames[i] = (source_version, frames)
+            data.update(frames)
+        return data
+
+    def run(self, name, **params):
+        """نتيجة التقرير كإطار بيانات (نسخة مخزنة إن لم تتغير البيانات)"""
+        if name not in REPORTS:
+            raise ValueError(f"تقرير غير معروف: {name}")
+        version = self.data_version()
+        key = (name, tuple(sorted(params.items())), version)
+        with self._lock:
+            if version != self._data_version:
+                self._results.clear()
+                self._data_version = version
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+
+            self.misses += 1
+            result = REPORTS[name][1](self._data(version), **params)
+            self._results[key] = result
+            if len(self._results) > self._cache_size:
+                self._results.popitem(last=False)
+            return result
+
+
+# ====================================
+# التصدير
+# ====================================
+
+def labelled(frame):
+    """نسخة بعناوين الأعمدة العربية للعرض والتصدير"""
+    return frame.rename(columns=COLUMN_LABELS)
+
+
+def _iter_rows(frame, chunk_size=10_000):
+    # تحويل أجزاء متتالية إلى أنواع بايثون (NaN/NaT ← None) بدل تحويل الإطار كاملاً
+    for offset in range(0, len(frame), chunk_size):
+        part = frame.iloc[offset:offset + chunk_size].astype(object)
+        part = part.where(part.notna(), None)
+        yield from part.itertuples(index=False, name=None)
+
+
+def export_xlsx(sheets, target):
+    """
+    تصدير أوراق (العنوان ← إطار بيانات) إلى xlsx بوضع write_only
+    الصفوف تُكتب للملف المؤقت أولاً بأول فلا يُبنى المصنف كاملاً في الذاكرة
+    target: مسار ملف أو كائن ثنائي (BytesIO للتنزيل من الواجهة)
+    """
+    workbook = Workbook(write_only=True)
+    for title, frame in sheets.items():
+        # أسماء الأوراق في Excel بحد أقصى 31 حرفاً
+        sheet = workbook.create_sheet(title=str(title)[:31])
+        sheet.append([str(column) for column in frame.columns])
+        for row in _iter_rows(frame):
+            sheet.append(row)
+    workbook.save(target)
+    return target
+
+
+def export_pdf(frame, target, title=""):
+    """تصدير تقرير مختصر إلى PDF (يتطلب reportlab)"""
+    if not REPORTLAB_AVAILABLE:
+        raise RuntimeError("تصدير PDF يتطلب: pip install reportlab")
+    if len(frame) > REPORT_PDF_MAX_ROWS:
+        raise ValueError(f"التقرير أكبر من {REPORT_PDF_MAX_ROWS} صف، استخدم تصدير Excel")
+
+    style = [
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ("FONTSIZE", (0, 0), (-1, -1), 8),
+    ]
+    if REPORT_PDF_FONT:
+        # النص العربي يحتاج خطاً يدعمه؛ بدونه تظهر الحروف مربعات
+        pdfmetrics.registerFont(TTFont("ReportFont", REPORT_PDF_FONT))
+        style.append(("FONTNAME", (0, 0), (-1, -1), "ReportFont"))
+
+    rows = [[str(column) for column in frame.columns]]
+    rows += [["" if value is None else str(value) for value in row] for row in _iter_rows(frame)]
+    table = Table(rows, repeatRows=1)
+    table.setStyle(TableStyle(style))
+    SimpleDocTemplate(target, pagesize=landscape(A4), title=title).build([table])
+    return target
+
+
+def create_report_engine(store, static_users=None):
+    """التقارير فوق مخزن الطلبات، والموظفون والوثائق من Supabase أو ملفات Excel"""
+    if USE_DATABASE:
+        from db_clients import get_supabase
+        data_source = SupabaseReportSource(get_supabase())
+    else:
+        data_source = ExcelReportSource(extra_employees=static_users)
+    return ReportEngine([StoreRequestSource(store), data_source])
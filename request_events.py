@@ -0,0 +1,57 @@
+"""
+سجل أحداث الطلبات (إلحاق فقط)
+كل انتقال يُخزن كحدث مضغوط (request_id, stage_from, stage_to, actor, action, ts)
+في جدول request_events بدل قائمة نصوص منسقة داخل الطلب
+الأحداث ينشئها محرك الموافقات، والتنسيق للعرض يتم هنا عند الحاجة فقط
+وحالة أي طلب يمكن إعادة بنائها من أحداثه (replay)
+"""
+
+from workflow import STAGE_DONE, STAGE_REJECTED
+
+EVENT_FIELDS = ("request_id", "stage_from", "stage_to", "actor", "action", "ts")
+
+
+def format_event(event, rejection_reason=None):
+    """سطر واحد في سجل العمليات (ts مخزن بصيغة YYYY-MM-DD HH:MM:SS)"""
+    ts = str(event["ts"])[:16]
+    if event["action"] == "submit":
+        text = "تم تقديم الطلب"
+    elif event["action"] == "reject":
+        text = f"تم الرفض بواسطة {event['actor']}"
+        if rejection_reason:
+            text += f". السبب: {rejection_reason}"
+    else:
+        text = f"وافق {event['actor']}"
+        if event["stage_to"] == STAGE_DONE:
+            text += " - اكتمل الطلب"
+    return f"{ts}: {text}"
+
+
+def format_history(events, req=None):
+    """
+    سجل العمليات للعرض
+    الطلبات القديمة تبدأ بقائمة history النصية المحفوظة معها (ما قبل سجل الأحداث)
+    ثم تليها أحداثها اللاحقة، والطلبات الجديدة history فيها فارغة
+    """
+    req = req or {}
+    legacy = list(req.get("history") or [])
+    return legacy + [format_event(event, req.get("rejection_reason")) for event in events]
+
+
+def replay(events):
+    """
+    إعادة بناء حالة الطلبات من السجل
+    ترجع: رقم الطلب ← {current_stage, status, approved_by}
+    """
+    snapshots = {}
+    for event in sorted(events, key=lambda e: (e["ts"], e.get("id") or 0)):
+        snapshot = snapshots.setdefault(
+            event["request_id"], {"current_stage": None, "status": "Pending", "approved_by": None}
+        )
+        snapshot["current_stage"] = event["stage_to"]
+        if event["action"] == "reject" or event["stage_to"] == STAGE_REJECTED:
+            snapshot["status"] = "Rejected"
+        elif event["stage_to"] == STAGE_DONE:
+            snapshot["status"] = "Approved"
+            snapshot["approved_by"] = event["actor"]
+    return snapshots
@@ -0,0 +1,680 @@
+"""
+مخزن الطلبات الدائم
+محرك تخزين مشترك بين جميع جلسات Streamlit بدلاً من st.session_state
+يدعم SQLite المدمجة و PostgreSQL (جدول requests في database_setup.sql)
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from config import REQUEST_STORE_BACKEND, SQLITE_DB_PATH, DATABASE_URL, REQUEST_STORE_STAMP_INTERVAL
+from db_clients import get_pg_pool, pg_connection
+
+# تحويل حالة الطلب بين التطبيق وقاعدة البيانات
+STATUS_TO_DB = {"Pending": "معلق", "Approved": "موافق عليه", "Rejected": "مرفوض"}
+STATUS_FROM_DB = {v: k for k, v in STATUS_TO_DB.items()}
+
+# أعمدة الترتيب المسموحة في query (تُدرج في SQL فيجب أن تكون من قائمة ثابتة)
+SORT_KEYS = ("id", "created_at", "type", "status", "current_stage", "employee")
+
+
+def _matches(req, filters):
+    """تطبيق فلاتر query على طلب في الذاكرة"""
+    created = (req.get("created_at") or "")[:10]
+    return (
+        (not filters.get("emp_id") or req["emp_id"] == filters["emp_id"])
+        and (not filters.get("status") or req["status"] == filters["status"])
+        and (not filters.get("type") or req["type"] == filters["type"])
+        and (not filters.get("date_from") or created >= str(filters["date_from"]))
+        and (not filters.get("date_to") or created <= str(filters["date_to"]))
+    )
+
+
+def _events_of(events, request_ids):
+    """أحداث الطلبات المحفوظة فقط"""
+    request_ids = set(request_ids)
+    return [event for event in events if event["request_id"] in request_ids]
+
+
+class RequestStore:
+    """الواجهة المشتركة لمحركات تخزين الطلبات"""
+
+    def add(self, request, events=()):
+        """إضافة طلب جديد مع أحداثه الأولى وإرجاع رقمه"""
+        raise NotImplementedError
+
+    def get(self, request_id):
+        """جلب طلب واحد برقمه"""
+        raise NotImplementedError
+
+    def get_many(self, request_ids):
+        """جلب عدة طلبات (يتجاهل الأرقام غير الموجودة)"""
+        requests = (self.get(request_id) for request_id in request_ids)
+        return [req for req in requests if req is not None]
+
+    def save(self, request, events=(), expected_stages=None):
+        """حفظ التعديلات على طلب موجود مع أحداث الانتقال، ترجع هل حُفظ"""
+        return bool(self.save_many([request], events, expected_stages))
+
+    def save_many(self, requests, events=(), expected_stages=None):
+        """
+        حفظ عدة طلبات وإلحاق أحداثها في معاملة واحدة
+        expected_stages: رقم الطلب ← مرحلته قبل الانتقال؛ يُحفظ الطلب عندها فقط إن كان
+        ما زال معلقاً في تلك المرحلة (وإلا فقد سبقه مراجع آخر) وتُهمل أحداثه
+        ترجع أرقام الطلبات المحفوظة فعلاً
+        """
+        raise NotImplementedError
+
+    def events_for(self, request_id):
+        """أحداث طلب واحد بترتيب حدوثها"""
+        raise NotImplementedError
+
+    def list_events(self, after_id=0):
+        """الأحداث ذات الرقم التسلسلي الأكبر من after_id (للقراءة التدريجية)"""
+        raise NotImplementedError
+
+    def list_pending(self, stage):
+        """الطلبات المعلقة في مرحلة معينة"""
+        raise NotImplementedError
+
+    def list_by_employee(self, emp_id):
+        """طلبات موظف معين"""
+        raise NotImplementedError
+
+    def list_all(self):
+        """جميع الطلبات"""
+        raise NotImplementedError
+
+    def count_by_status(self, status):
+        """عدد الطلبات بحالة معينة (للمطابقة الدورية للعدادات)"""
+        return sum(1 for req in self.list_all() if req["status"] == status)
+
+    def change_stamp(self):
+        """
+        بصمة رخيصة تتغير عندما يكتب غير هذا الكائن في المحرك (عملية أخرى أو استيراد)
+        None يعني أن المحرك لا يدعمها
+        """
+        return None
+
+    def query(self, filters=None, sort="id", descending=True, offset=0, limit=50):
+        """
+        صفحة من الطلبات مع الفلاتر والترتيب، وإجمالي عدد المطابق
+        الفلاتر: emp_id, status, type, date_from, date_to (تاريخ التقديم)
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"عمود ترتيب غير مسموح: {sort}")
+        filters = filters or {}
+        matched = [req for req in self.list_all() if _matches(req, filters)]
+        matched.sort(key=lambda req: (req.get(sort) is None, req.get(sort), req["id"]), reverse=descending)
+        return matched[offset:offset + limit], len(matched)
+
+
+# ====================================
+# SQLite
+# ====================================
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    emp_id TEXT NOT NULL,
+    employee TEXT NOT NULL,
+    type TEXT NOT NULL,
+    title TEXT NOT NULL,
+    start_date TEXT,
+    end_date TEXT,
+    loan_amount REAL DEFAULT 0,
+    reason TEXT,
+    current_stage INTEGER NOT NULL DEFAULT 2,
+    workflow TEXT,
+    status TEXT NOT NULL DEFAULT 'Pending',
+    history TEXT NOT NULL DEFAULT '[]',
+    approved_by TEXT,
+    rejection_reason TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_requests_emp_id ON requests(emp_id);
+CREATE INDEX IF NOT EXISTS idx_requests_stage_status ON requests(current_stage, status);
+CREATE INDEX IF NOT EXISTS idx_requests_status ON requests(status);
+CREATE INDEX IF NOT EXISTS idx_requests_created_at ON requests(created_at);
+
+-- سجل أحداث الطلبات: إلحاق فقط
+CREATE TABLE IF NOT EXISTS request_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    request_id INTEGER NOT NULL,
+    stage_from INTEGER,
+    stage_to INTEGER NOT NULL,
+    actor TEXT NOT NULL,
+    action TEXT NOT NULL,
+    ts TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_request_events_request ON request_events(request_id, id);
+CREATE TRIGGER IF NOT EXISTS request_events_no_update BEFORE UPDATE ON request_events
+BEGIN SELECT RAISE(ABORT, 'request_events is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS request_events_no_delete BEFORE DELETE ON request_events
+BEGIN SELECT RAISE(ABORT, 'request_events is append-only'); END;
+"""
+
+EVENT_COLUMNS = ["id", "request_id", "stage_from", "stage_to", "actor", "action", "ts"]
+
+SQLITE_COLUMNS = [
+    "id", "emp_id", "employee", "type", "title", "start_date", "end_date",
+    "loan_amount", "reason", "current_stage", "workflow", "status", "history",
+    "approved_by", "rejection_reason", "created_at",
+]
+
+# أعمدة أُضيفت بعد إنشاء الجدول: تُضاف للقواعد المحلية القديمة عند الفتح
+SQLITE_MIGRATIONS = {
+    "workflow": "ALTER TABLE requests ADD COLUMN workflow TEXT",
+}
+
+
+class SQLiteRequestStore(RequestStore):
+    """تخزين الطلبات في ملف SQLite محلي (وضع WAL)"""
+
+    def __init__(self, db_path=SQLITE_DB_PATH):
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        # اتصال واحد مشترك بين خيوط Streamlit محمي بقفل
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(requests)")}
+        with self._lock, self._conn:
+            for column, sql in SQLITE_MIGRATIONS.items():
+                if column not in existing:
+                    self._conn.execute(sql)
+
+    def _to_dict(self, row):
+        req = {col: row[col] for col in SQLITE_COLUMNS}
+        req["history"] = json.loads(req["history"] or "[]")
+        return req
+
+    def _select(self, where="", params=()):
+        sql = f"SELECT {', '.join(SQLITE_COLUMNS)} FROM requests {where} ORDER BY id"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def _append_events(self, events):
+        # يُستدعى داخل معاملة الطلب نفسها
+        self._conn.executemany(
+            f"INSERT INTO request_events ({', '.join(EVENT_COLUMNS[1:])}) "
+            f"VALUES ({', '.join('?' for _ in EVENT_COLUMNS[1:])})",
+            [[event[c] for c in EVENT_COLUMNS[1:]] for event in events],
+        )
+
+    def _select_events(self, where="", params=()):
+        sql = f"SELECT {', '.join(EVENT_COLUMNS)} FROM request_events {where} ORDER BY id"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def add(self, request, events=()):
+        columns = [c for c in SQLITE_COLUMNS if c != "id" and c in request]
+        values = [
+            json.dumps(request[c], ensure_ascii=False) if c == "history" else request[c]
+            for c in columns
+        ]
+        sql = (
+            f"INSERT INTO requests ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        with self._lock, self._conn:
+            cursor = self._conn.execute(sql, values)
+            request["id"] = cursor.lastrowid
+            for event in events:
+                event["request_id"] = request["id"]
+            self._append_events(events)
+        return request["id"]
+
+    def get(self, request_id):
+        rows = self._select("WHERE id = ?", (request_id,))
+        return rows[0] if rows else None
+
+    def save_many(self, requests, events=(), expected_stages=None):
+        if not requests:
+            return []
+        columns = [c for c in SQLITE_COLUMNS if c != "id" and c in requests[0]]
+        sql = (
+            f"UPDATE requests SET {', '.join(f'{c} = ?' for c in columns)}, "
+            f"updated_at = CURRENT_TIMESTAMP WHERE id = ?"
+        )
+        if expected_stages is not None:
+            sql += " AND current_stage = ? AND status = 'Pending'"
+        saved = []
+        with self._lock, self._conn:
+            for req in requests:
+                values = [
+                    json.dumps(req[c], ensure_ascii=False) if c == "history" else req[c]
+                    for c in columns
+                ] + [req["id"]]
+                if expected_stages is not None:
+                    values.append(expected_stages[req["id"]])
+                if self._conn.execute(sql, values).rowcount:
+                    saved.append(req["id"])
+            self._append_events(_events_of(events, saved))
+        return saved
+
+    def events_for(self, request_id):
+        return self._select_events("WHERE request_id = ?", (request_id,))
+
+    def list_events(self, after_id=0):
+        return self._select_events("WHERE id > ?", (after_id,))
+
+    def list_pending(self, stage):
+        return self._select("WHERE current_stage = ? AND status = 'Pending'", (stage,))
+
+    def list_by_employee(self, emp_id):
+        return self._select("WHERE emp_id = ?", (emp_id,))
+
+    def list_all(self):
+        return self._select()
+
+    def count_by_status(self, status):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM requests WHERE status = ?", (status,)
+            ).fetchone()[0]
+
+    def change_stamp(self):
+        # يتغير عند كل معاملة تُثبتها اتصالات أخرى بالملف، لا معاملات هذا الاتصال
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def query(self, filters=None, sort="id", descending=True, offset=0, limit=50):
+        if sort not in SORT_KEYS:
+            raise ValueError(f"عمود ترتيب غير مسموح: {sort}")
+        filters = filters or {}
+        clauses, params = [], []
+        for column in ("emp_id", "status", "type"):
+            if filters.get(column):
+                clauses.append(f"{column} = ?")
+                params.append(filters[column])
+        if filters.get("date_from"):
+            clauses.append("created_at >= ?")
+            params.append(str(filters["date_from"]))
+        if filters.get("date_to"):
+            clauses.append("created_at < ?")
+            params.append(str(filters["date_to"] + timedelta(days=1)))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        direction = "DESC" if descending else "ASC"
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM requests {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {', '.join(SQLITE_COLUMNS)} FROM requests {where} "
+                f"ORDER BY {sort} {direction}, id {direction} LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        return [self._to_dict(row) for row in rows], total
+
+
+# ====================================
+# PostgreSQL
+# ====================================
+
+POSTGRES_COLUMNS = (
+    "id, emp_id, emp_name, type, title, details, start_date, end_date, "
+    "loan_amount, current_stage, workflow, status, history, approved_by, rejection_reason, created_at"
+)
+
+# اسم العمود في التطبيق ← اسمه في جدول PostgreSQL
+POSTGRES_COLUMN_NAMES = {"employee": "emp_name"}
+
+
+class PostgresRequestStore(RequestStore):
+    """تخزين الطلبات في جدول requests على PostgreSQL / Supabase"""
+
+    def __init__(self, dsn=DATABASE_URL):
+        from psycopg2.extras import Json, RealDictCursor
+
+        self._Json = Json
+        self._cursor_factory = RealDictCursor
+        # اتصال مستعار من المجمّع المشترك لكل عملية بدلاً من اتصال واحد مقفل
+        self._dsn = dsn
+        get_pg_pool(dsn)
+
+    def _to_dict(self, row):
+        return {
+            "id": row["id"],
+            "emp_id": row["emp_id"],
+            "employee": row["emp_name"],
+            "type": row["type"],
+            "title": row["title"],
+            "start_date": str(row["start_date"]) if row["start_date"] else None,
+            "end_date": str(row["end_date"]) if row["end_date"] else None,
+            "loan_amount": float(row["loan_amount"] or 0),
+            "reason": row["details"],
+            "current_stage": row["current_stage"],
+            "workflow": row["workflow"],
+            "status": STATUS_FROM_DB.get(row["status"], row["status"]),
+            "history": row["history"] or [],
+            "approved_by": row["approved_by"],
+            "rejection_reason": row["rejection_reason"],
+            "created_at": row["created_at"].strftime("%Y-%m-%d %H:%M:%S") if row["created_at"] else None,
+        }
+
+    def _to_row(self, request):
+        row = {
+            "id": request["id"],
+            "emp_id": request["emp_id"],
+            "emp_name": request["employee"],
+            "type": request["type"],
+            "title": request["title"],
+            "details": request.get("reason"),
+            "start_date": request.get("start_date"),
+            "end_date": request.get("end_date"),
+            "loan_amount": request.get("loan_amount") or 0,
+            "current_stage": request["current_stage"],
+            "workflow": request.get("workflow"),
+            "status": STATUS_TO_DB.get(request["status"], request["status"]),
+            "history": self._Json(request.get("history", [])),
+            "approved_by": request.get("approved_by"),
+            "rejection_reason": request.get("rejection_reason"),
+        }
+        if request.get("created_at"):
+            row["created_at"] = request["created_at"]
+        return row
+
+    @staticmethod
+    def _append_events(cur, events):
+        # على نفس المؤشر فتُلحق الأحداث في معاملة الطلب
+        columns = EVENT_COLUMNS[1:]
+        cur.executemany(
+            f"INSERT INTO request_events ({', '.join(columns)}) "
+            f"VALUES ({', '.join(f'%({c})s' for c in columns)})",
+            [{c: event[c] for c in columns} for event in events],
+        )
+
+    def _select_events(self, where="", params=()):
+        sql = f"SELECT {', '.join(EVENT_COLUMNS)} FROM request_events {where} ORDER BY id"
+        with pg_connection(self._dsn) as conn, conn.cursor(cursor_factory=self._cursor_factory) as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        return [dict(row, ts=row["ts"].strftime("%Y-%m-%d %H:%M:%S")) for row in rows]
+
+    def _select(self, where="", params=()):
+        sql = f"SELECT {POSTGRES_COLUMNS} FROM requests {where} ORDER BY created_at, id"
+        with pg_connection(self._dsn) as conn, conn.cursor(cursor_factory=self._cursor_factory) as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def add(self, request, events=()):
+        # نفس صيغة أرقام الطلبات في البيانات التجريبية: REQ-YYYYMMDD...
+        request["id"] = f"REQ-{date.today():%Y%m%d}{uuid.uuid4().hex[:6].upper()}"
+        row = self._to_row(request)
+        columns = list(row)
+        sql = (
+            f"INSERT INTO requests ({', '.join(columns)}) "
+            f"VALUES ({', '.join(f'%({c})s' for c in columns)})"
+        )
+        for event in events:
+            event["request_id"] = request["id"]
+        with pg_connection(self._dsn) as conn, conn.cursor() as cur:
+            cur.execute(sql, row)
+            self._append_events(cur, events)
+        return request["id"]
+
+    def get(self, request_id):
+        rows = self._select("WHERE id = %s", (request_id,))
+        return rows[0] if rows else None
+
+    def save_many(self, requests, events=(), expected_stages=None):
+        if not requests:
+            return []
+        now = datetime.now()
+        rows = []
+        for request in requests:
+            row = self._to_row(request)
+            row["approved_at"] = now if request["status"] == "Approved" else None
+            rows.append(row)
+        columns = [c for c in rows[0] if c != "id"]
+        sql = (
+            f"UPDATE requests SET {', '.join(f'{c} = %({c})s' for c in columns)} "
+            f"WHERE id = %(id)s"
+        )
+        if expected_stages is not None:
+            sql += " AND current_stage = %(expected_stage)s AND status = %(expected_status)s"
+            for row in rows:
+                row["expected_stage"] = expected_stages[row["id"]]
+                row["expected_status"] = STATUS_TO_DB["Pending"]
+        saved = []
+        with pg_connection(self._dsn) as conn, conn.cursor() as cur:
+            for row in rows:
+                cur.execute(sql, row)
+                if cur.rowcount:
+                    saved.append(row["id"])
+            self._append_events(cur, _events_of(events, saved))
+        return saved
+
+    def events_for(self, request_id):
+        return self._select_events("WHERE request_id = %s", (request_id,))
+
+    def list_events(self, after_id=0):
+        return self._select_events("WHERE id > %s", (after_id,))
+
+    def list_pending(self, stage):
+        return self._select(
+            "WHERE current_stage = %s AND status = %s", (stage, STATUS_TO_DB["Pending"])
+        )
+
+    def list_by_employee(self, emp_id):
+        return self._select("WHERE emp_id = %s", (emp_id,))
+
+    def list_all(self):
+        return self._select()
+
+    def count_by_status(self, status):
+        with pg_connection(self._dsn) as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT COUNT(*) FROM requests WHERE status = %s", (STATUS_TO_DB.get(status, status),)
+            )
+            return cur.fetchone()[0]
+
+    def change_stamp(self):
+        # العدد يكشف الإضافة والحذف، وupdated_at (يحدّثه trigger) يكشف التعديل
+        with pg_connection(self._dsn) as conn, conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*), MAX(updated_at) FROM requests")
+            return tuple(cur.fetchone())
+
+    def query(self, filters=None, sort="id", descending=True, offset=0, limit=50):
+        if sort not in SORT_KEYS:
+            raise ValueError(f"عمود ترتيب غير مسموح: {sort}")
+        filters = filters or {}
+        clauses, params = [], []
+        if filters.get("emp_id"):
+            clauses.append("emp_id = %s")
+            params.append(filters["emp_id"])
+        if filters.get("status"):
+            clauses.append("status = %s")
+            params.append(STATUS_TO_DB.get(filters["status"], filters["status"]))
+        if filters.get("type"):
+            clauses.append("type = %s")
+            params.append(filters["type"])
+        if filters.get("date_from"):
+            clauses.append("created_at >= %s")
+            params.append(filters["date_from"])
+        if filters.get("date_to"):
+            clauses.append("created_at < %s")
+            params.append(filters["date_to"] + timedelta(days=1))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        direction = "DESC" if descending else "ASC"
+        order = POSTGRES_COLUMN_NAMES.get(sort, sort)
+
+        with pg_connection(self._dsn) as conn, conn.cursor(cursor_factory=self._cursor_factory) as cur:
+            cur.execute(f"SELECT COUNT(*) AS total FROM requests {where}", params)
+            total = cur.fetchone()["total"]
+            cur.execute(
+                f"SELECT {POSTGRES_COLUMNS} FROM requests {where} "
+                f"ORDER BY {order} {direction}, id {direction} LIMIT %s OFFSET %s",
+                params + [limit, offset],
+            )
+            rows = cur.fetchall()
+        return [self._to_dict(row) for row in rows], total
+
+
+# ====================================
+# فهارس ثانوية في الذاكرة
+# ====================================
+
+class IndexedRequestStore(RequestStore):
+    """
+    فهارس في الذاكرة فوق محرك التخزين: حسب الرقم، (المرحلة، الحالة)، ورقم الموظف
+    تُحدَّث تدريجياً عند الإضافة والحفظ فتكلف طوابير الموافقة O(المعلق) بدل O(الكل)
+    كتابات الآخرين (عمليات أخرى، الاستيراد) تُكتشف ببصمة التغيير في المحرك كل
+    stamp_interval ثانية على الأكثر، فيُعاد بناء الفهارس ويزداد version
+    """
+
+    def __init__(self, backend, stamp_interval=REQUEST_STORE_STAMP_INTERVAL):
+        self._backend = backend
+        self._stamp_interval = stamp_interval
+        self._lock = threading.RLock()
+        self._version = 0
+        self.reload()
+
+    @property
+    def version(self):
+        """يزداد مع كل كتابة أو إعادة تحميل ليُستخدم مفتاحاً لذاكرة الصفحات المؤقتة"""
+        with self._lock:
+            self._sync()
+            return self._version
+
+    def reload(self):
+        """إعادة بناء الفهارس كاملة من المحرك"""
+        with self._lock:
+            self._stamp_seen = self._backend.change_stamp()
+            self._checked_at = time.monotonic()
+            self._by_id = {}
+            # القواميس تحفظ ترتيب الإدخال فتعمل كمجموعات مرتبة
+            self._by_stage_status = defaultdict(dict)
+            self._by_emp = defaultdict(dict)
+            for req in self._backend.list_all():
+                self._index(req)
+            self._version += 1
+
+    def _sync(self, force=False):
+        # يُستدعى داخل القفل قبل كل قراءة أو كتابة
+        if not force and time.monotonic() - self._checked_at < self._stamp_interval:
+            return
+        self._checked_at = time.monotonic()
+        if self._backend.change_stamp() != self._stamp_seen:
+            self.reload()
+
+    def _mark_written(self):
+        # كتاباتنا تغيّر بصمة بعض المحركات (Postgres) فتُعتمد بصمتها الجديدة حتى لا نعيد
+        # التحميل بسببها؛ سبقها _sync(force=True) فلا يضيع إلا ما كتبه غيرنا أثناء كتابتنا
+        self._stamp_seen = self._backend.change_stamp()
+        self._version += 1
+
+    @staticmethod
+    def _copy(req):
+        # نسخة مستقلة حتى لا يعدّل المستدعي الفهرس مباشرة
+        return dict(req, history=list(req.get("history", [])))
+
+    def _index(self, req):
+        self._by_id[req["id"]] = req
+        self._by_stage_status[(req["current_stage"], req["status"])][req["id"]] = None
+        self._by_emp[req["emp_id"]][req["id"]] = None
+
+    def _unindex(self, req):
+        # رقم الموظف لا يتغير، فيبقى فهرسه كما هو محافظاً على ترتيب الطلبات
+        self._by_stage_status[(req["current_stage"], req["status"])].pop(req["id"], None)
+
+    def add(self, request, events=()):
+        with self._lock:
+            self._sync(force=True)
+            request_id = self._backend.add(request, events)
+            self._index(self._copy(request))
+            self._mark_written()
+        return request_id
+
+    def get(self, request_id):
+        with self._lock:
+            self._sync()
+            req = self._by_id.get(request_id)
+            return self._copy(req) if req else None
+
+    def get_many(self, request_ids):
+        with self._lock:
+            self._sync()
+            requests = (self._by_id.get(request_id) for request_id in request_ids)
+            return [self._copy(req) for req in requests if req is not None]
+
+    def save_many(self, requests, events=(), expected_stages=None):
+        with self._lock:
+            self._sync(force=True)
+            saved = self._backend.save_many(requests, events, expected_stages)
+            saved_ids = set(saved)
+            for request in requests:
+                old = self._by_id.get(request["id"])
+                if old is not None:
+                    self._unindex(old)
+                # الطلب الذي لم يُحفظ عدّله غيرنا: تُقرأ حالته الفعلية من المحرك
+                current = request if request["id"] in saved_ids else self._backend.get(request["id"])
+                if current is not None:
+                    self._index(self._copy(current))
+            self._mark_written()
+        return saved
+
+    def events_for(self, request_id):
+        # السجل لا يُحمّل في الذاكرة: يُقرأ للطلب المعروض فقط
+        return self._backend.events_for(request_id)
+
+    def list_events(self, after_id=0):
+        return self._backend.list_events(after_id)
+
+    def list_pending(self, stage):
+        with self._lock:
+            self._sync()
+            ids = list(self._by_stage_status.get((stage, "Pending"), ()))
+            return [self._copy(self._by_id[i]) for i in ids]
+
+    def list_by_employee(self, emp_id):
+        with self._lock:
+            self._sync()
+            ids = list(self._by_emp.get(emp_id, ()))
+            return [self._copy(self._by_id[i]) for i in ids]
+
+    def list_all(self):
+        with self._lock:
+            self._sync()
+            return [self._copy(req) for req in self._by_id.values()]
+
+    def query(self, filters=None, sort="id", descending=True, offset=0, limit=50):
+        # الترتيب والتقسيم لصفحات في محرك التخزين عبر فهارسه
+        return self._backend.query(filters, sort, descending, offset, limit)
+
+    def count_by_status(self, status):
+        with self._lock:
+            self._sync()
+            return sum(
+                len(ids) for (_, req_status), ids in self._by_stage_status.items()
+                if req_status == status
+            )
+
+
+def create_request_store(backend=None):
+    """إنشاء محرك التخزين حسب الإعدادات مع الفهارس الثانوية"""
+    backend = backend or REQUEST_STORE_BACKEND
+
+    if backend == "sqlite":
+        return IndexedRequestStore(SQLiteRequestStore(SQLITE_DB_PATH))
+    if backend == "postgres":
+        return IndexedRequestStore(PostgresRequestStore(DATABASE_URL))
+
+    raise ValueError(f"محرك تخزين غير معروف: {backend}")
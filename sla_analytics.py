@@ -0,0 +1,155 @@
+"""
+تحليلات زمن الإنجاز (SLA) من سجل أحداث الطلبات
+- مدة بقاء الطلب في كل مرحلة موافقة (نسب مئوية)
+- الطلبات المتراكمة لدى كل مراجع وعمر أقدمها
+- الإنجاز اليومي (مقدّم، مكتمل، مرفوض)
+تُقرأ الأحداث الجديدة فقط (list_events بعد آخر رقم مقروء) وتُحسب بعمليات pandas
+على الأعمدة دفعة واحدة، ثم تُضاف إلى المجاميع المخزنة بدل إعادة الحساب من البداية
+الطلبات القديمة بلا أحداث (قبل سجل request_events) لا تدخل في الحساب
+"""
+
+import threading
+
+import pandas as pd
+
+from config import SLA_PERCENTILES, SLA_THROUGHPUT_DAYS
+from workflow import APPROVAL_STAGES, STAGE_DONE
+
+OUTCOME_LABELS = {"submitted": "مقدّم", "approved": "مكتمل", "rejected": "مرفوض"}
+
+
+class SLAAnalytics:
+    """
+    مجاميع تدريجية فوق سجل الأحداث
+    - _open: آخر مرحلة موافقة لكل طلب معلق ووقت دخوله إليها
+    - _dwells: مدد البقاء المكتملة (مرحلة، ثوانٍ) كأجزاء تُدمج عند أول قراءة
+    - _throughput: عدد الطلبات لكل يوم ونتيجة
+    """
+
+    def __init__(self, store, percentiles=SLA_PERCENTILES):
+        self._store = store
+        self._percentiles = list(percentiles)
+        self._lock = threading.Lock()
+        self._cursor = 0
+        self._open = pd.DataFrame(
+            {"stage": pd.Series(dtype="int64"), "entered": pd.Series(dtype="datetime64[ns]")},
+            index=pd.Index([], name="request_id", dtype=object),
+        )
+        self._dwell_chunks = []
+        self._dwells = pd.DataFrame(
+            {"stage": pd.Series(dtype="int64"), "seconds": pd.Series(dtype="float64")}
+        )
+        self._throughput = pd.DataFrame(columns=list(OUTCOME_LABELS), dtype="int64")
+        self._dwell_summary = None
+
+    @property
+    def cursor(self):
+        """رقم آخر حدث مقروء"""
+        return self._cursor
+
+    def refresh(self):
+        """قراءة الأحداث الجديدة وتحديث المجاميع، ترجع عدد الأحداث المضافة"""
+        with self._lock:
+            events = self._store.list_events(self._cursor)
+            if not events:
+                return 0
+            new = pd.DataFrame(events, columns=["id", "request_id", "stage_to", "action", "ts"])
+            new["ts"] = pd.to_datetime(new["ts"])
+            self._cursor = int(new["id"].max())
+            self._add_dwells(new)
+            self._add_throughput(new)
+            return len(new)
+
+    def _add_dwells(self, new):
+        # آخر حدث معروف للطلبات التي وصلتها أحداث جديدة يسبق هذه الأحداث
+        known = self._open.index.intersection(new["request_id"].unique())
+        frame = new[["id", "request_id", "stage_to", "ts"]]
+        if len(known):
+            previous = (
+                self._open.loc[known]
+                .rename(columns={"stage": "stage_to", "entered": "ts"})
+                .rename_axis("request_id")
+                .reset_index()
+                .assign(id=0)
+            )
+            frame = pd.concat([previous, frame], ignore_index=True)
+        frame = frame.sort_values(["request_id", "id"], kind="stable")
+
+        # مدة البقاء في stage_to = وقت الحدث التالي لنفس الطلب - وقت هذا الحدث
+        left = frame.groupby("request_id", sort=False)["ts"].shift(-1)
+        done = frame[left.notna() & frame["stage_to"].isin(APPROVAL_STAGES)]
+        if len(done):
+            seconds = (left[done.index] - done["ts"]).dt.total_seconds()
+            self._dwell_chunks.append(
+                pd.DataFrame({"stage": done["stage_to"].astype("int64"), "seconds": seconds})
+            )
+            self._dwell_summary = None
+
+        # آخر حالة لكل طلب: يبقى في _open إن كان ما زال في مرحلة موافقة
+        last = frame.drop_duplicates("request_id", keep="last").set_index("request_id")
+        pending = last[last["stage_to"].isin(APPROVAL_STAGES)]
+        opened = pd.DataFrame({"stage": pending["stage_to"].astype("int64"), "entered": pending["ts"]})
+        kept = self._open.drop(last.index, errors="ignore")
+        self._open = pd.concat([kept, opened]) if len(kept) else opened
+
+    def _add_throughput(self, new):
+        outcome = pd.Series(pd.NA, index=new.index, dtype=object)
+        outcome[new["action"] == "submit"] = "submitted"
+        outcome[(new["action"] == "approve") & (new["stage_to"] == STAGE_DONE)] = "approved"
+        outcome[new["action"] == "reject"] = "rejected"
+        daily = (
+            pd.DataFrame({"day": new["ts"].dt.normalize(), "outcome": outcome})
+            .dropna()
+            .groupby(["day", "outcome"]).size()
+            .unstack(fill_value=0)
+            .reindex(columns=list(OUTCOME_LABELS), fill_value=0)
+        )
+        self._throughput = daily if self._throughput.empty else self._throughput.add(daily, fill_value=0).astype("int64")
+
+    def dwell_times(self):
+        """
+        مدة البقاء في كل مرحلة بالساعات: العدد والمتوسط والنسب المئوية
+        تُحسب مرة واحدة لكل دفعة أحداث جديدة
+        """
+        with self._lock:
+            if self._dwell_summary is None:
+                if self._dwell_chunks:
+                    self._dwells = pd.concat([self._dwells, *self._dwell_chunks], ignore_index=True)
+                    self._dwell_chunks = []
+                hours = self._dwells.assign(hours=self._dwells["seconds"] / 3600).groupby("stage")["hours"]
+                summary = pd.DataFrame({
+                    "count": hours.size(),
+                    "mean": hours.mean(),
+                    **{f"p{round(p * 100)}": hours.quantile(p) for p in self._percentiles},
+                })
+                summary.insert(0, "approver", summary.index.map(APPROVAL_STAGES))
+                self._dwell_summary = summary.round(1)
+            return self._dwell_summary.copy()
+
+    def backlog(self, now=None):
+        """الطلبات المعلقة لدى كل مراجع وعمر أقدمها ووسيطها بالساعات"""
+        now = pd.Timestamp(now or pd.Timestamp.now())
+        with self._lock:
+            ages = (now - self._open["entered"]).dt.total_seconds() / 3600
+            grouped = ages.groupby(self._open["stage"])
+            backlog = pd.DataFrame({
+                "pending": grouped.size(),
+                "oldest_hours": grouped.max(),
+                "median_hours": grouped.median(),
+            })
+        backlog.insert(0, "approver", backlog.index.map(APPROVAL_STAGES))
+        return backlog.rename_axis("stage").round(1)
+
+    def throughput(self, days=SLA_THROUGHPUT_DAYS, today=None):
+        """عدد الطلبات المقدّمة والمكتملة والمرفوضة لكل يوم في آخر days يوماً"""
+        today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+        index = pd.date_range(end=today, periods=days, freq="D", name="day")
+        with self._lock:
+            return self._throughput.reindex(index, fill_value=0).astype("int64")
+
+
+def create_sla_analytics(store):
+    """إنشاء التحليلات وقراءة السجل الحالي كاملاً مرة واحدة"""
+    analytics = SLAAnalytics(store)
+    analytics.refresh()
+    return analytics
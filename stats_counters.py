@@ -0,0 +1,118 @@
+"""
+عدادات الإحصائيات المادية
+قيم لوحة الملخص (الموظفون النشطون، الطلبات المعلقة، الوثائق القريبة الانتهاء)
+تُحدَّث تدريجياً من أحداث التطبيق وتُطابق دورياً مع العد الكامل،
+فقراءة البطاقات O(1) بدل COUNT(*) عند كل إعادة تشغيل
+"""
+
+import threading
+
+from config import STATS_RECONCILE_INTERVAL
+
+# اسم العداد ← العنوان المعروض
+COUNTER_LABELS = {
+    "active_employees": "الموظفون النشطون",
+    "pending_requests": "الطلبات المعلقة",
+    "expiring_passports": "جوازات قريبة الانتهاء",
+    "expiring_residencies": "إقامات قريبة الانتهاء",
+}
+
+
+class StatsCounters:
+    """
+    عدادات في الذاكرة لكل العملية
+    - adjust() يُستدعى من أحداث التطبيق
+    - reconcile() يعيد كل عداد إلى قيمته الدقيقة من مصدره ويسجل الانحراف
+    - خيط خلفي يطابق كل interval ثانية (تغييرات خارج التطبيق ومرور الأيام)
+    - live: عدادات رخيصة تُقرأ من مصدرها مباشرة عند كل قراءة بلا مسار تدريجي
+      (مثل الطلبات المعلقة من فهارس المخزن، فلا تنحرف بين كتابة المخزن و adjust)
+    """
+
+    def __init__(self, sources, live=None, interval=STATS_RECONCILE_INTERVAL):
+        # اسم العداد ← دالة ترجع قيمته الدقيقة
+        self._sources = sources
+        self._live = live or {}
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._values = dict.fromkeys(sources, 0)
+        self._drift = dict.fromkeys(sources, 0)
+        # التعديلات الواصلة أثناء عد المطابقة (None خارجها) تُعاد فوق القيم الجديدة
+        self._pending = None
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.reconcile()
+
+    def adjust(self, name, delta):
+        """تعديل عداد بمقدار delta"""
+        if delta:
+            with self._lock:
+                self._values[name] += delta
+                if self._pending is not None:
+                    self._pending[name] += delta
+
+    def get(self, name):
+        if name in self._live:
+            return self._live[name]()
+        with self._lock:
+            return self._values[name]
+
+    def snapshot(self):
+        """جميع القيم الحالية دفعة واحدة"""
+        with self._lock:
+            values = dict(self._values)
+        values.update({name: source() for name, source in self._live.items()})
+        return values
+
+    def drift(self):
+        """الفرق بين العد الكامل والقيمة التدريجية عند آخر مطابقة"""
+        with self._lock:
+            return dict(self._drift)
+
+    def reconcile(self):
+        """
+        مطابقة جميع العدادات مع مصادرها
+        العد خارج القفل فلا ينتظره adjust()، والتعديلات الواصلة أثناءه تُعاد فوق العد الجديد
+        """
+        with self._lock:
+            self._pending = dict.fromkeys(self._sources, 0)
+        try:
+            exact = {name: source() for name, source in self._sources.items()}
+        finally:
+            with self._lock:
+                pending, self._pending = self._pending, None
+        with self._lock:
+            for name, value in exact.items():
+                value += pending[name]
+                self._drift[name] = value - self._values[name]
+                self._values[name] = value
+
+    def start(self):
+        """تشغيل خيط المطابقة الدورية"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._reconcile_loop, name="stats-counters", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _reconcile_loop(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"⚠️ فشل مطابقة عدادات الإحصائيات: {str(e)}")
+
+
+def create_stats_counters(store, directory, expiry_engine):
+    """العدادات الأربعة من مخزن الطلبات ودليل الموظفين ومحرك الانتهاء"""
+    return StatsCounters(
+        {
+            "active_employees": lambda: len(directory),
+            "expiring_passports": lambda: expiry_engine.counts()["جواز سفر"],
+            "expiring_residencies": lambda: expiry_engine.counts()["إقامة"],
+        },
+        # فهارس المخزن تعدّ المعلق مباشرة O(عدد المراحل)
+        live={"pending_requests": lambda: store.count_by_status("Pending")},
+    ).start()
@@ -0,0 +1,113 @@
+"""
+اختبار استعادة النسخ الاحتياطية على عميل Supabase وهمي في الذاكرة (لا يحتاج اتصالاً)
+العميل يحاكي تسلسل SERIAL في Postgres: الإدراج برقم صريح لا يُقدّم التسلسل
+التشغيل: python -m pytest -q test_backup_script.py
+"""
+
+import pytest
+
+from backup_formats import open_table_writer
+from backup_script import restore_folder
+
+
+class UniqueViolation(Exception):
+    code = "23505"
+
+
+class FakeTable:
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+        self._action = None
+
+    def upsert(self, rows, ignore_duplicates=False):
+        self._action = ("upsert", rows, ignore_duplicates)
+        return self
+
+    def insert(self, row):
+        self._action = ("insert", [row], False)
+        return self
+
+    def execute(self):
+        kind, rows, ignore_duplicates = self._action
+        table = self._client.rows.setdefault(self._name, {})
+        for row in rows:
+            row = dict(row)
+            if "id" not in row:
+                self._client.sequences[self._name] = self._client.sequences.get(self._name, 0) + 1
+                row["id"] = self._client.sequences[self._name]
+            if row["id"] in table and (kind == "insert" or ignore_duplicates):
+                if ignore_duplicates:
+                    continue
+                raise UniqueViolation(f"duplicate key value violates unique constraint ({row['id']})")
+            table[row["id"]] = row
+        return self
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self._client = client
+        self._name = name
+        self._params = params
+
+    def execute(self):
+        assert self._name == "reset_serial_sequence"
+        table = self._params["table_name"]
+        self._client.sequences[table] = max(self._client.rows.get(table, {}), default=0)
+        return self
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.rows = {}
+        self.sequences = {}
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+
+def write_table(folder, table, rows):
+    writer = open_table_writer(folder / f"{table}.ndjson", "ndjson")
+    try:
+        writer.write_page(rows)
+    finally:
+        writer.close()
+
+
+@pytest.fixture
+def backup_folder(tmp_path):
+    write_table(tmp_path, "request_events", [
+        {"id": 1, "request_id": "REQ-1", "action": "submitted"},
+        {"id": 2, "request_id": "REQ-1", "action": "approved"},
+    ])
+    return tmp_path
+
+
+def test_new_event_after_restore_gets_fresh_id(backup_folder):
+    client = FakeSupabase()
+
+    restored, ok = restore_folder(client, backup_folder, jobs=1)
+
+    assert (restored, ok) == (2, True)
+    # أول حدث بعد الاستعادة يأخذ الرقم التالي بدلاً من الاصطدام بالحدث 1
+    client.table("request_events").insert({"request_id": "REQ-2", "action": "submitted"}).execute()
+    assert sorted(client.rows["request_events"]) == [1, 2, 3]
+    assert not (backup_folder / "restore_checkpoint.json").exists()
+
+
+def test_failed_sequence_reset_keeps_restore_incomplete(backup_folder):
+    client = FakeSupabase()
+
+    def broken_rpc(name, params):
+        raise ConnectionError("connection reset")
+
+    client.rpc = broken_rpc
+
+    restored, ok = restore_folder(client, backup_folder, jobs=1)
+
+    assert (restored, ok) == (2, False)
+    # نقطة الاستئناف تبقى فيُعاد ضبط التسلسل عند إعادة التشغيل
+    assert (backup_folder / "restore_checkpoint.json").exists()
@@ -0,0 +1,80 @@
+"""
+اختبار الرفع على دفعات بعميل Supabase وهمي في الذاكرة (لا يحتاج اتصالاً)
+العميل يرفض سجلات بعينها بخطأ قيد (SQLSTATE 23) ويفشل مؤقتاً بخطأ اتصال عند الطلب
+التشغيل: python -m pytest -q test_bulk_upsert.py
+"""
+
+import pytest
+
+from bulk_upsert import upsert_records
+
+
+class APIError(Exception):
+    """مثل postgrest.exceptions.APIError: رمز SQLSTATE في code"""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeTable:
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+        self._rows = None
+
+    def upsert(self, rows, ignore_duplicates=False):
+        self._rows = rows
+        return self
+
+    def execute(self):
+        self._client.requests.append(len(self._rows))
+        if self._client.outage is not None:
+            raise self._client.outage
+        bad = [row["id"] for row in self._rows if row["id"] in self._client.rejected]
+        if bad:
+            # الدفعة كلها تُرفض في معاملة واحدة كما في PostgREST
+            raise APIError(f"new row violates check constraint ({bad[0]})", "23514")
+        table = self._client.rows.setdefault(self._name, {})
+        for row in self._rows:
+            table[row["id"]] = row
+        return self
+
+
+class FakeSupabase:
+    def __init__(self, rejected=(), outage=None):
+        self.rejected = set(rejected)
+        self.outage = outage
+        self.rows = {}
+        self.requests = []
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+RECORDS = [{"id": i, "name": f"emp-{i}"} for i in range(1, 17)]
+
+
+def test_rejected_rows_are_isolated_and_good_rows_land():
+    client = FakeSupabase(rejected={3, 12})
+
+    succeeded, failed = upsert_records(client, "employees", RECORDS, chunk_size=8, verbose=False)
+
+    assert succeeded == 14
+    assert [row["id"] for row in failed] == [3, 12]
+    assert sorted(client.rows["employees"]) == [i for i in range(1, 17) if i not in (3, 12)]
+
+
+@pytest.mark.parametrize("error", [
+    ConnectionError("connection reset by peer"),
+    APIError("terminating connection due to administrator command", "08006"),
+])
+def test_transient_error_is_raised_without_bisecting(error):
+    client = FakeSupabase(outage=error)
+
+    with pytest.raises(type(error)):
+        upsert_records(client, "employees", RECORDS, chunk_size=8, verbose=False)
+
+    # طلب واحد فقط: خطأ الاتصال لا يُقسم الدفعة ولا يُكمل الدفعات التالية
+    assert client.requests == [8]
+    assert "employees" not in client.rows
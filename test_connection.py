@@ -85,17 +85,17 @@ def test_supabase_connection():
     print("=" * 60)
     
     try:
-        from config import SUPABASE_URL, SUPABASE_KEY, USE_DATABASE
+        from config import USE_DATABASE
         
         if not USE_DATABASE:
             print("ℹ️ قاعدة البيانات غير مفعّلة في config.py")
             print()
             return True
         
-        from supabase import create_client
+        from db_clients import get_supabase
         
         print("🔄 جاري الاتصال...")
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        supabase = get_supabase()
         
         # محاولة قراءة بيانات بسيطة
         response = supabase.table('employees').select("count").execute()
@@ -123,16 +123,16 @@ def test_database_tables():
     print("=" * 60)
     
     try:
-        from config import SUPABASE_URL, SUPABASE_KEY, USE_DATABASE
+        from config import USE_DATABASE
         
         if not USE_DATABASE:
             print("ℹ️ قاعدة البيانات غير مفعّلة")
             print()
             return True
         
-        from supabase import create_client
+        from db_clients import get_supabase
         
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        supabase = get_supabase()
         
         tables = [
             'employees',
@@ -176,7 +176,7 @@ def test_sample_data():
     print("=" * 60)
     
     try:
-        from config import SUPABASE_URL, SUPABASE_KEY, USE_DATABASE
+        from config import USE_DATABASE
         
         if not USE_DATABASE:
             print("ℹ️ قاعدة البيانات غير مفعّلة - استخدام بيانات الذاكرة")
@@ -187,9 +187,9 @@ def test_sample_data():
             print()
             return True
         
-        from supabase import create_client
+        from db_clients import get_supabase
         
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        supabase = get_supabase()
         
         # فحص الموظفين
         response = supabase.table('employees').select("*").execute()
@@ -0,0 +1,104 @@
+"""
+اختبار الدخول عبر دليل الموظفين المبني على Supabase
+يعمل بعميل Supabase وهمي في الذاكرة (لا يحتاج اتصالاً)
+التشغيل: python -m pytest -q test_employee_directory.py
+"""
+
+import os
+
+import pytest
+
+import db_clients
+import employee_directory
+from employee_directory import EmployeeDirectory, SupabaseEmployeeSource
+from passwords import hash_password
+
+EMPLOYEE_ROWS = [
+    # أرقام غير موجودة في USERS_DB حتى يثبت الدخول أنه قرأ من Supabase
+    {"id": "2001", "name": "أحمد محمد", "role": "الموظف", "department": "IT",
+     "email": "ahmed@company.com", "phone": None, "password_hash": hash_password("s3cret"), "is_active": True},
+    {"id": "2002", "name": "سارة علي", "role": "مشرف القسم", "department": "IT",
+     "email": "sara@company.com", "phone": None, "password_hash": hash_password("456"), "is_active": False},
+]
+
+
+class FakeQuery:
+    """سلسلة استعلام PostgREST مبسطة: select / eq / gt / order / limit / execute"""
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._names = None
+        self.data = None
+
+    def select(self, columns):
+        # الإسقاط عند execute لأن PostgREST يرشّح على أعمدة غير مختارة
+        self._names = [c.strip() for c in columns.split(",")]
+        return self
+
+    def eq(self, column, value):
+        self._rows = [row for row in self._rows if row[column] == value]
+        return self
+
+    def gt(self, column, value):
+        self._rows = [row for row in self._rows if row[column] > value]
+        return self
+
+    def order(self, column):
+        self._rows = sorted(self._rows, key=lambda row: row[column])
+        return self
+
+    def limit(self, count):
+        self._rows = self._rows[:count]
+        return self
+
+    def execute(self):
+        self.data = [{name: row.get(name) for name in self._names} for row in self._rows]
+        return self
+
+
+class FakeSupabase:
+    def table(self, name):
+        assert name == "employees"
+        return FakeQuery(list(EMPLOYEE_ROWS))
+
+
+@pytest.fixture
+def supabase_directory(tmp_path):
+    directory = EmployeeDirectory(
+        SupabaseEmployeeSource(FakeSupabase()), stamp_path=str(tmp_path / "employees.version")
+    )
+    yield directory
+    directory.stop()
+
+
+def test_supabase_source_keeps_passwords_out_of_directory(supabase_directory):
+    user = supabase_directory.get("2001")
+    assert "password" not in user and "password_hash" not in user
+    assert user["dept"] == "IT"
+    assert supabase_directory.check_password("2001", "s3cret")
+    assert not supabase_directory.check_password("2001", "wrong")
+    # غير النشط لا يُحمّل
+    assert supabase_directory.get("2002") is None
+
+
+def test_login_against_supabase_directory(tmp_path, monkeypatch):
+    testing = pytest.importorskip("streamlit.testing.v1")
+    monkeypatch.setattr(employee_directory, "USE_DATABASE", True)
+    monkeypatch.setattr(db_clients, "get_supabase", lambda: FakeSupabase())
+    monkeypatch.chdir(tmp_path)
+
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+    def login(emp_id, password):
+        at = testing.AppTest.from_file(app_path, default_timeout=30)
+        at.run()
+        at.text_input[0].input(emp_id)
+        at.text_input[1].input(password)
+        at.button[0].click()
+        at.run()
+        assert not at.exception
+        return at.session_state.logged_in
+
+    assert login("2001", "s3cret")
+    assert not login("2001", "wrong")
+    assert not login("2002", "456")
@@ -0,0 +1,163 @@
+"""
+محرك سلسلة الموافقات
+مسارات الموافقة لكل نوع طلب معرّفة كبيانات، وتُترجم مرة واحدة عند التحميل إلى جداول بحث:
+الدور ← المرحلة، و (المسار، المرحلة، الإجراء) ← المرحلة التالية
+فيكون كل انتقال O(1) ويُتحقق من صحة التعريف قبل أي استخدام
+"""
+
+from config import LOAN_APPROVAL_THRESHOLD
+
+# مراحل الموافقة ← الدور المسؤول عنها
+APPROVAL_STAGES = {
+    2: "مشرف القسم",
+    3: "مدير القسم",
+    4: "مدير الموارد البشرية",
+    5: "مدير مالي",
+    7: "المدير العام",
+}
+
+# مراحل نهائية
+STAGE_DONE = 6
+STAGE_REJECTED = 0
+
+# المسارات: ترتيب مراحل الموافقة لكل مسار
+WORKFLOWS = {
+    "default": [2, 3, 4, 5],
+    # السلف الكبيرة تحتاج موافقة المدير العام بعد المدير المالي
+    "large_loan": [2, 3, 4, 5, 7],
+}
+
+# نوع الطلب ← المسار (الأنواع غير المذكورة تتبع default)
+TYPE_WORKFLOWS = {}
+
+# قواعد توجيه حسب المبلغ: (نوع الطلب، الحد الأدنى للمبلغ، المسار) - أول قاعدة مطابقة تُطبق
+AMOUNT_ROUTES = [
+    ("سلفة", LOAN_APPROVAL_THRESHOLD, "large_loan"),
+]
+
+ACTIONS = ("approve", "reject")
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _event(req, stage_from, actor, action, timestamp):
+    """حدث انتقال للسجل (request_events): رقم الطلب الجديد يملؤه المخزن بعد الإدراج"""
+    return {
+        "request_id": req.get('id'),
+        "stage_from": stage_from,
+        "stage_to": req['current_stage'],
+        "actor": actor,
+        "action": action,
+        "ts": timestamp.strftime(TS_FORMAT) if hasattr(timestamp, "strftime") else str(timestamp),
+    }
+
+
+class WorkflowEngine:
+    """جداول الانتقال المحسوبة مسبقاً من تعريف المسارات"""
+
+    def __init__(self, stages=APPROVAL_STAGES, workflows=WORKFLOWS,
+                 type_workflows=TYPE_WORKFLOWS, amount_routes=AMOUNT_ROUTES):
+        self._validate(stages, workflows, type_workflows, amount_routes)
+
+        self.stage_roles = dict(stages)
+        self.role_stages = {role: stage for stage, role in stages.items()}
+        self._type_workflows = dict(type_workflows)
+        self._amount_routes = {}
+        for req_type, minimum, workflow in amount_routes:
+            self._amount_routes.setdefault(req_type, []).append((minimum, workflow))
+
+        # المسار ← أول مرحلة، و (المسار، المرحلة، الإجراء) ← المرحلة التالية
+        self._first_stages = {name: chain[0] for name, chain in workflows.items()}
+        self._transitions = {}
+        for name, chain in workflows.items():
+            for stage, next_stage in zip(chain, chain[1:] + [STAGE_DONE]):
+                self._transitions[(name, stage, "approve")] = next_stage
+                self._transitions[(name, stage, "reject")] = STAGE_REJECTED
+
+    @staticmethod
+    def _validate(stages, workflows, type_workflows, amount_routes):
+        if len(set(stages.values())) != len(stages):
+            raise ValueError("كل دور يجب أن يملك مرحلة واحدة فقط")
+        if STAGE_DONE in stages or STAGE_REJECTED in stages:
+            raise ValueError("المراحل النهائية لا تكون مراحل موافقة")
+        if "default" not in workflows:
+            raise ValueError("المسار default مطلوب")
+        for name, chain in workflows.items():
+            if not chain:
+                raise ValueError(f"المسار {name} فارغ")
+            if len(set(chain)) != len(chain):
+                raise ValueError(f"المسار {name} يكرر مرحلة")
+            unknown = [stage for stage in chain if stage not in stages]
+            if unknown:
+                raise ValueError(f"المسار {name} يستخدم مراحل غير معرّفة: {unknown}")
+        referenced = list(type_workflows.values()) + [workflow for _, _, workflow in amount_routes]
+        missing = [name for name in referenced if name not in workflows]
+        if missing:
+            raise ValueError(f"مسارات غير معرّفة: {missing}")
+
+    def stage_for_role(self, role):
+        """المرحلة التي يراجعها الدور (None إن لم يكن مراجعاً)"""
+        return self.role_stages.get(role)
+
+    def choose_route(self, req):
+        """المسار المناسب للطلب حسب نوعه ومبلغه بالقواعد الحالية"""
+        for minimum, workflow in self._amount_routes.get(req['type'], ()):
+            if (req.get('loan_amount') or 0) > minimum:
+                return workflow
+        return self._type_workflows.get(req['type'], "default")
+
+    def route(self, req):
+        """
+        مسار الطلب: المحفوظ معه عند التقديم، فلا يتغير مساره إن تغيرت القواعد
+        (مثل LOAN_APPROVAL_THRESHOLD) أثناء مروره بالموافقات
+        الطلبات القديمة بلا مسار محفوظ يُحسب مسارها بالقواعد الحالية
+        """
+        workflow = req.get('workflow')
+        if workflow in self._first_stages:
+            return workflow
+        return self.choose_route(req)
+
+    def first_stage(self, req):
+        """المرحلة التي يبدأ عندها الطلب الجديد"""
+        return self._first_stages[self.route(req)]
+
+    def next_stage(self, req, action):
+        """المرحلة بعد الإجراء (None إن لم يكن الانتقال مسموحاً)"""
+        return self._transitions.get((self.route(req), req['current_stage'], action))
+
+    def can_act(self, req, role):
+        """هل يملك الدور إجراء على الطلب في مرحلته الحالية"""
+        return (
+            req['status'] == "Pending"
+            and self.role_stages.get(role) == req['current_stage']
+        )
+
+    def submit(self, req, actor, timestamp):
+        """تهيئة الطلب الجديد وحفظ مساره، عند أول مرحلة فيه، وإرجاع حدث التقديم"""
+        req['workflow'] = self.choose_route(req)
+        req['status'] = "Pending"
+        req['current_stage'] = self.first_stage(req)
+        return _event(req, None, actor, "submit", timestamp)
+
+    def apply(self, req, action, role, timestamp, reason=""):
+        """
+        تطبيق الإجراء على الطلب إن كان مسموحاً
+        ترجع حدث الانتقال عند التطبيق و None إن لم يكن الدور مسؤولاً عن المرحلة الحالية
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"إجراء غير معروف: {action}")
+        if not self.can_act(req, role):
+            return None
+        next_stage = self.next_stage(req, action)
+        if next_stage is None:
+            return None
+
+        stage_from = req['current_stage']
+        req['current_stage'] = next_stage
+        if action == "reject":
+            req['status'] = "Rejected"
+            req['rejection_reason'] = reason
+        elif next_stage == STAGE_DONE:
+            req['status'] = "Approved"
+            req['approved_by'] = role
+        return _event(req, stage_from, role, action, timestamp)